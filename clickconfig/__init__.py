@@ -46,6 +46,23 @@ clickconfig.gedit-plugin    -- gedit reads this to know about the plugin.
 clickconfig/                -- Package directory
     __init__.py             -- Package module loaded by gedit.
     click_config.py         -- Plugin and plugin helper classes.
+    boundaries.py           -- Finds the match boundaries of selections.
+    worker.py               -- Process that regex matching runs in.
+    regexcheck.py           -- Finds regex repeats that risk backtracking.
+    linearre.py             -- Linear-time regex engine.
+    structure.py            -- Finds Line and Paragraph selections by line.
+    brackets.py             -- Index of bracket and quote pairs.
+    indents.py              -- Index of line indentation widths.
+    lines.py                -- Index of line start and end offsets.
+    drag.py                 -- Extends a selection as the pointer drags.
+    preview.py              -- Underlines the selection a click would make.
+    matches.py              -- Index of all the matches of a regex.
+    highlight.py            -- Highlights the visible matches of an op.
+    menus.py                -- Category submenus filled when first opened.
+    ladder.py               -- Steps a selection through nested selections.
+    snapshots.py            -- Shared text snapshots of documents.
+    caches.py               -- Keeps the caches within a memory budget.
+    clickstate.py           -- Counts the clicks of multiple clicks.
     data.py                 -- Configuration data classes.
     dictfile.py             -- Reads/writes dictionaries from/to files.
     ui.py                   -- Configuration window class.
@@ -0,0 +1,164 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module finds the match boundaries of SelectionOp regular expressions.
+
+A text's boundaries are the start and end positions of all of a regex's
+matches in it, plus the start and end of the text itself.  Any position in the
+text is then either within a match or within a gap between matches, and the
+click selection is that match or gap.
+
+Functions:
+find_boundaries -- the boundaries of one regex in a text
+
+Classes:
+ChunkedBoundaryScan -- finds the boundaries of one regex a bounded amount of
+                       time at a time, to be resumed from idle callbacks
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its self test:
+    python boundaries.py
+
+"""
+
+import itertools
+import re
+import time
+
+def find_boundaries(source_text, word_re):
+    """Return the offsets of all match starting and ending positions."""
+    spans = ((m.start(), m.end()) for m in word_re.finditer(source_text))
+    boundaries = list(itertools.chain.from_iterable(spans))
+    
+    source_start = 0
+    source_end = len(source_text)
+    
+    if boundaries:
+        if boundaries[0] != source_start:
+            boundaries.insert(0, source_start)
+        if boundaries[-1] != source_end:
+            boundaries.append(source_end)
+    else:
+        boundaries = [source_start, source_end]
+    
+    return boundaries
+
+class ChunkedBoundaryScan(object):
+    
+    """
+    Finds the same boundaries as find_boundaries, but in steps that each stop
+    once a time limit is reached, so that a long scan can be spread over
+    several main loop iterations.
+    
+    Each step resumes searching where the previous one stopped.  (A single
+    regex search cannot be interrupted, so a step can still run over its time
+    limit by the time of one search.)
+    
+    Usage:
+        scan = ChunkedBoundaryScan(source_text, word_re)
+        while not scan.step(0.02):
+            pass # (or return to the main loop)
+        boundaries = scan.boundaries
+    
+    """
+    
+    matches_per_time_check = 64
+    """How many matches to find between checks of the time."""
+    
+    def __init__(self, source_text, word_re):
+        """Prepare to scan the text."""
+        self.source_text = source_text
+        """The text being scanned."""
+        self.word_re = word_re
+        """The compiled regex being matched."""
+        self.boundaries = []
+        """The boundaries found so far (all of them once done)."""
+        self.done = False
+        """Whether the scan is complete."""
+        self._pos = 0
+        """Position in source_text at which to resume searching."""
+    
+    def step(self, time_limit):
+        """
+        Scan for up to time_limit seconds.  Return True if the scan is done.
+        """
+        if self.done:
+            return True
+        deadline = time.time() + time_limit
+        search = self.word_re.search
+        source_text = self.source_text
+        source_end = len(source_text)
+        boundaries = self.boundaries
+        pos = self._pos
+        count = 0
+        while pos <= source_end:
+            match = search(source_text, pos)
+            if not match:
+                break
+            start, end = match.span()
+            boundaries.append(start)
+            boundaries.append(end)
+            # After an empty match, finditer resumes one character later.
+            pos = end if end > start else end + 1
+            count += 1
+            if (count % self.matches_per_time_check == 0 and
+                    time.time() > deadline):
+                self._pos = pos
+                return False
+        if boundaries:
+            if boundaries[0] != 0:
+                boundaries.insert(0, 0)
+            if boundaries[-1] != source_end:
+                boundaries.append(source_end)
+        else:
+            boundaries.extend([0, source_end])
+        self.done = True
+        return True
+
+def test():
+    """
+    Execute boundaries.py at the command line to run this self test.
+    
+    It checks that ChunkedBoundaryScan gives the same boundaries as
+    find_boundaries.
+    """
+    regexes = [
+        re.compile('[a-zA-Z]+|[0-9]+|[^a-zA-Z0-9]+'),
+        re.compile('[_a-zA-Z][_a-zA-Z0-9]*'),
+        re.compile('^.*\\n', re.M),
+        re.compile('(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+(?:[ \\t]*\\n)?', re.M),
+        ]
+    paragraph = ''.join('    line_%d = some_function(%d, "text")\n' % (i, i)
+                        for i in range(8))
+    document = (paragraph + '\n') * 2000
+    line = document.splitlines()[3]
+    
+    for word_re in regexes + [re.compile('x*'), re.compile('^')]:
+        for source_text in (document, line, '', 'xx\nyx'):
+            scan = ChunkedBoundaryScan(source_text, word_re)
+            while not scan.step(0.0):
+                pass
+            expected = find_boundaries(source_text, word_re)
+            assert scan.boundaries == expected, (word_re.pattern,
+                                                 source_text[:10])
+    print('ChunkedBoundaryScan results match find_boundaries.')
+
+if __name__ == '__main__':
+    test()
+
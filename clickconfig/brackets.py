@@ -0,0 +1,658 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module finds the pair of brackets or quotes that encloses a position,
+for the 'brackets' structure of SelectionOps.
+
+Classes:
+BracketIndex     -- the bracket and quote pairs of a text, found in one pass
+DocumentBrackets -- keeps a BracketIndex of a gedit document through edits
+
+A BracketIndex is built in one pass over the text, and then finds the
+innermost pair enclosing a position with a binary search.  Brackets are
+(), [] and {}.  Quoted strings are pairs too; with the comment and string
+spans of GtkSourceView's syntax highlighting, strings are taken from the
+highlighting and brackets and quotes within comments and strings are
+skipped.  Without highlighting, a quote is paired with the next matching
+quote on its line (or the next matching triple quote anywhere).
+
+Edits of only letters, digits, underscores, spaces and tabs, away from
+backslashes and quotes, cannot make or break a pair, so the index is kept
+through them by mapping positions across the edits.  Any other edit drops the
+index, and it is built again once the edits pause, a time slice at a time in
+idle time, together with the highlighting it needs.  A click that finds the
+index unbuilt builds it for one time slice, and if that is not enough, the op
+uses its regex until the index is built.
+
+BracketIndex does not depend on gedit or GTK (DocumentBrackets needs only
+gobject's main loop), so this module can be run at the command line for its
+self test and benchmark:
+    python brackets.py
+
+"""
+
+import array
+import bisect
+import re
+import time
+
+import gobject
+
+REBUILD_DELAY = 500
+"""Milliseconds after the last edit before a dropped index is built again."""
+
+BUILD_TIME_SLICE = 20
+"""Milliseconds spent building an index at a time, between other events."""
+
+HIGHLIGHT_STEP_LINES = 256
+"""Lines highlighted in each step of building an index."""
+
+CLASS_STEP_TOGGLES = 1024
+"""Comment and string toggles found in each step of building an index."""
+
+_SCAN_STEP = 4096
+"""Characters (or pairs) scanned in each step of building a BracketIndex."""
+
+_OPENERS = {'(': ')', '[': ']', '{': '}'}
+_CLOSERS = {')': '(', ']': '[', '}': '{'}
+
+_TOKEN_RE = re.compile(r'''\\.|[][(){}]|\'\'\'|"""|['"`]''', re.S)
+"""Matches the delimiters, and escaped characters to pass over."""
+
+_QUOTE_END_RES = {
+    "'": re.compile(r"\\.|'|\n", re.S),
+    '"': re.compile(r'\\.|"|\n', re.S),
+    '`': re.compile(r'\\.|`|\n', re.S),
+    "'''": re.compile(r"\\.|'''", re.S),
+    '"""': re.compile(r'\\.|"""', re.S),
+    }
+"""Match the end of a string started by each quote (or a line end)."""
+
+_STRING_OPEN_RE = re.compile(r'''[a-zA-Z]{0,3}(\'\'\'|"""|['"`])''')
+"""Matches the prefix and opening quote of a highlighted string."""
+
+_INERT_RE = re.compile(r'[\w \t]*\Z', re.U)
+"""Matches edited text that cannot make or break a pair."""
+
+_ESCAPES_AND_QUOTES = re.compile(r'[\\\'"`]')
+"""Matches characters that an edit next to could make or break a pair."""
+
+class BracketIndex(object):
+    
+    """
+    The pairs of brackets and quotes in a text, and the innermost pair
+    enclosing each position.
+    
+    Usage:
+        index = BracketIndex(text, comment_spans, string_spans)
+        pair = index.find_pair(offset)
+        if pair:
+            open_start, open_end, close_start, close_end = pair
+    
+    Positions are character offsets, so text should be unicode.  The spans
+    are sorted lists of (start, end) offsets; string_spans is None if
+    strings are to be found by their quotes.
+    
+    To build the index a time slice at a time:
+        index = BracketIndex(text, comment_spans, string_spans, time_limit)
+        while not index.scan(time_limit):
+            ...
+    
+    """
+    
+    max_edits = 64
+    """How many edits the index can be kept through before a rebuild."""
+    
+    def __init__(self, text, comment_spans=(), string_spans=None,
+                 time_limit=None):
+        """
+        Find the pairs of the text, or with a time_limit (in seconds), those
+        found in about that time, leaving the rest to scan.
+        """
+        self._pairs = array.array('i')
+        """open_start, open_end, close_start, close_end of each pair."""
+        self._keys = array.array('i')
+        """Offsets at which the innermost enclosing pair changes."""
+        self._values = array.array('i')
+        """Index of the innermost pair from each key (-1 for none)."""
+        self._edits = []
+        """(offset, length) of each edit since the index was built."""
+        self._scanning = self._scan(text, comment_spans, string_spans)
+        """The steps of the scan that finds the pairs (None once it ends)."""
+        self.scan(time_limit)
+    
+    def __len__(self):
+        """Return the number of pairs."""
+        return len(self._pairs) // 4
+    
+    def get_size(self):
+        """Return the bytes taken by the index's arrays."""
+        return sum(len(values) * values.itemsize
+                   for values in (self._pairs, self._keys, self._values))
+    
+    def scan(self, time_limit=None):
+        """
+        Go on finding the pairs for one step, and then until time_limit
+        seconds have passed (or to the end, without one).  Return whether
+        all of the pairs have been found.
+        """
+        if self._scanning:
+            if time_limit is not None:
+                stop_time = time.time() + time_limit
+            for step in self._scanning:
+                if time_limit is not None and time.time() >= stop_time:
+                    return False
+            self._scanning = None
+        return True
+    
+    def is_built(self):
+        """Return whether all of the pairs have been found."""
+        return self._scanning is None
+    
+    def find_pair(self, offset):
+        """
+        Return the open_start, open_end, close_start and close_end offsets of
+        the innermost pair whose contents contain offset, or None.
+        """
+        if self._scanning:
+            self.scan()
+        for edit_offset, length in reversed(self._edits):
+            if length > 0 and offset > edit_offset:
+                offset = max(edit_offset, offset - length)
+            elif length < 0 and offset > edit_offset:
+                offset -= length
+        index = bisect.bisect_right(self._keys, offset) - 1
+        if index < 0 or self._values[index] < 0:
+            return None
+        pair = self._values[index] * 4
+        open_start, open_end, close_start, close_end = \
+            self._pairs[pair:pair + 4]
+        for edit_offset, length in self._edits:
+            # Text inserted at a delimiter's start goes before it, and text
+            # inserted at its end goes after it.
+            if open_start >= edit_offset:
+                open_start = max(edit_offset, open_start + length)
+            if open_end > edit_offset:
+                open_end = max(edit_offset, open_end + length)
+            if close_start >= edit_offset:
+                close_start = max(edit_offset, close_start + length)
+            if close_end > edit_offset:
+                close_end = max(edit_offset, close_end + length)
+        return open_start, open_end, close_start, close_end
+    
+    def insert(self, offset, text, around):
+        """
+        Keep the index through the insertion of text at offset, where around
+        is the characters just before and after offset.  Return False if the
+        index can no longer be used.
+        """
+        return self._add_edit(offset, len(text), text, around)
+    
+    def delete(self, start, end, text, around):
+        """
+        Keep the index through the deletion of text from start to end, where
+        around is the characters just before start and after end.  Return
+        False if the index can no longer be used.
+        """
+        return self._add_edit(start, start - end, text, around)
+    
+    def _add_edit(self, offset, length, text, around):
+        """Record an edit, if it is one the index can be kept through."""
+        if (self._scanning or len(self._edits) >= self.max_edits or
+                not _INERT_RE.match(text) or
+                _ESCAPES_AND_QUOTES.search(around)):
+            return False
+        self._edits.append((offset, length))
+        return True
+    
+    def _scan(self, text, comment_spans, string_spans):
+        """
+        Find the pairs in one pass over the text, yielding between steps.
+        """
+        find_strings = string_spans is None
+        spans = sorted([(start, end, False) for start, end in comment_spans] +
+                       [(start, end, True) for start, end in
+                        (string_spans or ())])
+        spans.reverse()
+        pairs = self._pairs
+        events = []
+        """(key, pair number) of each change of the innermost pair."""
+        parents = []
+        """Number of the pair each pair is within (-1 for none)."""
+        closed = []
+        """Whether each pair was closed."""
+        stack = []
+        """(closer, pair number) of each open bracket."""
+        search = _TOKEN_RE.search
+        text_end = len(text)
+        pos = 0
+        next_step = _SCAN_STEP
+        while pos < text_end:
+            if pos >= next_step:
+                next_step = pos + _SCAN_STEP
+                yield
+            match = search(text, pos)
+            token_start = match.start() if match else text_end
+            if spans and spans[-1][0] <= token_start:
+                # Comments and strings are passed over, except to make a
+                # pair of each string.
+                span_start, span_end, is_string = spans.pop()
+                if is_string and span_end > pos:
+                    delimiters = _get_string_delimiters(text, span_start,
+                                                        span_end)
+                    if delimiters:
+                        self._add_pair(events, parents, closed, stack,
+                                       span_start, delimiters[0],
+                                       delimiters[1], span_end)
+                pos = max(pos, span_end)
+                continue
+            if not match:
+                break
+            token = match.group()
+            pos = match.end()
+            if token in _OPENERS:
+                number = len(parents)
+                pairs.extend((token_start, pos, -1, -1))
+                parents.append(stack[-1][1] if stack else -1)
+                closed.append(False)
+                stack.append((_OPENERS[token], number))
+                events.append((pos, number))
+            elif token in _CLOSERS:
+                index = len(stack) - 1
+                while index >= 0 and stack[index][0] != token:
+                    index -= 1
+                if index < 0:
+                    # A closing bracket without an opening one is ignored.
+                    continue
+                # Brackets opened since the match are left unclosed.
+                number = stack[index][1]
+                del stack[index:]
+                pairs[number * 4 + 2] = token_start
+                pairs[number * 4 + 3] = pos
+                closed[number] = True
+                events.append((token_start + 1,
+                               stack[-1][1] if stack else -1))
+            elif find_strings and token[0] != '\\':
+                end_search = _QUOTE_END_RES[token].search
+                end_match = end_search(text, pos)
+                while end_match and end_match.group()[0] == '\\':
+                    end_match = end_search(text, end_match.end())
+                if end_match and end_match.group() == token:
+                    self._add_pair(events, parents, closed, stack,
+                                   token_start, pos,
+                                   end_match.start(), end_match.end())
+                    pos = end_match.end()
+        # Unclosed brackets are not pairs, so positions within them are
+        # within the pair around them.
+        resolved = []
+        for number, parent in enumerate(parents):
+            if not number % _SCAN_STEP:
+                yield
+            if closed[number] or parent < 0:
+                resolved.append(number if closed[number] else -1)
+            else:
+                resolved.append(resolved[parent])
+        for count, (key, number) in enumerate(events):
+            if not count % _SCAN_STEP:
+                yield
+            self._keys.append(key)
+            self._values.append(resolved[number] if number >= 0 else -1)
+    
+    def _add_pair(self, events, parents, closed, stack,
+                  open_start, open_end, close_start, close_end):
+        """Add a pair that closes as soon as it opens, such as a string."""
+        number = len(parents)
+        self._pairs.extend((open_start, open_end, close_start, close_end))
+        parents.append(stack[-1][1] if stack else -1)
+        closed.append(True)
+        events.append((open_end, number))
+        events.append((close_start + 1, parents[number]))
+
+def _get_string_delimiters(text, start, end):
+    """
+    Return the end of the opening quote and the start of the closing quote
+    of a highlighted string, or None if it does not have matching quotes.
+    """
+    match = _STRING_OPEN_RE.match(text, start, end)
+    if match:
+        quote = match.group(1)
+        close_start = end - len(quote)
+        if close_start >= match.end() and text[close_start:end] == quote:
+            return match.end(), close_start
+    return None
+
+class DocumentBrackets(object):
+    
+    """
+    Keeps a BracketIndex of a document (a gedit.Document), building it when
+    first needed and again, in idle time, when an edit or a change of
+    highlighting has made it unusable.
+    
+    Usage:
+        brackets = DocumentBrackets(doc, snapshots)
+        if brackets.build():
+            pair = brackets.find_pair(offset)
+        ...
+        brackets.disconnect()
+    
+    """
+    
+    def __init__(self, doc, snapshots):
+        """
+        Watch the document for changes, and take its text from snapshots (the
+        plugin's TextSnapshots) when the index is built.
+        """
+        self.doc = doc
+        """The document whose pairs are indexed."""
+        self.snapshots = snapshots
+        """The TextSnapshots the document's text is taken from."""
+        self._index = None
+        """The BracketIndex of the document (None until it is built)."""
+        self._build_steps = None
+        """The steps of the build of the index under way, if any."""
+        self._build_id = None
+        """Source id of the timeout or idle call that goes on building."""
+        self._handler_ids = [
+            doc.connect('insert-text', self._on_insert_text),
+            doc.connect('delete-range', self._on_delete_range),
+            doc.connect('notify::language', self._on_highlighting_changed),
+            doc.connect('notify::highlight-syntax',
+                        self._on_highlighting_changed),
+            ]
+        """Handlers of the document's signals."""
+    
+    def build(self):
+        """
+        Build the index for up to BUILD_TIME_SLICE milliseconds, leaving the
+        rest to idle time, and return whether it is built.
+        """
+        if self._index is None:
+            if self._build_slice(BUILD_TIME_SLICE / 1000.0):
+                self._cancel_build()
+            else:
+                self._schedule_build(0)
+        return self._index is not None
+    
+    def find_pair(self, offset):
+        """
+        Return the open_start, open_end, close_start and close_end offsets of
+        the innermost pair whose contents contain offset, or None.  (The rest
+        of the index is built now, if it is not built.)
+        """
+        if self._index is None:
+            self._build_slice(None)
+            self._cancel_build()
+        return self._index.find_pair(offset)
+    
+    def get_size(self):
+        """Return the bytes taken by the index (0 if it is not built)."""
+        return self._index.get_size() if self._index else 0
+    
+    def is_built(self):
+        """Return whether the index is built, so using it needs no scan."""
+        return self._index is not None
+    
+    def disconnect(self):
+        """Stop watching the document."""
+        for handler_id in self._handler_ids:
+            if self.doc.handler_is_connected(handler_id):
+                self.doc.disconnect(handler_id)
+        self._handler_ids = []
+        self._index = None
+        self._build_steps = None
+        self._cancel_build()
+    
+    def _build_slice(self, time_limit):
+        """
+        Go on building the index for one step, and then until time_limit
+        seconds have passed (or to the end, if it is None).  Return whether
+        it is built.
+        """
+        if self._build_steps is None:
+            self._build_steps = self._build()
+        if time_limit is not None:
+            stop_time = time.time() + time_limit
+        for step in self._build_steps:
+            if time_limit is not None and time.time() >= stop_time:
+                return False
+        self._build_steps = None
+        return True
+    
+    def _build(self):
+        """
+        Build a new BracketIndex of the document, yielding between steps.
+        The document must not change until it is done.
+        """
+        doc = self.doc
+        text = self.snapshots.get_text(doc)
+        if (doc.get_language() and doc.get_highlight_syntax() and
+                hasattr(doc, 'iter_forward_to_context_class_toggle')):
+            if hasattr(doc, 'ensure_highlight'):
+                chunk_start_iter = doc.get_start_iter()
+                while not chunk_start_iter.is_end():
+                    chunk_end_iter = chunk_start_iter.copy()
+                    chunk_end_iter.forward_lines(HIGHLIGHT_STEP_LINES)
+                    doc.ensure_highlight(chunk_start_iter, chunk_end_iter)
+                    chunk_start_iter = chunk_end_iter
+                    yield
+            comment_spans = []
+            for step in self._find_class_spans('comment', comment_spans):
+                yield
+            string_spans = []
+            for step in self._find_class_spans('string', string_spans):
+                yield
+            index = BracketIndex(text, comment_spans, string_spans,
+                                 time_limit=0)
+        else:
+            index = BracketIndex(text, time_limit=0)
+        while not index.scan(0):
+            yield
+        self._index = index
+    
+    def _find_class_spans(self, context_class, spans):
+        """
+        Add the (start, end) spans of a highlighting context class to spans,
+        yielding between steps.
+        """
+        doc = self.doc
+        class_iter = doc.get_start_iter()
+        start = None
+        if doc.iter_has_context_class(class_iter, context_class):
+            start = 0
+        toggles = 0
+        while doc.iter_forward_to_context_class_toggle(class_iter,
+                                                       context_class):
+            if start is None:
+                start = class_iter.get_offset()
+            else:
+                spans.append((start, class_iter.get_offset()))
+                start = None
+            toggles += 1
+            if not toggles % CLASS_STEP_TOGGLES:
+                yield
+        if start is not None:
+            spans.append((start, doc.get_char_count()))
+    
+    def _schedule_build(self, delay):
+        """
+        Go on building the index in idle time, after delay milliseconds.
+        """
+        self._cancel_build()
+        if delay:
+            self._build_id = gobject.timeout_add(delay,
+                                                 self._on_build_timeout)
+        else:
+            self._build_id = gobject.idle_add(self._on_build_idle)
+    
+    def _cancel_build(self):
+        """Stop the timeout or idle call that goes on building, if any."""
+        if self._build_id:
+            gobject.source_remove(self._build_id)
+            self._build_id = None
+    
+    def _on_build_timeout(self):
+        """Start building the index in idle time, once the edits pause."""
+        self._build_id = gobject.idle_add(self._on_build_idle)
+        return False
+    
+    def _on_build_idle(self):
+        """Build the index for a time slice, and again until it is built."""
+        if self._build_slice(BUILD_TIME_SLICE / 1000.0):
+            self._build_id = None
+            return False
+        return True
+    
+    def _drop(self):
+        """
+        Drop the index, or the build of it under way, and build it again
+        once the edits pause.
+        """
+        self._index = None
+        self._build_steps = None
+        self._schedule_build(REBUILD_DELAY)
+    
+    def _on_insert_text(self, doc, location, text, length):
+        """Keep or drop the index, before text is inserted."""
+        if self._index:
+            if not self._index.insert(location.get_offset(),
+                                      text.decode('utf-8'),
+                                      _get_around(location, location)):
+                self._drop()
+        elif self._build_steps or self._build_id:
+            self._drop()
+    
+    def _on_delete_range(self, doc, start_iter, end_iter):
+        """Keep or drop the index, before text is deleted."""
+        if self._index:
+            text = start_iter.get_slice(end_iter).decode('utf-8')
+            if not self._index.delete(start_iter.get_offset(),
+                                      end_iter.get_offset(), text,
+                                      _get_around(start_iter, end_iter)):
+                self._drop()
+        elif self._build_steps or self._build_id:
+            self._drop()
+    
+    def _on_highlighting_changed(self, doc, param):
+        """Drop the index, since comments and strings may have changed."""
+        if self._index or self._build_steps or self._build_id:
+            self._drop()
+
+def _get_around(start_iter, end_iter):
+    """Return the characters just before start_iter and after end_iter."""
+    before_iter = start_iter.copy()
+    before_iter.backward_char()
+    after_iter = end_iter.copy()
+    after_iter.forward_char()
+    return (before_iter.get_slice(start_iter) +
+            end_iter.get_slice(after_iter)).decode('utf-8')
+
+def _find_pair_slowly(text, offset):
+    """Return the innermost pair around offset by checking every pair."""
+    index = BracketIndex(text)
+    pairs = index._pairs
+    best = None
+    for number in range(len(index)):
+        pair = tuple(pairs[number * 4:number * 4 + 4])
+        if pair[2] >= 0 and pair[1] <= offset <= pair[2]:
+            if best is None or pair[1] > best[1]:
+                best = pair
+    return best
+
+def test():
+    """
+    Execute brackets.py at the command line to run this self test.
+    
+    It checks find_pair against a check of every pair for random texts, and
+    through random edits against a newly built index, checks an index built
+    a step at a time, and times building an index of a large text and
+    finding pairs in it.
+    """
+    import random
+    random.seed(40)
+    alphabet = u'ab (){}[]\'"\\\n'
+    for count in range(300):
+        text = u''.join(random.choice(alphabet) for i in range(40))
+        index = BracketIndex(text)
+        for offset in range(len(text) + 1):
+            assert index.find_pair(offset) == \
+                _find_pair_slowly(text, offset), (text, offset)
+    print('find_pair matches a check of every pair.')
+    
+    for count in range(300):
+        text = u''.join(random.choice(alphabet) for i in range(40))
+        index = BracketIndex(text)
+        for edit in range(8):
+            offset = random.randint(0, len(text))
+            if random.random() < 0.5:
+                inserted = u''.join(random.choice(u'ab \t')
+                                    for i in range(random.randint(1, 4)))
+                around = (text[max(offset - 1, 0):offset] +
+                          text[offset:offset + 1])
+                if not index.insert(offset, inserted, around):
+                    index = BracketIndex(text[:offset] + inserted +
+                                         text[offset:])
+                text = text[:offset] + inserted + text[offset:]
+            else:
+                end = offset + random.randint(1, 4)
+                deleted = text[offset:end]
+                around = text[max(offset - 1, 0):offset] + text[end:end + 1]
+                if not index.delete(offset, min(end, len(text)), deleted,
+                                    around):
+                    index = BracketIndex(text[:offset] + text[end:])
+                text = text[:offset] + text[end:]
+            fresh = BracketIndex(text)
+            for offset in range(len(text) + 1):
+                assert index.find_pair(offset) == fresh.find_pair(offset), \
+                    (text, offset)
+    print('find_pair is kept through edits.')
+    
+    assert BracketIndex(u'# (a)\n(b)', [(0, 5)]).find_pair(2) is None
+    assert BracketIndex(u"f('(a')", [], [(2, 6)]).find_pair(3) == (2, 3, 5, 6)
+    assert BracketIndex(u"f('(a')", [], [(2, 6)]).find_pair(6) == (1, 2, 6, 7)
+    print('Comment and string spans are skipped.')
+    
+    line = u'    call(first[i], {"key": (a, b)}, "text (not a pair)")\n'
+    text = line * 20000
+    start = time.time()
+    index = BracketIndex(text)
+    build_time = time.time() - start
+    stepped = BracketIndex(text, time_limit=0)
+    steps = 1
+    longest_step = 0
+    while not stepped.is_built():
+        step_start = time.time()
+        stepped.scan(0)
+        longest_step = max(longest_step, time.time() - step_start)
+        steps += 1
+    assert steps > 1
+    for offset in range(0, len(text), 97):
+        assert stepped.find_pair(offset) == index.find_pair(offset)
+    print('An index built a step at a time finds the same pairs.')
+    start = time.time()
+    for offset in range(0, len(text), 97):
+        index.find_pair(offset)
+    find_time = (time.time() - start) / len(range(0, len(text), 97))
+    print('Text of %d characters, %d pairs:' % (len(text), len(index)))
+    print('    building the index: %8.2f ms' % (build_time * 1000))
+    print('    longest build step: %8.2f ms (of %d)' % (longest_step * 1000,
+                                                      steps))
+    print('    finding a pair:     %8.4f ms' % (find_time * 1000))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,241 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module keeps everything the plugin caches within one memory budget.
+
+Classes:
+CacheManager -- the cache entries of each document, evicted least recently
+                clicked document first
+
+The plugin owns one CacheManager, which holds the text snapshots, compiled
+regexes, retained boundaries, match indexes, selection ladders and structure
+indexes of all windows.  Each entry is stored under a document (or under
+None, for entries such as compiled regexes that are not of any document), a
+kind and a key, with an estimate of the bytes it takes.  When the entries
+take more than the budget, all the entries of the document least recently
+clicked are evicted, then those of the next, and so on, though never those
+of a document active in a window or of the document being stored for.
+
+Each document's 'changed' signal is watched from its first entry on.  A
+change counts against the document and drops its entries, except those
+stored as following edits (such as the structure indexes, which update
+themselves).
+
+"""
+
+class CacheManager(object):
+    
+    """
+    The cache entries of each document, within a memory budget.
+    
+    Usage:
+        caches = CacheManager(budget, get_active_documents)
+        value = caches.get(doc, kind, key) # None if not cached
+        if value is None:
+            value = ...
+            caches.put(doc, kind, key, value, size)
+        caches.touch(doc) # when the document is clicked
+        ...
+        caches.forget(doc) # when the document is closed
+        caches.clear()
+    
+    """
+    
+    def __init__(self, budget, get_active_documents):
+        """
+        Prepare to keep entries within budget bytes, with
+        get_active_documents returning the documents whose entries are not
+        to be evicted.
+        """
+        self.budget = budget
+        """Bytes the entries may take before documents' entries are evicted."""
+        self._get_active_documents = get_active_documents
+        """Returns the documents active in the windows."""
+        self._caches = {}
+        """The _DocumentCache of each document (and of None)."""
+        self._size = 0
+        """Bytes taken by all the entries."""
+        self._use_count = 0
+        """The number of uses so far, which orders them."""
+        self._hits = {}
+        """The number of entries found, by kind."""
+        self._misses = {}
+        """The number of entries not found, by kind."""
+        self._evictions = 0
+        """The number of documents whose entries were evicted."""
+    
+    def get(self, doc, kind, key=None):
+        """Return the value of the entry, or None if there is none."""
+        cache = self._caches.get(doc)
+        entry = cache and cache.entries.get((kind, key))
+        if entry is None:
+            self._misses[kind] = self._misses.get(kind, 0) + 1
+            return None
+        self._hits[kind] = self._hits.get(kind, 0) + 1
+        return entry[0]
+    
+    def peek(self, doc, kind, key=None):
+        """
+        Return the value of the entry, or None, without counting it as a hit
+        or miss.
+        """
+        cache = self._caches.get(doc)
+        entry = cache and cache.entries.get((kind, key))
+        return entry and entry[0]
+    
+    def put(self, doc, kind, key, value, size, on_evict=None,
+            follows_edits=False):
+        """
+        Store value (taking about size bytes) as the entry, then evict other
+        documents' entries while over the budget.  on_evict is called when
+        the entry is dropped.  If follows_edits is True, the entry is kept
+        when the document changes.  Storing the same value again only
+        updates its size.
+        """
+        cache = self._get_cache(doc)
+        old_entry = cache.entries.get((kind, key))
+        if old_entry:
+            self._size -= old_entry[1]
+            if old_entry[0] is not value and old_entry[2]:
+                old_entry[2]()
+        cache.entries[(kind, key)] = (value, size, on_evict, follows_edits)
+        self._size += size
+        self._use(cache)
+        if self._size > self.budget:
+            self._evict(doc)
+    
+    def drop(self, doc, kind, key=None):
+        """Drop the entry, if it is stored."""
+        cache = self._caches.get(doc)
+        if cache and (kind, key) in cache.entries:
+            self._drop_entry(cache, (kind, key))
+    
+    def touch(self, doc):
+        """Mark the document as clicked, for the order of eviction."""
+        self._use(self._get_cache(doc))
+    
+    def get_change_count(self, doc):
+        """Return the number of changes of the document counted so far."""
+        return self._get_cache(doc).change_count
+    
+    def forget(self, doc):
+        """Drop the document's entries and stop watching it."""
+        cache = self._caches.pop(doc, None)
+        if cache:
+            for entry_key in cache.entries.keys():
+                self._drop_entry(cache, entry_key)
+            if doc is not None and doc.handler_is_connected(cache.handler_id):
+                doc.disconnect(cache.handler_id)
+    
+    def clear(self):
+        """Drop all the entries."""
+        for doc in self._caches.keys():
+            self.forget(doc)
+    
+    def get_stats(self):
+        """Return a report of the occupancy and hit rates, as text."""
+        sizes = {}
+        counts = {}
+        for cache in self._caches.itervalues():
+            for (kind, key), entry in cache.entries.iteritems():
+                sizes[kind] = sizes.get(kind, 0) + entry[1]
+                counts[kind] = counts.get(kind, 0) + 1
+        lines = ['Using %s of %s, for %d documents (%d evicted).' %
+                 (_format_size(self._size), _format_size(self.budget),
+                  len([doc for doc in self._caches if doc is not None]),
+                  self._evictions)]
+        for kind in sorted(set(sizes) | set(self._hits) | set(self._misses)):
+            hits = self._hits.get(kind, 0)
+            lookups = hits + self._misses.get(kind, 0)
+            hit_rate = ('%d%%' % (100 * hits // lookups) if lookups
+                        else 'none')
+            lines.append('%s: %d entries, %s, hits %s of %d lookups' %
+                         (kind, counts.get(kind, 0),
+                          _format_size(sizes.get(kind, 0)), hit_rate, lookups))
+        return '\n'.join(lines)
+    
+    def _get_cache(self, doc):
+        """Return the document's _DocumentCache, watching it if new."""
+        cache = self._caches.get(doc)
+        if cache is None:
+            handler_id = (doc.connect('changed', self._on_changed)
+                          if doc is not None else None)
+            cache = _DocumentCache(handler_id)
+            self._caches[doc] = cache
+        return cache
+    
+    def _use(self, cache):
+        """Mark the cache as the most recently used."""
+        self._use_count += 1
+        cache.last_use = self._use_count
+    
+    def _drop_entry(self, cache, entry_key):
+        """Remove an entry from the cache, calling its on_evict."""
+        value, size, on_evict, follows_edits = cache.entries.pop(entry_key)
+        self._size -= size
+        if on_evict:
+            on_evict()
+    
+    def _on_changed(self, doc):
+        """Count the change and drop the entries that do not follow edits."""
+        cache = self._caches[doc]
+        cache.change_count += 1
+        for entry_key, entry in cache.entries.items():
+            if not entry[3]:
+                self._drop_entry(cache, entry_key)
+    
+    def _evict(self, keep_doc):
+        """
+        Evict the entries of the least recently used documents, other than
+        keep_doc and the active documents, until within the budget.
+        """
+        active_documents = self._get_active_documents()
+        evictable = sorted((cache.last_use, doc)
+                           for doc, cache in self._caches.iteritems()
+                           if cache.entries and doc is not keep_doc and
+                           doc not in active_documents)
+        for last_use, doc in evictable:
+            if self._size <= self.budget:
+                break
+            cache = self._caches[doc]
+            for entry_key in cache.entries.keys():
+                self._drop_entry(cache, entry_key)
+            self._evictions += 1
+
+class _DocumentCache(object):
+    
+    """The cache entries of one document."""
+    
+    __slots__ = ('handler_id', 'entries', 'change_count', 'last_use')
+    
+    def __init__(self, handler_id):
+        self.handler_id = handler_id
+        """Handler of the document's 'changed' signal (None for None)."""
+        self.entries = {}
+        """The value, size, on_evict and follows_edits of each entry."""
+        self.change_count = 0
+        """The number of changes of the document."""
+        self.last_use = 0
+        """When the document was last used, as a use count."""
+
+def _format_size(size):
+    """Return a byte count as text in KB or MB."""
+    if size >= 1024 * 1024:
+        return '%.1f MB' % (size / (1024.0 * 1024))
+    return '%.1f KB' % (size / 1024.0)
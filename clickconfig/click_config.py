@@ -32,21 +32,73 @@ Settings specific to one window are attributes of ClickConfigWindowHelper.
 
 """
 
-import itertools
+import logging
 import os
 import re
 import sys
 import time
 
 import gedit
+import gobject
 import gtk
 import gtksourceview2
 
+from .boundaries import find_boundaries, ChunkedBoundaryScan
+from .brackets import DocumentBrackets
+from .caches import CacheManager
+from .clickstate import ClickCounter, CLICK_NAMES, CONSUMED
+from .drag import (DragSelector, BoundarySpans, LineBoundarySpans,
+                   StructureSpans, make_regex_spans)
+from .indents import DocumentIndents
+from .linearre import LinearPattern
+from .ladder import SelectionLadder
+from .highlight import MatchHighlighter
+from .lines import DocumentLines
+from .matches import MatchIndex
+from .menus import CategoryMenus
+from .preview import HoverPreview
+from .snapshots import TextSnapshots
 from .data import SelectionOp, ConfigSet, Config
+from .regexcheck import find_hazards
+from .structure import find_structure_span
 from .ui import ConfigUI
+from .worker import MatchWorker
 from .logger import Logger
 LOGGER = Logger(level=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')[2])
 
+CHUNKED_SCAN_MIN_LENGTH = 200000
+"""Document length from which multiline regexes are scanned in steps."""
+
+DRAG_FRAME_TIME = 16
+"""
+Milliseconds between selection updates (and scroll steps) of a drag, and
+between updates of the hover preview and of match highlights.
+"""
+
+DRAG_SCROLL_RATE = 0.25
+"""Pixels to scroll per frame per pixel the pointer is beyond the view."""
+
+REGEX_ENTRY_SIZE = 16 * 1024
+"""Estimated bytes of a cached compiled regex, with its engine's caches."""
+
+HAZARDS_ENTRY_SIZE = 256
+"""Estimated bytes of the cached list of a regex's risky repeats."""
+
+BOUNDARY_ENTRY_SIZE = 32
+"""Estimated bytes per boundary of retained boundaries (item and int)."""
+
+STALE_MATCH_TIME = 0.2
+"""
+Seconds a dropped request may have been in the match worker before a new
+request replaces the worker's process rather than wait behind it.
+"""
+
+STRUCTURE_INDEX_CLASSES = {
+    'brackets': DocumentBrackets,
+    'indent': DocumentIndents,
+    }
+"""The per-document index class of each structure that uses one."""
+
 class ClickConfigPlugin(gedit.Plugin):
     
     """
@@ -75,6 +127,13 @@ class ClickConfigPlugin(gedit.Plugin):
                                called by the ConfigUI object when the
                                Browse button is clicked.
     get_gedit_window        -- Returns the current gedit window.
+    submit_match            -- Has the match worker process find
+                               boundaries, and calls back with them.
+    submit_index            -- Has the match worker process find a
+                               MatchIndex, and calls back with it.
+    cancel_match            -- Drops a submitted match request.
+    update_hover_preview    -- Turns the hover preview on or off in all
+                               windows, as configured.
     
     """
     
@@ -95,6 +154,29 @@ class ClickConfigPlugin(gedit.Plugin):
         
         self.conf = None
         """This object contains all the settings."""
+        
+        self.match_worker = None
+        """The MatchWorker process, if regexes are matched out of process."""
+        self._match_watch_id = None
+        """Source id of the watch for the match worker's results."""
+        self._match_request = None
+        """
+        The id, callback, timeout source id, submission time and request
+        (the MatchWorker method's name and its arguments) of the request the
+        match worker is running, or None.
+        """
+        self._next_match_request = None
+        """
+        The id, callback and request of the newest request waiting for the
+        match worker to be idle, or None.
+        """
+        self._last_match_request_id = 0
+        """The id of the most recently submitted request."""
+        
+        self.caches = None
+        """The CacheManager of all windows' caches."""
+        self.text_snapshots = None
+        """The TextSnapshots of documents, shared by all windows."""
     
     def activate(self, window):
         """Start a ClickConfigWindowHelper instance for this gedit window."""
@@ -114,9 +196,16 @@ class ClickConfigPlugin(gedit.Plugin):
             self.conf.filename = os.path.join(config_dir,
                                               'click_config_configs')
             if os.path.exists(self.conf.filename):
+                default_ops = self.conf.ops
                 self.conf.load()
+                self.conf.update_structures(default_ops)
             
             self.conf.check_language_configsets()
+            if self.conf.is_match_in_worker:
+                self._start_match_worker()
+            self.caches = CacheManager(self.conf.cache_budget,
+                                       self._get_active_documents)
+            self.text_snapshots = TextSnapshots(self.caches)
         self._instances[window] = ClickConfigWindowHelper(self, window)
         self._instances[window].activate()
     
@@ -126,6 +215,12 @@ class ClickConfigPlugin(gedit.Plugin):
         self._instances[window].deactivate()
         self._instances.pop(window)
         if not self._instances:
+            if self.config_ui:
+                self.config_ui.window.destroy()
+            self._stop_match_worker()
+            self.caches.clear()
+            self.caches = None
+            self.text_snapshots = None
             self.conf = None
             self.config_ui = None
             self.plugin_path = None
@@ -142,9 +237,13 @@ class ClickConfigPlugin(gedit.Plugin):
         return True
     
     def create_configure_dialog(self):
-        """Produce the configuration window and provide it to gedit."""
+        """
+        Produce the configuration window and provide it to gedit.
+        The window is kept (hidden) when closed, so it is only built once.
+        """
         LOGGER.log()
         if self.config_ui:
+            self.config_ui.refresh()
             self.config_ui.window.present()
         else:
             self.config_ui = ConfigUI(self)
@@ -166,26 +265,44 @@ class ClickConfigPlugin(gedit.Plugin):
                 pattern='[-A-Za-z0-9,./?%&#:_]+'),
             SelectionOp('Line',
                 pattern='.*',
-                preserved=True),
+                preserved=True,
+                structure='line'),
             SelectionOp('Line+',
                 pattern='^.*\\n',
                 flags=re.M,
-                preserved=True),
+                preserved=True,
+                structure='line+'),
             SelectionOp('Python name',
                 pattern='[_a-zA-Z][_a-zA-Z0-9]*',
                 preserved=True),
             SelectionOp('Paragraph',
                 pattern=('(?: ^ (?:  [ \\t]*  \\S+  [ \\t]*  )  +  \\n  )+'
                  '  # \xe2\x9c\x94X allows comment'),
-                flags=(re.M + re.X)),
+                flags=(re.M + re.X),
+                structure='paragraph'),
             SelectionOp('Paragraph+',
                 pattern='(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+(?:[ \\t]*\\n)?',
                 flags=re.M,
-                preserved=True),
+                preserved=True,
+                structure='paragraph+'),
+            SelectionOp('Brackets',
+                pattern=('(?<=\\()[^()]*(?=\\))|'
+                         '(?<=\\[)[^][]*(?=\\])|'
+                         '(?<=\\{)[^{}]*(?=\\})'),
+                preserved=True,
+                structure='brackets'),
+            SelectionOp('Indent block',
+                pattern=('^([ \\t]*)\\S.*\\n'
+                         '(?:\\1[ \\t]+\\S.*\\n|[ \\t]*\\n)*'),
+                flags=re.M,
+                preserved=True,
+                structure='indent'),
             SelectionOp('Python name 2',
                 pattern='[_a-z][_.a-z0-9]*',
                 flags=re.I),
             ]
+        self.conf.offered_structure_ops = [op.name for op in self.conf.ops
+                                           if op.structure]
         self.conf.configsets = [
             ConfigSet('gedit built-in',
                 op_names=[
@@ -227,10 +344,22 @@ class ClickConfigPlugin(gedit.Plugin):
         LOGGER.log()
         self.conf = conf
         self.conf.save()
+        self.caches.budget = self.conf.cache_budget
+        if self.conf.is_match_in_worker and not self.match_worker:
+            self._start_match_worker()
+        elif not self.conf.is_match_in_worker and self.match_worker:
+            self._stop_match_worker()
         for window in self._instances:
             self._instances[window].update_menu()
+        self.update_hover_preview()
         LOGGER.log('Configuration updated.')
     
+    def update_hover_preview(self):
+        """Turn the hover preview on or off in each window, as configured."""
+        LOGGER.log()
+        for window in self._instances:
+            self._instances[window].update_hover_preview()
+    
     def open_config_dir(self):
         """Open a Nautilus window of the configuration file's directory."""
         LOGGER.log()
@@ -247,6 +376,220 @@ class ClickConfigPlugin(gedit.Plugin):
         LOGGER.log()
         return gedit.app_get_default().get_active_window()
     
+    def submit_match(self, word_re, source_text, callback):
+        """
+        Have the match worker find the boundaries of the compiled regex in
+        the text, as find_boundaries would, and pass them to callback once
+        they arrive.  The callback gets None instead if the regex runs out of
+        time or cannot be matched, or if a newer request replaces it while
+        it waits for the worker.
+        Return the request id, or None if there is no worker to ask.
+        """
+        LOGGER.log()
+        return self._submit_request('submit', (word_re, source_text),
+                                    callback)
+    
+    def submit_index(self, word_re, text, line_offsets, callback):
+        """
+        Have the match worker find the MatchIndex of the compiled regex in
+        the text (in each of the lines of line_offsets, if they are given),
+        and pass it to callback once it arrives, or None, as for
+        submit_match.
+        Return the request id, or None if there is no worker to ask.
+        """
+        LOGGER.log()
+        return self._submit_request('submit_index',
+                                    (word_re, text, line_offsets), callback)
+    
+    def cancel_match(self, request_id):
+        """Drop the request, so its results will be ignored."""
+        LOGGER.log()
+        if self._match_request and self._match_request[0] == request_id:
+            self._match_request[1] = None
+        elif (self._next_match_request and
+                self._next_match_request[0] == request_id):
+            self._next_match_request = None
+    
+    def _submit_request(self, submit_name, args, callback):
+        """
+        Submit a request to the match worker, with the name of the
+        MatchWorker method to submit it with and its arguments, now if the
+        worker is idle, or else once it is.
+        Return the request id, or None if there is no worker to ask.
+        """
+        LOGGER.log()
+        if not self.match_worker:
+            return None
+        self._last_match_request_id += 1
+        request_id = self._last_match_request_id
+        request = (submit_name, args)
+        running = self._match_request
+        if (running and running[1] is None and
+                time.time() - running[3] > STALE_MATCH_TIME):
+            # A dropped request is still running; don't wait behind it.
+            LOGGER.log('Replacing match worker busy with a stale request.',
+                       level='debug')
+            self._restart_match_worker()
+        if not self._match_request:
+            if not self._run_match_request(request_id, callback, request):
+                return None
+            return request_id
+        # The worker is sent one request at a time, so that sending the text
+        # cannot block on a pipe the worker is too busy to read.
+        waiting = self._next_match_request
+        self._next_match_request = [request_id, callback, request]
+        if waiting and waiting[1]:
+            waiting[1](None)
+        return request_id
+    
+    def _start_match_worker(self):
+        """Start the worker process that regexes are matched in."""
+        LOGGER.log()
+        self.match_worker = MatchWorker()
+        self.match_worker.start()
+        self._watch_match_worker()
+    
+    def _stop_match_worker(self):
+        """Stop the match worker, failing any requests still pending."""
+        LOGGER.log()
+        if not self.match_worker:
+            return
+        self._unwatch_match_worker()
+        self.match_worker.stop()
+        self.match_worker = None
+        self._fail_match_requests()
+    
+    def _restart_match_worker(self):
+        """
+        Replace the match worker's process, abandoning the request it was
+        running, and send the new process the waiting request, if any.
+        """
+        LOGGER.log()
+        self._unwatch_match_worker()
+        self.match_worker.restart()
+        self._watch_match_worker()
+        self._end_match_request()
+        self._send_next_match_request()
+    
+    def _run_match_request(self, request_id, callback, request):
+        """
+        Send a request to the idle match worker, and give it its time budget.
+        Return False if the worker could not be reached.
+        """
+        submit_name, args = request
+        try:
+            getattr(self.match_worker, submit_name)(*args,
+                                                     request_id=request_id)
+        except (IOError, OSError):
+            LOGGER.log('Match worker could not be reached.', level='warning')
+            self._restart_match_worker()
+            return False
+        timeout_id = gobject.timeout_add(self.conf.match_time_budget,
+                                         self._on_match_timeout, request_id)
+        self._match_request = [request_id, callback, timeout_id,
+                               time.time(), request]
+        return True
+    
+    def _send_next_match_request(self):
+        """Send the waiting request, if any, once the match worker is idle."""
+        if self._match_request or not self._next_match_request:
+            return
+        request_id, callback, request = self._next_match_request
+        self._next_match_request = None
+        if not self._run_match_request(request_id, callback, request):
+            if callback:
+                callback(None)
+    
+    def _end_match_request(self):
+        """
+        Forget the request the match worker is running, and return its
+        callback, or None if there is none.
+        """
+        if not self._match_request:
+            return None
+        request_id, callback, timeout_id, submit_time, request = \
+            self._match_request
+        self._match_request = None
+        if timeout_id:
+            gobject.source_remove(timeout_id)
+        return callback
+    
+    def _watch_match_worker(self):
+        """Have _on_match_results called when the worker sends results."""
+        self._match_watch_id = gobject.io_add_watch(
+            self.match_worker.fileno(),
+            gobject.IO_IN | gobject.IO_HUP,
+            self._on_match_results)
+    
+    def _unwatch_match_worker(self):
+        """Stop watching for the worker's results."""
+        if self._match_watch_id:
+            gobject.source_remove(self._match_watch_id)
+            self._match_watch_id = None
+    
+    def _fail_match_requests(self):
+        """Give None to the callbacks of the running and waiting requests."""
+        LOGGER.log()
+        callbacks = [self._end_match_request()]
+        if self._next_match_request:
+            callbacks.append(self._next_match_request[1])
+            self._next_match_request = None
+        for callback in callbacks:
+            if callback:
+                callback(None)
+    
+    def _on_match_results(self, source, condition):
+        """Pass results from the match worker to their callback."""
+        LOGGER.log()
+        worker = self.match_worker
+        watch_id = self._match_watch_id
+        try:
+            while worker.poll():
+                request_id, results = worker.receive()
+                if (not self._match_request or
+                        self._match_request[0] != request_id):
+                    continue
+                callback = self._end_match_request()
+                self._send_next_match_request()
+                if callback:
+                    callback(results)
+                if self._match_watch_id != watch_id:
+                    # A callback restarted or stopped the worker.
+                    return False
+        except (EOFError, IOError, OSError):
+            condition |= gobject.IO_HUP
+        if condition & gobject.IO_HUP:
+            LOGGER.log('Match worker ended unexpectedly.', level='warning')
+            self._match_watch_id = None
+            # The request it was running is not tried again, in case it is
+            # what ended it.
+            callback = self._end_match_request()
+            self._restart_match_worker()
+            if callback:
+                callback(None)
+            return False
+        return True
+    
+    def _on_match_timeout(self, request_id):
+        """
+        Kill the match worker, which has spent too long on the request it is
+        running, and go on to the waiting request, if any.
+        """
+        LOGGER.log()
+        # This timeout source ends on returning.
+        self._match_request[2] = None
+        LOGGER.log('Regex matching ran out of time; match worker killed.',
+                   level='warning')
+        callback = self._end_match_request()
+        self._restart_match_worker()
+        if callback:
+            callback(None)
+        return False
+    
+    def _get_active_documents(self):
+        """Return the active document of each gedit window."""
+        return [window.get_active_document() for window in self._instances]
+    
     def _get_languages(self):
         """Return a list of the languages known to gedit."""
         LOGGER.log()
@@ -295,6 +638,24 @@ class ClickConfigWindowHelper(object):
                           deactivate for this window.
     open_config_window -- calls ClickConfigPlugin method to open the
                           configuration window.
+    show_statistics    -- shows the occupancy and hit rates of the
+                          plugin's caches and the latency of the hover
+                          preview (from the menu, while debugging).
+    update_hover_preview -- ClickConfigPlugin calls this to connect or
+                          disconnect the hover preview as configured.
+    on_hover_preview_toggled -- the Hover Preview menu item calls this
+                          to turn the hover preview on or off.
+    select_next_match  -- selects the next match of the SelectionOp of
+                          the last selection.
+    select_previous_match -- selects the previous match of that
+                          SelectionOp.
+    on_highlight_matches_toggled -- the Highlight Matches menu item
+                          calls this to turn highlighting of that
+                          SelectionOp's matches on or off.
+    expand_selection   -- selects the next larger of the nested
+                          selections of the ladder's SelectionOps
+                          around the cursor.
+    shrink_selection   -- selects the next smaller of them.
     update_ui          -- ClickConfigPlugin calls this when gedit calls
                           update_ui for this window.  It activates the
                           menu for the gedit window and connects the
@@ -329,20 +690,47 @@ class ClickConfigWindowHelper(object):
         """The menu's UI identity, saved for removal."""
         self._action_group = None
         """The menu's action group, saved for removal."""
-        
-        self._last_click = [None, 0, 0, 0, 0, 0]
-        """
-        The gtk.TextIter of the most recent click and the times of the most
-        recent click for each of the five click types.
-        """
+        self._category_menus = None
+        """The CategoryMenus of the menu's SelectionOp categories."""
         
         gtk_settings = gtk.settings_get_default()
-        gtk_doubleclick_ms = gtk_settings.get_property('gtk-double-click-time')
-        self._double_click_time = float(gtk_doubleclick_ms)/1000
-        """Maximum time between consecutive clicks in a multiple click."""
+        self._click_counter = ClickCounter(
+            gtk_settings.get_property('gtk-double-click-time'))
+        """Counts the clicks of multiple clicks (within a time in ms)."""
+        self._double_click_distance = \
+            gtk_settings.get_property('gtk-double-click-distance')
+        """Maximum pointer movement (pixels) within a multiple click."""
         
         self._mouse_handler_ids_per_view = {}
         """The mouse handler id for each of the window's views."""
+        self._preview_handler_ids_per_view = {}
+        """Motion and leave handlers of the hover preview, for each view."""
+        
+        self._hover_preview = HoverPreview(
+            self._get_preview_finder, DRAG_FRAME_TIME,
+            plugin.conf.hover_preview_time_budget)
+        """Underlines the selection a click would make under the pointer."""
+        self._preview_spans = None
+        """The key of the preview's last regex spans, and those spans."""
+        
+        self._last_op_name = None
+        """Name of the SelectionOp of the window's last selection."""
+        self._is_highlighting_matches = False
+        """Whether that SelectionOp's matches are highlighted."""
+        self._match_highlighter = None
+        """The MatchHighlighter of the active view, while highlighting."""
+        self._ladder_key = None
+        """
+        The document, anchor offset and SelectionOp names of the
+        SelectionLadder last stepped through.
+        """
+        self._ladder_scan = None
+        """
+        The document, its change count and the (pattern, flags) of the
+        multiline regex whose boundaries are being found for a ladder, with
+        the id of the match worker request (None if it failed) and the
+        source id of the idle callback scanning in its place, or None.
+        """
         
         self._key_handler_ids_per_view = {}
         """The key_press handler id for each of the window's views."""
@@ -359,17 +747,62 @@ class ClickConfigWindowHelper(object):
         """Signal handler for a tab being removed from the window."""
         
         # These attributes are used for extending the selection for click-drag.
-        self._word_re = None
-        """The compiled regular expression object of the current click."""
         self._boundaries = None
-        """All start and end positions of matches of the current click."""
-        self._click_start_iter = None
-        """Start iter of the clicked selection."""
-        self._click_end_iter = None
-        """End iter of the clicked selection."""
+        """Boundaries found for the current click before its selection."""
+        self._drag_selector = None
+        """The DragSelector that extends the current click's selection."""
+        self._drag_pointer = None
+        """View, window type and position of the pointer's last motion."""
+        self._drag_frame_id = None
+        """Source id of the timeout for the next frame of a drag."""
+        
+        
+        # These attributes are used for preparing the next click's selection
+        # while waiting to see if there will be a next click.
+        self._speculation = None
+        """Source text and boundaries of the next click's regex, by key."""
+        self._speculation_idle_id = None
+        """Source id of the idle callback that finds boundaries in advance."""
+        self._speculation_timeout_id = None
+        """Source id of the timeout that discards the speculation."""
+        self._speculation_motion = None
+        """The view and handler id that watch for the pointer moving."""
+        
+        # These attributes are used for scanning a long document in steps.
+        self._chunked_scan = None
+        """The ChunkedBoundaryScan in progress."""
+        self._chunked_scan_offset = None
+        """The click offset to select at once the scan is done."""
+        self._chunked_scan_idle_id = None
+        """Source id of the idle callback continuing the scan."""
+        self._chunked_scan_changed = None
+        """The document and handler id that watch for edits during the scan."""
+        
+        # These attributes are used for matching in the match worker process.
+        self._match_request = None
+        """
+        The id of the click's pending match worker request, and the document
+        and handler id that watch for edits while it is pending.
+        """
+        self._speculation_request = None
+        """The id of the speculation's pending match worker request."""
+        self._index_request = None
+        """
+        The id of the match worker request for a MatchIndex (None if it
+        failed), the document, its change count and the index's key, and
+        whether to select the next match (True) or previous one (False)
+        once it arrives (or None), while it is pending or failed.
+        """
     
     def _insert_menu(self):
-        """Create the Click Config submenu under the Edit menu."""
+        """
+        Create the Click Config submenu under the Edit menu.
+        
+        Uncategorized SelectionOps are listed directly in the submenu.  Each
+        category gets its own nested submenu (from CategoryMenus), which
+        stays empty until it is first opened, so that a large SelectionOp
+        library does not have to be realised as menu items up front.
+        """
         LOGGER.log()
         
         actions = []
@@ -387,54 +820,162 @@ class ClickConfigWindowHelper(object):
         callback = lambda action: self.open_config_window()
         actions.append((name, stock_id, label, accelerator, tooltip, callback))
         
-        op_menuitems = ''
-        for op_name in self._plugin.conf.get_op_names()[1:]:
-            # Iterating get_op_names ensures that the names are sorted.
-            op = self._plugin.conf.get_op(op_name=op_name)
-            name = op.name
+        # The statistics are only offered while debugging.
+        statistics_menuitem = ''
+        if LOGGER.logger.isEnabledFor(logging.DEBUG):
+            name = 'Statistics'
             stock_id = None
-            label = op.name
+            label = 'Statistics'
             accelerator = ''
-            flag_text =  ' I' * bool(op.flags & re.I)
-            flag_text += ' M' * bool(op.flags & re.M)
-            flag_text += ' S' * bool(op.flags & re.S)
-            flag_text += ' X' * bool(op.flags & re.X)
-            flag_text = flag_text or '(None)'
-            tooltip = ('Select text at the cursor location: '
-                    'pattern = %s, flags = %s' % (repr(op.pattern), flag_text))
-            callback = lambda action: self._select_op(
-                        self._plugin.conf.get_op(op_name=action.get_name()))
-            action = (name, stock_id, label, accelerator, tooltip, callback)
-            actions.append(action)
-            op_menuitems += '\n' + ' ' * 22 + '<menuitem action="%s"/>' % name
+            tooltip = ('Show the memory and hit rates of the Click Config '
+                       'caches and the latency of the hover preview')
+            callback = lambda action: self.show_statistics()
+            actions.append((name, stock_id, label, accelerator, tooltip,
+                            callback))
+            statistics_menuitem = ('\n' + ' ' * 22 +
+                                   '<menuitem action="Statistics"/>')
+        
+        toggle_actions = []
+        
+        name = 'HoverPreview'
+        stock_id = None
+        label = 'Hover Preview'
+        accelerator = ''
+        tooltip = 'Underline the selection a click would make at the pointer'
+        callback = self.on_hover_preview_toggled
+        is_active = self._plugin.conf.is_hover_preview
+        toggle_actions.append((name, stock_id, label, accelerator, tooltip,
+                               callback, is_active))
+        
+        name = 'SelectNextMatch'
+        stock_id = None
+        label = 'Select Next Match'
+        accelerator = ''
+        tooltip = 'Select the next match of the last selection\'s op'
+        callback = lambda action: self.select_next_match()
+        actions.append((name, stock_id, label, accelerator, tooltip, callback))
+        
+        name = 'SelectPreviousMatch'
+        stock_id = None
+        label = 'Select Previous Match'
+        accelerator = ''
+        tooltip = 'Select the previous match of the last selection\'s op'
+        callback = lambda action: self.select_previous_match()
+        actions.append((name, stock_id, label, accelerator, tooltip, callback))
+        
+        name = 'HighlightMatches'
+        stock_id = None
+        label = 'Highlight Matches'
+        accelerator = ''
+        tooltip = 'Highlight all matches of the last selection\'s op'
+        callback = self.on_highlight_matches_toggled
+        is_active = self._is_highlighting_matches
+        toggle_actions.append((name, stock_id, label, accelerator, tooltip,
+                               callback, is_active))
+        
+        name = 'ExpandSelection'
+        stock_id = None
+        label = 'Expand Selection'
+        accelerator = '<Shift><Alt>Right'
+        tooltip = 'Select the next larger selection around the cursor'
+        callback = lambda action: self.expand_selection()
+        actions.append((name, stock_id, label, accelerator, tooltip, callback))
+        
+        name = 'ShrinkSelection'
+        stock_id = None
+        label = 'Shrink Selection'
+        accelerator = '<Shift><Alt>Left'
+        tooltip = 'Select the next smaller selection around the cursor'
+        callback = lambda action: self.shrink_selection()
+        actions.append((name, stock_id, label, accelerator, tooltip, callback))
+        
+        top_names, names_by_category = \
+            self._plugin.conf.get_op_names_by_category()
+        
+        op_menuitems = ''
+        for op_name in top_names:
+            actions.append(self._get_op_action_entry(op_name))
+            op_menuitems += ('\n' + ' ' * 22 +
+                             '<menuitem action="%s"/>' % op_name)
         
         self._action_group = gtk.ActionGroup("ClickConfigPluginActions")
         self._action_group.add_actions(actions)
+        self._action_group.add_toggle_actions(toggle_actions)
         manager = self._window.get_ui_manager()
         manager.insert_action_group(self._action_group, -1)
         
+        category_ui_template = """
+            <ui>
+              <menubar name="MenuBar">
+                <menu name="EditMenu" action="Edit">
+                  <placeholder name="EditOps_6">
+                    <menu action="ClickConfig">%s</menu>
+                  </placeholder>
+                </menu>
+              </menubar>
+            </ui>
+            """
+        self._category_menus = CategoryMenus(manager, self._action_group,
+                                             category_ui_template,
+                                             self._get_op_action_entry)
+        op_menuitems += self._category_menus.add(names_by_category)
+        
         ui_str = """
             <ui>
               <menubar name="MenuBar">
                 <menu name="EditMenu" action="Edit">
                   <placeholder name="EditOps_6">
                     <menu action="ClickConfig">
-                      <menuitem action="Configure"/>
+                      <menuitem action="Configure"/>%s
+                      <menuitem action="HoverPreview"/>
+                      <separator/>
+                      <menuitem action="SelectNextMatch"/>
+                      <menuitem action="SelectPreviousMatch"/>
+                      <menuitem action="HighlightMatches"/>
+                      <separator/>
+                      <menuitem action="ExpandSelection"/>
+                      <menuitem action="ShrinkSelection"/>
                       <separator/>%s
                     </menu>
                   </placeholder>
                 </menu>
               </menubar>
             </ui>
-            """ % op_menuitems
+            """ % (statistics_menuitem, op_menuitems)
         self._ui_id = manager.add_ui_from_string(ui_str)
-    
+        
         LOGGER.log('Menu added for %s' % self._window)
     
+    def _get_op_action_entry(self, op_name):
+        """Return the ActionGroup entry of the menu item for a SelectionOp."""
+        op = self._plugin.conf.get_op(op_name=op_name)
+        name = op.name
+        stock_id = None
+        if not op.category and op.get_category():
+            label = op.name.split('/', 1)[1].strip()
+        else:
+            label = op.name
+        accelerator = ''
+        flag_text =  ' I' * bool(op.flags & re.I)
+        flag_text += ' M' * bool(op.flags & re.M)
+        flag_text += ' S' * bool(op.flags & re.S)
+        flag_text += ' X' * bool(op.flags & re.X)
+        flag_text += ' L' * (op.engine == 'linear')
+        flag_text = flag_text or '(None)'
+        tooltip = ('Select text at the cursor location: '
+                'pattern = %s, flags = %s' % (repr(op.pattern), flag_text))
+        if op.structure:
+            tooltip += ', structure = %s' % op.structure
+        callback = lambda action: self._select_op(
+                    self._plugin.conf.get_op(op_name=action.get_name()))
+        return (name, stock_id, label, accelerator, tooltip, callback)
+    
     def _remove_menu(self):
         """Remove the Click Config submenu."""
         LOGGER.log()
         manager = self._window.get_ui_manager()
+        self._category_menus.remove()
+        self._category_menus = None
         manager.remove_ui(self._ui_id)
         manager.remove_action_group(self._action_group)
         self._action_group = None
@@ -459,12 +1000,23 @@ class ClickConfigWindowHelper(object):
         """End this instance of the plugin"""
         LOGGER.log()
         self._disconnect_mouse_handlers()
+        self._hover_preview.clear()
+        self._hover_preview = None
+        self._preview_spans = None
+        self._is_highlighting_matches = False
+        self._update_match_highlighter()
+        self._ladder_key = None
+        self._cancel_ladder_scan()
         self._disconnect_scrollwin_handlers()
         self._disconnect_viewport_handlers()
         self._disconnect_window()
         self._remove_menu()
-        self._last_click = None
-        self._double_click_time = None
+        self._cancel_speculation()
+        self._cancel_chunked_scan()
+        self._cancel_match_request()
+        self._cancel_index_request()
+        self._cancel_drag_frame()
+        self._click_counter = None
         self._plugin = None
         LOGGER.log('Click Config deactivated for %s' % self._window)
         self._window = None
@@ -475,6 +1027,92 @@ class ClickConfigWindowHelper(object):
         self._plugin.create_configure_dialog()
         self._plugin.config_ui.window.show()
     
+    def show_statistics(self):
+        """
+        Display the occupancy and hit rates of the plugin's caches, and the
+        update times of the window's hover preview.
+        """
+        LOGGER.log()
+        stats = '%s\n\n%s' % (self._plugin.caches.get_stats(),
+                               self._hover_preview.get_stats())
+        LOGGER.log('Statistics:\n%s' % stats, level='debug')
+        dialog = gtk.MessageDialog(None, gtk.DIALOG_MODAL,
+                                   gtk.MESSAGE_INFO,
+                                   gtk.BUTTONS_OK, stats)
+        dialog.set_title('Click Config Statistics')
+        dialog.set_transient_for(self._window)
+        dialog.set_position(gtk.WIN_POS_CENTER_ON_PARENT)
+        dialog.run()
+        dialog.destroy()
+    
+    def update_hover_preview(self):
+        """
+        Connect the hover preview to the window's views, or disconnect it,
+        as configured.
+        """
+        LOGGER.log()
+        conf = self._plugin.conf
+        self._hover_preview.time_budget = conf.hover_preview_time_budget
+        for view in self._mouse_handler_ids_per_view:
+            is_connected = view in self._preview_handler_ids_per_view
+            if conf.is_hover_preview and not is_connected:
+                self._connect_preview_handlers(view)
+            elif not conf.is_hover_preview and is_connected:
+                self._disconnect_preview_handlers(view)
+        if not conf.is_hover_preview:
+            self._hover_preview.clear()
+            self._preview_spans = None
+        self._action_group.get_action('HoverPreview').set_active(
+            conf.is_hover_preview)
+    
+    def on_hover_preview_toggled(self, action):
+        """Turn the hover preview on or off in all windows, and save that."""
+        LOGGER.log()
+        conf = self._plugin.conf
+        if action.get_active() != conf.is_hover_preview:
+            conf.is_hover_preview = action.get_active()
+            conf.save()
+            self._plugin.update_hover_preview()
+    
+    def select_next_match(self):
+        """
+        Select the first match after the selection's start (or from the
+        cursor) of the SelectionOp of the last selection.
+        """
+        LOGGER.log()
+        self._select_match(True)
+    
+    def select_previous_match(self):
+        """
+        Select the last match before the selection (or the cursor) of the
+        SelectionOp of the last selection.
+        """
+        LOGGER.log()
+        self._select_match(False)
+    
+    def on_highlight_matches_toggled(self, action):
+        """Turn highlighting of the last selection's op's matches on or off."""
+        LOGGER.log()
+        self._is_highlighting_matches = action.get_active()
+        self._update_match_highlighter()
+    
+    def expand_selection(self):
+        """
+        Select the next larger of the nested selections of the ladder's
+        SelectionOps around the cursor.
+        """
+        LOGGER.log()
+        self._step_selection(True)
+    
+    def shrink_selection(self):
+        """
+        Select the next smaller of the nested selections of the ladder's
+        SelectionOps around the cursor, or just the cursor after the
+        smallest.
+        """
+        LOGGER.log()
+        self._step_selection(False)
+    
     def get_doc_language(self):
         """Return the programming language of the current document."""
         LOGGER.log()
@@ -512,13 +1150,14 @@ class ClickConfigWindowHelper(object):
                                              configset_name)
             self._action_group.set_sensitive(True)
             self._connect_tab(tab)
+            self._update_match_highlighter()
     
     def _connect_window(self):
         """Connect handler for tab removal."""
         LOGGER.log()
         self.tab_removed_handler = self._window.connect('tab-removed',
             self.on_tab_removed)
-        
+    
     def _disconnect_window(self):
         """Disconnect handler for tab removal."""
         LOGGER.log()
@@ -530,6 +1169,19 @@ class ClickConfigWindowHelper(object):
         LOGGER.log(var='window')
         LOGGER.log(var='tab')
         self._disconnect_tab(tab)
+        doc = tab.get_document()
+        self._hover_preview.clear()
+        self._preview_spans = None
+        if self._match_highlighter and self._match_highlighter.doc is doc:
+            self._match_highlighter.disconnect()
+            self._match_highlighter = None
+        if self._ladder_key and self._ladder_key[0] is doc:
+            self._ladder_key = None
+        if self._ladder_scan and self._ladder_scan[0] is doc:
+            self._cancel_ladder_scan()
+        if self._index_request and self._index_request[1] is doc:
+            self._cancel_index_request()
+        self._plugin.caches.forget(doc)
         return False
     
     def _connect_tab(self, tab):
@@ -611,6 +1263,8 @@ class ClickConfigWindowHelper(object):
         LOGGER.log(var='view')
         if view not in self._mouse_handler_ids_per_view:
             self._connect_mouse_handler(view)
+            if self._plugin.conf.is_hover_preview:
+                self._connect_preview_handlers(view)
             LOGGER.log('Connected to: %s' % repr(view))
     
     def _disconnect_view(self, view):
@@ -619,6 +1273,8 @@ class ClickConfigWindowHelper(object):
         LOGGER.log(var='view')
         if view in self._mouse_handler_ids_per_view:
             self._disconnect_mouse_handler(view)
+            if view in self._preview_handler_ids_per_view:
+                self._disconnect_preview_handlers(view)
             LOGGER.log('Disconnected from: %s' % repr(view))
     
     def _connect_mouse_handler(self, view):
@@ -634,6 +1290,25 @@ class ClickConfigWindowHelper(object):
         if view.handler_is_connected(handler_id):
             view.disconnect(handler_id)
     
+    def _connect_preview_handlers(self, view):
+        """
+        Connect the hover preview to the view's motion_notify_event and
+        leave_notify_event.
+        """
+        LOGGER.log()
+        self._preview_handler_ids_per_view[view] = [
+            view.connect('motion_notify_event', self._hover_preview.on_motion),
+            view.connect('leave_notify_event', self._hover_preview.on_leave),
+            ]
+    
+    def _disconnect_preview_handlers(self, view):
+        """Disconnect the hover preview from the view."""
+        LOGGER.log()
+        for handler_id in self._preview_handler_ids_per_view.pop(view):
+            if view.handler_is_connected(handler_id):
+                view.disconnect(handler_id)
+        self._hover_preview.clear()
+    
     def _connect_drag_handler(self, view):
         """
         Connect handlers for the view's motion_notify_event
@@ -652,34 +1327,58 @@ class ClickConfigWindowHelper(object):
     
     def _drag_select(self, widget, event):
         """
-        Extend the text selection to include a selection at the current pointer
-        position.
+        Note the pointer position of a drag, for the selection to be extended
+        to it in the next frame.  However many motion events arrive, the
+        selection is updated at most once per frame.
         """
-        LOGGER.log()
-        view = widget
-        
-        # Scroll if dragging beyond top or bottom of the view.
-        (visible_left_x, visible_top_y,
-            view_width, view_height) = view.get_visible_rect()
-        visible_bottom_y = visible_top_y + view_height
-        if event.y < 0:
-            top_line_iter, top_line_y = \
-                view.get_line_at_y(visible_top_y)
-            if (view.backward_display_line(top_line_iter) or
-                    top_line_y < visible_top_y):
-                view.scroll_to_iter(top_line_iter, within_margin=0.0)
-        if event.y > view_height:
-            bottom_line_iter, bottom_line_y = \
-                view.get_line_at_y(visible_bottom_y)
-            bottom_line_height = view.get_line_yrange(bottom_line_iter)[1]
-            if (view.forward_display_line(bottom_line_iter) or
-                    bottom_line_y > visible_bottom_y - bottom_line_height):
-                view.scroll_to_iter(bottom_line_iter, within_margin=0.0)
+        # (This is not logged, since it runs for every motion of the pointer.)
+        self._drag_pointer = (widget, widget.get_window_type(event.window),
+                              event.x, event.y)
+        if not self._drag_frame_id:
+            self._drag_frame_id = gobject.timeout_add(DRAG_FRAME_TIME,
+                                                      self._on_drag_frame)
+        return False
+    
+    def _on_drag_frame(self):
+        """
+        Extend the text selection to include a selection at the last pointer
+        position.  While the pointer is above or below the view, scroll it
+        toward the pointer, faster the further away it is, and keep doing so
+        each frame until it stops or the view can scroll no further.
+        """
+        view, window_type, pointer_x, pointer_y = self._drag_pointer
+        view_height = view.get_visible_rect().height
+        if pointer_y < 0:
+            distance = pointer_y
+        elif pointer_y > view_height:
+            distance = pointer_y - view_height
+        else:
+            distance = 0
+        is_scrolling = False
+        if distance:
+            adjustment = view.get_vadjustment()
+            value = min(max(adjustment.value + distance * DRAG_SCROLL_RATE,
+                            adjustment.lower),
+                        adjustment.upper - adjustment.page_size)
+            is_scrolling = value != adjustment.value
+            adjustment.set_value(value)
         
-        drag_iter = self._get_click_iter(view, event)
+        if self._drag_selector:
+            buffer_x, buffer_y = view.window_to_buffer_coords(
+                window_type, int(pointer_x), int(pointer_y))
+            drag_iter = view.get_iter_at_location(buffer_x, buffer_y)
+            self._drag_selector.drag_to(drag_iter.get_offset())
         
-        # self._word_re will be used
-        self._select_regex(drag_iter, word_re=None, extend=True)
+        if not is_scrolling:
+            self._drag_frame_id = None
+        return is_scrolling
+    
+    def _cancel_drag_frame(self):
+        """Stop any pending selection update or scrolling of a drag."""
+        if self._drag_frame_id:
+            gobject.source_remove(self._drag_frame_id)
+            self._drag_frame_id = None
+        self._drag_pointer = None
     
     def _disconnect_drag_handler(self, view):
         """Disconnect the event handlers for drag selecting."""
@@ -692,11 +1391,10 @@ class ClickConfigWindowHelper(object):
                 view.disconnect(handler_id)
             else:
                 LOGGER.log('handler %r is not connected' % handler_id)
+        self._cancel_drag_frame()
         # Clear the match data of the click.
-        self._word_re = None
         self._boundaries = None
-        self._click_start_iter = None
-        self._click_end_iter = None
+        self._drag_selector = None
     
     def _disconnect_scrollwin_handlers(self):
         """Disconnect any remaining ScrolledWindow event handlers."""
@@ -721,27 +1419,33 @@ class ClickConfigWindowHelper(object):
             handler_id = self._mouse_handler_ids_per_view.pop(view)
             if view.handler_is_connected(handler_id):
                 view.disconnect(handler_id)
+        for view in self._preview_handler_ids_per_view.keys():
+            self._disconnect_preview_handlers(view)
     
     def _handle_button_press(self, view, event):
         """
         Evaluate mouse click and call for text selection as appropriate.
         Return False if the click should still be handled afterwards.
         """
-        LOGGER.log()
-        handled = False
-        if event.button == 1:
-            click_iter = self._get_click_iter(view, event)
-            now = time.time()
-            handlers_by_type = {
-                gtk.gdk.BUTTON_PRESS: self._handle_1button_press,
-                gtk.gdk._2BUTTON_PRESS: self._handle_2button_press,
-                gtk.gdk._3BUTTON_PRESS: self._handle_3button_press,
-                }
-            handled, click = handlers_by_type[event.type](click_iter, now)
-            if click:
-                handled = self._make_assigned_selection(click, click_iter)
-                if handled:
-                    self._connect_drag_handler(view)
+        # This runs for every press of any button, so nothing is logged or
+        # allocated until a click is counted.
+        if event.button != 1:
+            return False
+        click_iter = self._get_click_iter(view, event)
+        click = self._click_counter.count(event.type, click_iter.get_offset(),
+                                          event.time)
+        if click <= 0:
+            return click == CONSUMED
+        LOGGER.log('%s.' % CLICK_NAMES[click])
+        self._hover_preview.clear()
+        # A new click supersedes any selection still being scanned for.
+        self._cancel_chunked_scan()
+        self._cancel_match_request()
+        self._drag_selector = None
+        handled = self._make_assigned_selection(click, click_iter)
+        if handled:
+            self._connect_drag_handler(view)
+        self._start_speculation(view, event, click, click_iter)
         return handled
     
     def _handle_button_release(self, widget, event):
@@ -751,77 +1455,8 @@ class ClickConfigWindowHelper(object):
             self._disconnect_drag_handler(widget)
         return False
     
-    def _handle_1button_press(self, click_iter, now):
-        """Detect 5-click, 4-click, or 1-click. Otherwise eat the signal."""
-        LOGGER.log()
-        handled = False
-        click = None
-        if self._last_click[0] and click_iter.equal(self._last_click[0]):
-            # The pointer must remain in the same position as the first click,
-            # for it to be considered a successive click of a multiple click.
-            if now - self._last_click[4] < self._double_click_time:
-                LOGGER.log('Quintuple-click.')
-                # QUINTUPLE-CLICKS are handled here.
-                self._last_click[5] = now
-                click = 5
-            elif now - self._last_click[3] < self._double_click_time:
-                LOGGER.log('Quadruple-click.')
-                # QUADRUPLE-CLICKS are handled here.
-                self._last_click[4] = now
-                click = 4
-            elif now - self._last_click[2] < self._double_click_time:
-                LOGGER.log('(3rd click of a triple-click.)', level='debug')
-                # Ignore and consume it.  Triple-clicks are not handled here.
-                handled = True
-            elif now - self._last_click[1] < self._double_click_time:
-                LOGGER.log('(2nd click of a double-click.)', level='debug')
-                # Ignore and consume it.  Double-clicks are not handled here.
-                handled = True
-        if not handled and not click:
-            LOGGER.log('Single-click.')
-            # SINGLE-CLICKS are handled here.
-            # Record this as the original click.
-            self._last_click = [click_iter, now, 0, 0, 0, 0]
-            click = 1
-        return handled, click
-    
-    def _handle_2button_press(self, click_iter, now):
-        """Detect 2-click. Otherwise eat the signal."""
-        LOGGER.log()
-        handled = False
-        click = None
-        if self._last_click[0] and click_iter.equal(self._last_click[0]):
-            if (now - self._last_click[4]) < self._double_click_time:
-                LOGGER.log('(4th & 5th of a quintuple-click.)', level='debug')
-                # Ignore and consume it.  Quintuple-clicks are not handled here.
-                handled = True
-            else:
-                LOGGER.log('Double-click.')
-                # DOUBLE-CLICKS are handled here.
-                self._last_click[2] = now
-                click = 2
-        return handled, click
-    
-    def _handle_3button_press(self, click_iter, now):
-        """Detect 3-click. Otherwise eat the signal."""
-        LOGGER.log()
-        handled = False
-        click = None
-        if self._last_click[0] and click_iter.equal(self._last_click[0]):
-            if (now - self._last_click[5]) < self._double_click_time:
-                LOGGER.log('(4th-6th of a sextuple-click.)', level='debug')
-                # Ignore and consume it.  Sextuple-clicks are not handled here.
-                handled = True
-            else:
-                LOGGER.log('Triple-click.')
-                # TRIPLE-CLICKS are handled here.
-                self._last_click[3] = now
-                click = 3
-        return handled, click
-    
     def _get_click_iter(self, view, event):
         """Return the current cursor location based on the click location."""
-        LOGGER.log()
         buffer_x, buffer_y = view.window_to_buffer_coords(
                         view.get_window_type(event.window),
                         int(event.x),
@@ -837,6 +1472,435 @@ class ClickConfigWindowHelper(object):
         insert_iter = doc.get_iter_at_mark(insert_mark)
         return insert_iter
     
+    def _get_preview_finder(self, view, window_type, pointer_x, pointer_y,
+                            event_time):
+        """
+        Return the key and the span finding function for the hover preview
+        at the pointer position, or None if no click there would select.
+        
+        The click previewed is the one a press there would make, so the
+        underline steps through the click types of a multiple click.  Click
+        types assigned 'None' are passed over for the next that selects.
+        """
+        buffer_x, buffer_y = view.window_to_buffer_coords(
+            window_type, int(pointer_x), int(pointer_y))
+        offset = view.get_iter_at_location(buffer_x, buffer_y).get_offset()
+        conf = self._plugin.conf
+        click = self._click_counter.get_next_click(offset, event_time)
+        for click in range(click, 6):
+            op = conf.get_op(click=click)
+            if op.name != 'None':
+                break
+        else:
+            return None
+        doc = view.get_buffer()
+        key = (doc, self._plugin.caches.get_change_count(doc), op.name)
+        return key, lambda: self._find_preview_span(key, op, offset)
+    
+    def _find_preview_span(self, key, op, offset):
+        """
+        Return the start and end offsets of what op would select at offset
+        in the document of key, or None if that is not known without
+        scanning the document.
+        """
+        doc = key[0]
+        if op.structure:
+            index = None
+            if op.structure in STRUCTURE_INDEX_CLASSES:
+                index = self._plugin.caches.peek(doc, 'index', op.structure)
+                if not (index and index.is_built()):
+                    return None
+            span = find_structure_span(doc.get_iter_at_offset(offset),
+                                       op.structure, index)
+            if span is not None:
+                start, end = span[0].get_offset(), span[1].get_offset()
+                return (start, end) if start != end else None
+        if not self._preview_spans or self._preview_spans[0] != key:
+            self._preview_spans = (key, self._get_preview_spans(doc, op))
+        spans = self._preview_spans[1]
+        return spans and spans.find(offset)
+    
+    def _get_preview_spans(self, doc, op):
+        """
+        Return the spans of op's regex in the document for the hover
+        preview, or None unless they can be had without scanning it: from
+        the retained boundaries of a multiline regex, or for other regexes,
+        from the lines of a built line index and the text snapshot.  A risky
+        regex is not matched for the preview.
+        """
+        LOGGER.log()
+        caches = self._plugin.caches
+        word_re = self._compile(op)
+        if self._is_risky(word_re):
+            return None
+        if word_re.flags & re.M:
+            boundaries = caches.peek(doc, 'boundaries',
+                                     (word_re.pattern, word_re.flags))
+            return BoundarySpans(boundaries) if boundaries else None
+        lines = caches.peek(doc, 'index', 'lines')
+        if (lines and lines.is_built() and
+                caches.peek(doc, 'text') is not None):
+            return LineBoundarySpans(doc, word_re,
+                                     self._plugin.text_snapshots, lines)
+        return None
+    
+    def _get_last_op(self):
+        """
+        Return the SelectionOp of the window's last selection, or else the
+        current SelectionOp of the configuration, or None if that is 'None'.
+        """
+        conf = self._plugin.conf
+        op = self._last_op_name and conf.get_op(op_name=self._last_op_name)
+        op = op or conf.get_op()
+        if op and op.name != 'None':
+            return op
+        return None
+    
+    def _select_match(self, is_forward):
+        """
+        Select the next match, or the previous one, of the SelectionOp of
+        the last selection, from the document's MatchIndex.
+        """
+        LOGGER.log()
+        doc = self._window.get_active_document()
+        op = self._get_last_op()
+        if not doc or not op:
+            return
+        index = self._get_match_index(doc, op)
+        if index is None:
+            # The match worker is finding the matches; move once it has.
+            self._index_request[4] = is_forward
+            return
+        bounds = doc.get_selection_bounds()
+        if bounds:
+            offset = bounds[0].get_offset()
+        else:
+            offset = doc.get_iter_at_mark(doc.get_insert()).get_offset()
+        if is_forward:
+            # Move past a selected match to the one after it.
+            span = index.find_next(offset + bool(bounds))
+        else:
+            span = index.find_previous(offset)
+        if span is None:
+            LOGGER.log('No matches of %r.' % op.name, level='debug')
+            return
+        doc.select_range(doc.get_iter_at_offset(span[0]),
+                         doc.get_iter_at_offset(span[1]))
+        self._window.get_active_view().scroll_to_cursor()
+    
+    def _get_match_index(self, doc, op, time_limit=None):
+        """
+        Return the MatchIndex of op's regex in the document from the
+        plugin's caches, finding the matches if they are not there.  With a
+        time_limit (in seconds), find only those found in about that time,
+        leaving the rest to later calls.
+        
+        The matches of a risky regex are found by the match worker, if
+        there is one, and None is returned until they arrive.
+        """
+        LOGGER.log()
+        caches = self._plugin.caches
+        key = (op.engine, op.pattern, op.flags)
+        index = caches.get(doc, 'matches', key)
+        if index is None:
+            word_re = self._compile(op)
+            if self._is_risky(word_re) and self._plugin.match_worker:
+                self._submit_index(doc, word_re, key)
+                return None
+            text, line_offsets = self._get_match_source(doc, word_re)
+            index = MatchIndex(text, word_re, line_offsets, time_limit)
+        elif index.is_built():
+            return index
+        else:
+            index.scan(time_limit)
+        # Account for the matches found so far.
+        caches.put(doc, 'matches', key, index, index.get_size())
+        if index.is_built():
+            LOGGER.log('Found %d matches of %r.' % (len(index), op.name),
+                       level='debug')
+        return index
+    
+    def _get_match_source(self, doc, word_re):
+        """
+        Return the text a MatchIndex of word_re in the document is found in,
+        and the offsets of its lines, unless word_re is multiline.
+        """
+        text = self._plugin.text_snapshots.get_text(doc)
+        line_offsets = None
+        if not word_re.flags & re.M:
+            lines = self._get_index(doc, 'lines', DocumentLines)
+            line_offsets = lines.get_offsets()
+            # Account for the index, which is built when first used.
+            self._put_index(doc, 'lines', lines)
+        return text, line_offsets
+    
+    def _submit_index(self, doc, word_re, key):
+        """
+        Have the plugin's match worker find the MatchIndex of word_re in the
+        document, unless it is already finding it, or has failed to, since
+        the document last changed.
+        """
+        LOGGER.log()
+        change_count = self._plugin.caches.get_change_count(doc)
+        request = self._index_request
+        if request and request[1:4] == [doc, change_count, key]:
+            return
+        self._cancel_index_request()
+        text, line_offsets = self._get_match_source(doc, word_re)
+        request_id = self._plugin.submit_index(word_re, text, line_offsets,
+            lambda index: self._on_index_results(index, doc, change_count,
+                                                 key))
+        self._index_request = [request_id, doc, change_count, key, None]
+    
+    def _on_index_results(self, index, doc, change_count, key):
+        """
+        Keep the MatchIndex found by the match worker, and use it for the
+        highlights and any move to a match waiting for it.
+        """
+        LOGGER.log()
+        is_forward = self._index_request[4]
+        if index is None:
+            LOGGER.log('No matches found for %r.' % key[1], level='warning')
+            # It is not asked for again until the document changes.
+            self._index_request[0] = None
+            return
+        self._index_request = None
+        caches = self._plugin.caches
+        if caches.get_change_count(doc) != change_count:
+            return
+        caches.put(doc, 'matches', key, index, index.get_size())
+        LOGGER.log('Found %d matches of %r.' % (len(index), key[1]),
+                   level='debug')
+        if self._match_highlighter:
+            self._match_highlighter.refresh()
+        if (is_forward is not None and
+                doc is self._window.get_active_document()):
+            self._select_match(is_forward)
+    
+    def _cancel_index_request(self):
+        """Drop any pending match worker request for a MatchIndex."""
+        if self._index_request:
+            if self._index_request[0] is not None:
+                self._plugin.cancel_match(self._index_request[0])
+            self._index_request = None
+    
+    def _get_highlight_index(self, doc):
+        """
+        Return the MatchIndex of the last selection's op in the document,
+        for the MatchHighlighter, or None if there is no such op.  The
+        matches are found for a frame's time at a time, so the index may not
+        be built yet.
+        """
+        op = self._get_last_op()
+        return op and self._get_match_index(doc, op,
+                                            DRAG_FRAME_TIME / 1000.0)
+    
+    def _update_match_highlighter(self):
+        """
+        Keep a MatchHighlighter on the active view while matches are to be
+        highlighted, and none otherwise.
+        """
+        LOGGER.log()
+        view = (self._window.get_active_view()
+                if self._is_highlighting_matches else None)
+        highlighter = self._match_highlighter
+        if highlighter and highlighter.view is not view:
+            highlighter.disconnect()
+            self._match_highlighter = None
+        if view and not self._match_highlighter:
+            self._match_highlighter = MatchHighlighter(
+                view, self._get_highlight_index, DRAG_FRAME_TIME)
+    
+    def _step_selection(self, is_expanding):
+        """
+        Select the next larger, or smaller, of the nested selections of the
+        ladder's SelectionOps around the insert mark.
+        """
+        LOGGER.log()
+        doc = self._window.get_active_document()
+        if not doc:
+            return
+        bounds = doc.get_selection_bounds()
+        if bounds:
+            start, end = bounds[0].get_offset(), bounds[1].get_offset()
+        else:
+            start = end = doc.get_iter_at_mark(doc.get_insert()).get_offset()
+        ladder = self._get_selection_ladder(doc, start, end)
+        if is_expanding:
+            span = ladder.expand(start, end)
+        else:
+            span = ladder.shrink(start, end)
+        if span is None:
+            return
+        doc.select_range(doc.get_iter_at_offset(span[0]),
+                         doc.get_iter_at_offset(span[1]))
+        self._window.get_active_view().scroll_to_cursor()
+    
+    def _get_selection_ladder(self, doc, start, end):
+        """
+        Return the SelectionLadder last stepped through if the selection from
+        start to end is one of its steps, or else the one around the insert
+        mark, from the plugin's caches or made now.
+        
+        The nested selections of a ladder are found once, and are kept
+        until the document changes.
+        """
+        LOGGER.log()
+        caches = self._plugin.caches
+        ops = self._get_ladder_ops()
+        names = tuple(op.name for op in ops)
+        if (self._ladder_key and self._ladder_key[0] is doc and
+                self._ladder_key[2] == names):
+            ladder = caches.get(doc, 'ladder', self._ladder_key[1:])
+            if ladder and ladder.has_step(start, end):
+                return ladder
+        anchor = doc.get_iter_at_mark(doc.get_insert()).get_offset()
+        ladder = caches.get(doc, 'ladder', (anchor, names))
+        if ladder is None:
+            caches.touch(doc)
+            ladder = SelectionLadder(anchor, [
+                self._find_op_span(doc, op, anchor) for op in ops])
+            caches.put(doc, 'ladder', (anchor, names), ladder,
+                       ladder.get_size())
+            LOGGER.log('Ladder of %d selections at %d.' %
+                       (len(ladder), anchor), level='debug')
+        self._ladder_key = (doc, anchor, names)
+        return ladder
+    
+    def _get_ladder_ops(self):
+        """
+        Return the SelectionOps that Expand and Shrink Selection step
+        through: those named in the configuration's expand_ladder, or else
+        those of the current ConfigSet's click types.
+        """
+        conf = self._plugin.conf
+        if conf.expand_ladder:
+            ops = [conf.get_op(op_name=name) for name in conf.expand_ladder]
+        else:
+            ops = [conf.get_op(click=click) for click in range(1, 6)]
+        return [op for op in ops if op and op.name != 'None']
+    
+    def _find_op_span(self, doc, op, offset):
+        """
+        Return the start and end offsets of what op would select at offset,
+        or None if it would select nothing there, or if that is not known
+        without matching a risky regex or scanning a long document.
+        """
+        LOGGER.log()
+        lines = self._get_index(doc, 'lines', DocumentLines)
+        snapshots = self._plugin.text_snapshots
+        index = None
+        word_re = self._compile(op)
+        is_risky = self._is_risky(word_re)
+        if op.structure:
+            index = self._get_structure_index(doc, op.structure)
+            spans = StructureSpans(doc, op, index, snapshots, lines,
+                                   not is_risky)
+        elif word_re.flags & re.M:
+            boundaries = self._get_boundaries(doc, word_re, is_risky)
+            if boundaries is None:
+                LOGGER.log('Ladder step of %r left out.' % op.name,
+                           level='debug')
+                return None
+            spans = BoundarySpans(boundaries)
+        elif is_risky:
+            # It is only matched for a click, in the match worker.
+            return None
+        else:
+            spans = LineBoundarySpans(doc, word_re, snapshots, lines)
+        span = spans.find(offset)
+        # Account for the indexes, which are built when first used.
+        self._put_index(doc, 'lines', lines)
+        if index:
+            self._put_index(doc, op.structure, index)
+        return span
+    
+    def _get_boundaries(self, doc, word_re, is_risky):
+        """
+        Return the retained boundaries of a multiline word_re in the
+        document, or find and retain them now if the document is short and
+        the regex is not risky.  Otherwise return None, and have them found
+        and retained for the ladder to be made again with them.
+        """
+        LOGGER.log()
+        caches = self._plugin.caches
+        key = (word_re.pattern, word_re.flags)
+        boundaries = caches.get(doc, 'boundaries', key)
+        if boundaries is not None:
+            return boundaries
+        text = self._plugin.text_snapshots.get_text(doc)
+        if len(text) < CHUNKED_SCAN_MIN_LENGTH and not is_risky:
+            boundaries = find_boundaries(text, word_re)
+            caches.put(doc, 'boundaries', key, boundaries,
+                       len(boundaries) * BOUNDARY_ENTRY_SIZE)
+            return boundaries
+        self._start_ladder_scan(doc, text, word_re)
+        return None
+    
+    def _start_ladder_scan(self, doc, text, word_re):
+        """
+        Have the boundaries of a multiline word_re in the document's text
+        found by the match worker, or else in idle callback steps, unless
+        they are already being found, or failed to be, since the document
+        last changed.  One regex's boundaries are found at a time.
+        """
+        LOGGER.log()
+        change_count = self._plugin.caches.get_change_count(doc)
+        key = (word_re.pattern, word_re.flags)
+        if self._ladder_scan and self._ladder_scan[:3] == [doc, change_count,
+                                                           key]:
+            return
+        self._cancel_ladder_scan()
+        on_found = lambda boundaries: self._on_ladder_boundaries(
+            boundaries, doc, change_count, key)
+        request_id = self._plugin.submit_match(word_re, text, on_found)
+        idle_id = None
+        if request_id is None:
+            idle_id = gobject.idle_add(self._continue_ladder_scan,
+                ChunkedBoundaryScan(text, word_re), on_found)
+        self._ladder_scan = [doc, change_count, key, request_id, idle_id]
+    
+    def _continue_ladder_scan(self, scan, on_found):
+        """Scan one step, and pass on the boundaries once the scan is done."""
+        LOGGER.log()
+        time_limit = self._plugin.conf.scan_time_slice / 1000.0
+        if not scan.step(time_limit):
+            return True
+        self._ladder_scan[4] = None
+        on_found(scan.boundaries)
+        return False
+    
+    def _on_ladder_boundaries(self, boundaries, doc, change_count, key):
+        """
+        Retain the boundaries found for a ladder, and drop the ladder made
+        without them, so that it is made again with them when next used.
+        """
+        LOGGER.log()
+        if boundaries is None:
+            LOGGER.log('No ladder step for %r.' % key[0], level='warning')
+            # They are not looked for again until the document changes.
+            self._ladder_scan[3] = None
+            return
+        self._ladder_scan = None
+        caches = self._plugin.caches
+        if caches.get_change_count(doc) != change_count:
+            return
+        caches.put(doc, 'boundaries', key, boundaries,
+                   len(boundaries) * BOUNDARY_ENTRY_SIZE)
+        if self._ladder_key and self._ladder_key[0] is doc:
+            caches.drop(doc, 'ladder', self._ladder_key[1:])
+            self._ladder_key = None
+    
+    def _cancel_ladder_scan(self):
+        """Stop finding boundaries for a ladder."""
+        if self._ladder_scan:
+            doc, change_count, key, request_id, idle_id = self._ladder_scan
+            if request_id is not None:
+                self._plugin.cancel_match(request_id)
+            if idle_id:
+                gobject.source_remove(idle_id)
+            self._ladder_scan = None
+    
     def _make_assigned_selection(self, click, click_iter):
         """Select text based on the click type and location."""
         LOGGER.log()
@@ -852,77 +1916,229 @@ class ClickConfigWindowHelper(object):
         """Finds first regex match that includes the click position."""
         LOGGER.log()
         
-        char_spec = op.pattern
-        flags = op.flags
-        
         LOGGER.log('Selection name: %s' % op.name)
         
         if not click_iter:
             click_iter = self._get_insert_iter()
         
-        word_re = re.compile(char_spec, flags)
+        # The least recently clicked documents' caches are evicted first.
+        self._plugin.caches.touch(click_iter.get_buffer())
+        
+        self._last_op_name = op.name
+        if self._match_highlighter:
+            self._match_highlighter.refresh()
+        
+        if op.structure:
+            return self._select_structure(click_iter, op)
+        
+        word_re = self._compile(op)
         
         did_select = self._select_regex(click_iter, word_re)
         return did_select
     
-    def _select_regex(self, click_iter, word_re, extend=False):
+    def _select_regex(self, click_iter, word_re):
         """
         Select text in the document matching word_re and containing click_iter.
         """
         LOGGER.log()
-        if word_re is None:
-            word_re = self._word_re
-        else:
-            self._word_re = word_re
+        # This selection supersedes any still waiting for its boundaries.
+        self._cancel_chunked_scan()
+        self._cancel_match_request()
         doc = self._window.get_active_document()
         multiline = bool(word_re.flags & re.M)
-        if multiline:
-            source_start_iter, source_end_iter = doc.get_bounds()
-            pick_pos = click_iter.get_offset()
-        else:
-            source_start_iter, source_end_iter = \
-                self._get_line_iter_pair(click_iter)
-            pick_pos = click_iter.get_line_offset()
-        source_text = source_start_iter.get_slice(source_end_iter)
+        source_text, pick_pos = self._get_source_text(doc, click_iter, word_re)
         # There is nothing to select in an empty text.
         if source_text == "":
             return False
+        boundaries_key = (word_re.pattern, word_re.flags)
+        if multiline and not self._boundaries:
+            self._boundaries = self._plugin.caches.get(doc, 'boundaries',
+                                                       boundaries_key)
+        if not self._boundaries:
+            self._boundaries = self._take_speculation(source_text, word_re)
+        if not self._boundaries:
+            # Have the match worker find the boundaries of a regex that may
+            # backtrack, or else scan a long document in steps.  Either one
+            # makes the selection once the boundaries are found.
+            offset = click_iter.get_offset()
+            if (self._is_risky(word_re) and
+                    self._submit_match(doc, source_text, word_re, offset)):
+                return True
+            if multiline and len(source_text) >= CHUNKED_SCAN_MIN_LENGTH:
+                self._start_chunked_scan(doc, source_text, word_re, offset)
+                return True
         match_start, match_end = self._find_text(source_text, pick_pos, word_re)
-        target_start_iter = click_iter.copy()
-        target_end_iter = click_iter.copy()
         if multiline:
-            target_start_iter.set_offset(match_start)
-            target_end_iter.set_offset(match_end)
-        else:
-            target_start_iter.set_line_offset(match_start)
-            target_end_iter.set_line_offset(match_end)
-        if extend:
-            target_start_iter = min((self._click_start_iter,
-                                    target_start_iter),
-                                    key=lambda i: i.get_offset())
-            #extended_back = target_start_iter != self._click_start_iter
-            target_end_iter = max((self._click_end_iter,
-                                  target_end_iter),
-                                  key=lambda i: i.get_offset())
-            #extended_forward = target_end_iter != self._click_end_iter
+            # Retain the boundaries until the document changes.
+            size = len(self._boundaries) * BOUNDARY_ENTRY_SIZE
+            self._plugin.caches.put(doc, 'boundaries', boundaries_key,
+                                    self._boundaries, size)
+        if not multiline:
+            line_offset = click_iter.get_offset() - pick_pos
+            match_start += line_offset
+            match_end += line_offset
+        # The boundaries are kept by the drag's spans from here on.
+        if not multiline and self._is_risky(word_re):
+            # Rather than match a risky regex in gedit's process for each
+            # line dragged over, the drag keeps to the clicked line.
+            spans = BoundarySpans([line_offset + boundary
+                                   for boundary in self._boundaries])
         else:
-            self._click_start_iter = target_start_iter
-            self._click_end_iter = target_end_iter
-        
+            spans = make_regex_spans(doc, word_re,
+                self._plugin.text_snapshots,
+                self._get_index(doc, 'lines', DocumentLines),
+                self._boundaries)
+        self._boundaries = None
+        return self._select_range(doc, match_start, match_end, spans)
+    
+    def _select_structure(self, click_iter, op):
+        """
+        Select the structure of op that contains click_iter, found by moving
+        through the lines.  Use the op's regex instead where the structure
+        cannot be used.
+        """
+        LOGGER.log()
+        doc = click_iter.get_buffer()
+        index = self._get_structure_index(doc, op.structure)
+        if op.structure == 'brackets':
+            # A large document's pairs are found in idle time, after the
+            # time slice this gives them.
+            index.build()
+        span = find_structure_span(click_iter, op.structure, index)
+        if index:
+            # Account for the index, which is built when first used.
+            self._put_index(doc, op.structure, index)
+        if span is None:
+            LOGGER.log('Using the regex of %r.' % op.name, level='debug')
+            return self._select_regex(click_iter, self._compile(op))
+        start, end = span[0].get_offset(), span[1].get_offset()
+        # There is nothing to select in an empty text.
+        if start == end:
+            return False
+        # A drag does not match a risky regex in gedit's process.
+        return self._select_range(doc, start, end,
+            StructureSpans(doc, op, index, self._plugin.text_snapshots,
+                           self._get_index(doc, 'lines', DocumentLines),
+                           not self._is_risky(self._compile(op))))
+    
+    def _get_structure_index(self, doc, structure):
+        """
+        Return the document's index for the structure, or None if the
+        structure does not use one.
+        """
+        LOGGER.log()
+        if structure not in STRUCTURE_INDEX_CLASSES:
+            return None
+        return self._get_index(doc, structure,
+                               STRUCTURE_INDEX_CLASSES[structure])
+    
+    def _get_index(self, doc, name, index_class):
+        """
+        Return the document's index of index_class (DocumentBrackets,
+        DocumentIndents or DocumentLines) from the plugin's caches, making it
+        if there is none.
+        """
+        index = self._plugin.caches.get(doc, 'index', name)
+        if index is None:
+            index = index_class(doc, self._plugin.text_snapshots)
+            self._put_index(doc, name, index)
+        return index
+    
+    def _put_index(self, doc, name, index):
+        """
+        Keep the document's index in the plugin's caches, through edits,
+        until it is evicted.
+        """
+        self._plugin.caches.put(doc, 'index', name, index, index.get_size(),
+                                index.disconnect, follows_edits=True)
+    
+    def _compile(self, op):
+        """Return the compiled regex of op, from the plugin's caches."""
+        LOGGER.log()
+        caches = self._plugin.caches
+        key = (op.engine, op.pattern, op.flags)
+        word_re = caches.get(None, 'regex', key)
+        if word_re is None:
+            word_re = op.compile()
+            caches.put(None, 'regex', key, word_re, REGEX_ENTRY_SIZE)
+        return word_re
+    
+    def _is_risky(self, word_re):
+        """
+        Return True if word_re has repeats that may backtrack for a long
+        time, so that it is better matched in the match worker, where it can
+        be stopped, than in gedit's process.
+        """
+        LOGGER.log()
+        if isinstance(word_re, LinearPattern):
+            return False
+        caches = self._plugin.caches
+        key = ('hazards', word_re.pattern, word_re.flags)
+        hazards = caches.get(None, 'regex', key)
+        if hazards is None:
+            hazards = find_hazards(word_re.pattern, word_re.flags)
+            caches.put(None, 'regex', key, hazards, HAZARDS_ENTRY_SIZE)
+        return bool(hazards)
+    
+    def _select_range(self, doc, start, end, spans):
+        """
+        Select from offset start to offset end, and prepare to extend the
+        selection over spans if the pointer is dragged.
+        """
+        LOGGER.log()
+        self._drag_selector = DragSelector(doc, start, end, spans)
         if doc.get_selection_bounds():
             current_start_iter, current_end_iter = doc.get_selection_bounds()
-            if (current_start_iter.equal(target_start_iter) and
-                    current_end_iter.equal(target_end_iter)):
+            if (current_start_iter.get_offset() == start and
+                    current_end_iter.get_offset() == end):
                 # The text is already selected; there's no need to re-select it.
                 return True
+        target_start_iter = doc.get_iter_at_offset(start)
+        target_end_iter = doc.get_iter_at_offset(end)
         doc.select_range(target_start_iter, target_end_iter)
-        selected_text = doc.get_text(target_start_iter, target_end_iter)
-        LOGGER.log('Selected text:\n%s' % selected_text)
+        LOGGER.log('Selected offsets %d to %d.' % (start, end), level='debug')
         # These two lines will activate search highlighting on the text:
 #        found_text = doc.get_text(target_start_iter, target_end_iter)
 #        doc.set_search_text(found_text, 1)
         return True
     
+    def _get_source_text(self, doc, click_iter, word_re):
+        """
+        Return the text word_re is to be matched in, which is the whole
+        document for a multiline regex or else the line of click_iter, and the
+        position of click_iter within that text.
+        The text is unicode, taken from the document's snapshot.
+        """
+        LOGGER.log()
+        offset = click_iter.get_offset()
+        if word_re.flags & re.M:
+            source_text = self._plugin.text_snapshots.get_text(doc)
+            pick_pos = offset
+        else:
+            source_text, line_start = self._get_line_text(doc, offset)
+            pick_pos = offset - line_start
+        return source_text, pick_pos
+    
+    def _get_line_text(self, doc, offset):
+        """
+        Return the text of the line holding offset, without its line end, and
+        the offset of the start of the line, from the document's snapshot if
+        it is kept, or else from the line alone.
+        """
+        LOGGER.log()
+        lines = self._get_index(doc, 'lines', DocumentLines)
+        line_start, line_end = lines.get_line_bounds(lines.get_line(offset))
+        # Account for the index, which is built when first used.
+        self._put_index(doc, 'lines', lines)
+        text = self._plugin.text_snapshots.get_kept_text(doc)
+        if text is None:
+            # A snapshot is dropped by each edit, and taking one to copy a
+            # line from would decode the whole document.
+            line_text = doc.get_slice(doc.get_iter_at_offset(line_start),
+                                      doc.get_iter_at_offset(line_end))
+            return line_text.decode('utf-8'), line_start
+        return text[line_start:line_end], line_start
+    
     def _find_text(self, source_text, pick_pos, word_re):
         """
         Finds the range of the match, or the range between matches, for regex
@@ -932,51 +2148,250 @@ class ClickConfigWindowHelper(object):
         """
         LOGGER.log()
         
-        # self._boundaries is set by a click selection,
-        # remains available for a click-drag selection,
-        # and then is set to None by self._disconnect_drag_handler().
+        # self._boundaries may have been found before the click's selection
+        # was made (in advance, in steps, or by the match worker).
         if not self._boundaries:
-            self._find_boundaries(source_text, word_re)
+            self._boundaries = self._find_boundaries(source_text, word_re)
         
         after = next((p for p in self._boundaries if p > pick_pos),
                      len(source_text))
         after_index = self._boundaries.index(after)
         before = self._boundaries[after_index - 1]
         
-        # For single-line regexes, the boundaries
-        # need to be determined each time.
-        if not word_re.flags & re.M:
-            self._boundaries = None
-        
         return before, after
     
     def _find_boundaries(self, source_text, word_re):
-        """Find the offsets of all match starting and ending positions."""
+        """Return the offsets of all match starting and ending positions."""
         LOGGER.log()
-        
-        spans = ((m.start(), m.end()) for m in word_re.finditer(source_text))
-        boundaries = list(itertools.chain.from_iterable(spans))
-        
-        source_start = 0
-        source_end = len(source_text)
-        
-        if boundaries:
-            if boundaries[0] != source_start:
-                boundaries.insert(0, source_start)
-            if boundaries[-1] != source_end:
-                boundaries.append(source_end)
-        else:
-            boundaries = [source_start, source_end]
-        
+        boundaries = self._take_speculation(source_text, word_re)
+        if boundaries is None:
+            boundaries = find_boundaries(source_text, word_re)
+        return boundaries
+    
+    # Scanning in steps:
+    
+    def _start_chunked_scan(self, doc, source_text, word_re, offset):
+        """
+        Find the boundaries of word_re in the document in idle callback
+        steps, so gedit keeps responding, and select at offset when done.
+        """
+        LOGGER.log()
+        self._cancel_chunked_scan()
+        self._chunked_scan = ChunkedBoundaryScan(source_text, word_re)
+        self._chunked_scan_offset = offset
+        self._chunked_scan_changed = (doc,
+            doc.connect('changed', self._on_chunked_scan_doc_changed))
+        self._chunked_scan_idle_id = gobject.idle_add(
+            self._continue_chunked_scan)
+        LOGGER.log('Scanning %d characters in steps.' % len(source_text),
+                   level='debug')
+    
+    def _continue_chunked_scan(self):
+        """Scan one step, and make the selection if the scan is done."""
+        LOGGER.log()
+        time_limit = self._plugin.conf.scan_time_slice / 1000.0
+        scan = self._chunked_scan
+        if not scan.step(time_limit):
+            return True
+        doc = self._chunked_scan_changed[0]
+        offset = self._chunked_scan_offset
+        self._chunked_scan_idle_id = None
+        self._cancel_chunked_scan()
+        self._select_with_boundaries(doc, offset, scan.word_re,
+                                     scan.boundaries)
+        return False
+    
+    def _on_chunked_scan_doc_changed(self, doc):
+        """Abandon the scan, since its text is no longer the document's."""
+        LOGGER.log('Document changed; scan cancelled.', level='debug')
+        self._cancel_chunked_scan()
+    
+    def _cancel_chunked_scan(self):
+        """Stop any scan in progress."""
+        self._chunked_scan = None
+        self._chunked_scan_offset = None
+        if self._chunked_scan_idle_id:
+            gobject.source_remove(self._chunked_scan_idle_id)
+            self._chunked_scan_idle_id = None
+        if self._chunked_scan_changed:
+            doc, handler_id = self._chunked_scan_changed
+            if doc.handler_is_connected(handler_id):
+                doc.disconnect(handler_id)
+            self._chunked_scan_changed = None
+    
+    def _select_with_boundaries(self, doc, offset, word_re, boundaries):
+        """
+        Make the selection of a click whose boundaries were found after the
+        click was handled.
+        """
+        LOGGER.log()
+        if doc is not self._window.get_active_document():
+            return
         self._boundaries = boundaries
+        self._select_regex(doc.get_iter_at_offset(offset), word_re)
+        if not self._drag_handler_ids_per_view:
+            # The button was released while waiting, so there is no drag.
+            self._drag_selector = None
+    
+    # Matching in the match worker process:
+    
+    def _submit_match(self, doc, source_text, word_re, offset):
+        """
+        Have the plugin's match worker find the boundaries of word_re in
+        source_text, and select at offset once they arrive.
+        Return False if there is no match worker to do it.
+        """
+        LOGGER.log()
+        self._cancel_match_request()
+        request_id = self._plugin.submit_match(word_re, source_text,
+            lambda boundaries: self._on_click_match_results(boundaries, doc,
+                                                            offset, word_re))
+        if request_id is None:
+            return False
+        self._match_request = (request_id, doc,
+            doc.connect('changed', self._on_match_request_doc_changed))
+        return True
+    
+    def _on_click_match_results(self, boundaries, doc, offset, word_re):
+        """Make the click's selection with the match worker's boundaries."""
+        LOGGER.log()
+        self._cancel_match_request()
+        if boundaries is None:
+            LOGGER.log('No selection made for %r.' % word_re.pattern,
+                       level='warning')
+            return
+        self._select_with_boundaries(doc, offset, word_re, boundaries)
     
-    def _get_line_iter_pair(self, a_text_iter):
-        """Return iters for the start and end of this iter's line."""
+    def _on_match_request_doc_changed(self, doc):
+        """Drop the request, since its text is no longer the document's."""
+        LOGGER.log('Document changed; match request dropped.', level='debug')
+        self._cancel_match_request()
+    
+    def _cancel_match_request(self):
+        """Drop any pending match worker request of a click."""
+        if self._match_request:
+            request_id, doc, handler_id = self._match_request
+            self._plugin.cancel_match(request_id)
+            if doc.handler_is_connected(handler_id):
+                doc.disconnect(handler_id)
+            self._match_request = None
+    
+    # Speculative selection:
+    
+    def _start_speculation(self, view, event, click, click_iter):
+        """
+        Use the wait for a possible next click of a multiple click to find,
+        in an idle callback, the boundaries the next click type would need.
+        The result is dropped if the pointer moves or the wait runs out.
+        """
         LOGGER.log()
-        left_iter = a_text_iter.copy()
-        right_iter = a_text_iter.copy()
-        left_iter.set_line_offset(0)
-        if not right_iter.ends_line():
-            right_iter.forward_to_line_end()
-        return left_iter, right_iter
+        self._cancel_speculation()
+        if click >= 5:
+            return
+        self._speculation_idle_id = gobject.idle_add(
+            self._speculate, click + 1, click_iter.get_offset())
+        self._restart_speculation_timeout()
+        self._speculation_motion = (view, view.connect('motion_notify_event',
+            self._on_speculation_motion, event.x, event.y))
+    
+    def _restart_speculation_timeout(self):
+        """Keep the speculation for one more multiple-click interval."""
+        if self._speculation_timeout_id:
+            gobject.source_remove(self._speculation_timeout_id)
+        self._speculation_timeout_id = gobject.timeout_add(
+            self._click_counter.double_click_time,
+            self._on_speculation_timeout)
+    
+    def _speculate(self, click, offset):
+        """
+        Find the boundaries for the SelectionOp of the click type, unless it
+        needs none or would scan a document too long to scan at once.
+        """
+        LOGGER.log()
+        self._speculation_idle_id = None
+        op = self._plugin.conf.get_op(click=click)
+        # Structures are found without boundaries.
+        if op.name == 'None' or op.structure:
+            return False
+        word_re = self._compile(op)
+        doc = self._window.get_active_document()
+        if word_re.flags & re.M:
+            if (doc.get_char_count() >= CHUNKED_SCAN_MIN_LENGTH or
+                    self._plugin.caches.peek(doc, 'boundaries',
+                                             (op.pattern, op.flags))):
+                # The click itself scans such a document in steps, or has
+                # the boundaries retained from an earlier one.
+                return False
+            source_text = self._plugin.text_snapshots.get_text(doc)
+        else:
+            source_text = self._get_line_text(doc, offset)[0]
+        self._speculation_request = self._plugin.submit_match(
+            word_re, source_text,
+            lambda boundaries: self._on_speculation_results(
+                boundaries, word_re, source_text))
+        if self._speculation_request is None:
+            self._on_speculation_results(
+                find_boundaries(source_text, word_re), word_re, source_text)
+        LOGGER.log('Preparing boundaries for click %d.' % click,
+                   level='debug')
+        return False
+    
+    def _on_speculation_results(self, boundaries, word_re, source_text):
+        """Keep the boundaries found for the next click type."""
+        LOGGER.log()
+        self._speculation_request = None
+        if boundaries is None:
+            return
+        self._speculation = {
+            (word_re.pattern, word_re.flags): (source_text, boundaries)}
+    
+    def _take_speculation(self, source_text, word_re):
+        """
+        Return the boundaries found in advance if they were found for this
+        regex and text, otherwise None.
+        """
+        LOGGER.log()
+        if self._speculation:
+            key = (word_re.pattern, word_re.flags)
+            if key in self._speculation:
+                spec_text, boundaries = self._speculation[key]
+                # A document's text is the same snapshot until it changes.
+                if spec_text is source_text or spec_text == source_text:
+                    LOGGER.log('Using boundaries found in advance.',
+                               level='debug')
+                    return boundaries
+        return None
+    
+    def _on_speculation_motion(self, view, event, press_x, press_y):
+        """Drop the speculation if the pointer has moved from the click."""
+        if (abs(event.x - press_x) > self._double_click_distance or
+                abs(event.y - press_y) > self._double_click_distance):
+            LOGGER.log('Pointer moved; speculation cancelled.', level='debug')
+            self._cancel_speculation()
+        return False
+    
+    def _on_speculation_timeout(self):
+        """Drop the speculation once no further click can use it."""
+        LOGGER.log()
+        self._speculation_timeout_id = None
+        self._cancel_speculation()
+        return False
+    
+    def _cancel_speculation(self):
+        """Stop any speculation and forget its result."""
+        self._speculation = None
+        if self._speculation_request:
+            self._plugin.cancel_match(self._speculation_request)
+            self._speculation_request = None
+        if self._speculation_idle_id:
+            gobject.source_remove(self._speculation_idle_id)
+            self._speculation_idle_id = None
+        if self._speculation_timeout_id:
+            gobject.source_remove(self._speculation_timeout_id)
+            self._speculation_timeout_id = None
+        if self._speculation_motion:
+            view, handler_id = self._speculation_motion
+            if view.handler_is_connected(handler_id):
+                view.disconnect(handler_id)
+            self._speculation_motion = None
 
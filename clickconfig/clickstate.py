@@ -0,0 +1,279 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module counts the clicks of multiple clicks, up to quintuple-clicks.
+
+Classes:
+ClickCounter -- tells which click of a multiple click a button press makes
+
+GTK reports the presses of a double-click as a BUTTON_PRESS and then a
+_2BUTTON_PRESS event, and those of a triple-click with a further
+_3BUTTON_PRESS event.  It then starts again, so the fourth and fifth presses
+of a quintuple-click come as a BUTTON_PRESS and a _2BUTTON_PRESS.
+ClickCounter counts through those, from the event type, the event time and
+the buffer offset of each press.
+
+Counting a press does not allocate anything, since it runs for every press
+of the mouse button: the state is kept in the slots of one ClickCounter,
+the counting method is looked up in a table of the class, and positions
+are compared as integer offsets.
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its self test and microbenchmark:
+    python clickstate.py
+
+"""
+
+BUTTON_PRESS = 4
+DOUBLE_BUTTON_PRESS = 5
+TRIPLE_BUTTON_PRESS = 6
+"""The values of gtk.gdk.BUTTON_PRESS, _2BUTTON_PRESS and _3BUTTON_PRESS."""
+
+CONSUMED = 0
+"""Count of a press that is part of a multiple click already counted."""
+
+IGNORED = -1
+"""Count of a press that is left for GTK to handle."""
+
+CLICK_NAMES = ('', 'Single-click', 'Double-click', 'Triple-click',
+               'Quadruple-click', 'Quintuple-click')
+"""Names of the click types, by their number of clicks."""
+
+_NEVER = -(1 << 32)
+"""A time long before any event time."""
+
+class ClickCounter(object):
+    
+    """
+    Counts the clicks of multiple clicks of the first mouse button.
+    
+    Usage:
+        click_counter = ClickCounter(double_click_time)
+        click = click_counter.count(event.type, offset, event.time)
+        if click > 0:
+            # make the selection of the click type
+        else:
+            handled = click == CONSUMED
+    
+    """
+    
+    __slots__ = ('double_click_time', 'offset', 'times')
+    
+    def __init__(self, double_click_time):
+        """
+        Prepare to count clicks that are at most double_click_time
+        milliseconds apart.
+        """
+        self.double_click_time = double_click_time
+        """Maximum time (ms) between consecutive clicks in a multiple click."""
+        self.offset = -1
+        """The buffer offset of the most recent single-click."""
+        self.times = [_NEVER] * 6
+        """The time (ms) of the most recent click of each click type."""
+    
+    def count(self, event_type, offset, now):
+        """
+        Return which click (1 to 5) of a multiple click a press of the given
+        event type at the offset and time (ms) makes, or CONSUMED if it is a
+        press that GTK reports for a click already counted, or IGNORED if GTK
+        should handle it.
+        """
+        return self._counters_by_type[event_type](self, offset, now)
+    
+    def get_next_click(self, offset, now):
+        """
+        Return which click (1 to 5) of a multiple click a press at the offset
+        and time (ms) would make, without counting it.
+        """
+        if offset == self.offset:
+            times = self.times
+            double_click_time = self.double_click_time
+            for click in (4, 3, 2, 1):
+                if now - times[click] < double_click_time:
+                    return click + 1
+        return 1
+    
+    def _count_button_press(self, offset, now):
+        """Count a single-, quadruple- or quintuple-click, or consume."""
+        times = self.times
+        double_click_time = self.double_click_time
+        if offset == self.offset:
+            # The pointer must remain in the same position as the first click,
+            # for it to be considered a successive click of a multiple click.
+            if now - times[4] < double_click_time:
+                times[5] = now
+                return 5
+            elif now - times[3] < double_click_time:
+                times[4] = now
+                return 4
+            elif (now - times[2] < double_click_time or
+                    now - times[1] < double_click_time):
+                # The 2nd or 3rd press of a double- or triple-click.
+                return CONSUMED
+        # Record this as the original click.
+        self.offset = offset
+        times[1] = now
+        times[2] = times[3] = times[4] = times[5] = _NEVER
+        return 1
+    
+    def _count_double_button_press(self, offset, now):
+        """Count a double-click, or consume the 5th press of a quintuple."""
+        if offset != self.offset:
+            return IGNORED
+        if now - self.times[4] < self.double_click_time:
+            return CONSUMED
+        self.times[2] = now
+        return 2
+    
+    def _count_triple_button_press(self, offset, now):
+        """Count a triple-click, or consume the 6th press of a sextuple."""
+        if offset != self.offset:
+            return IGNORED
+        if now - self.times[5] < self.double_click_time:
+            return CONSUMED
+        self.times[3] = now
+        return 3
+    
+    _counters_by_type = {
+        BUTTON_PRESS: _count_button_press,
+        DOUBLE_BUTTON_PRESS: _count_double_button_press,
+        TRIPLE_BUTTON_PRESS: _count_triple_button_press,
+        }
+    """The counting function of each event type."""
+
+class _ListClickCounter(object):
+    """
+    The counting of the plugin before ClickCounter, for the self test: a
+    list replaced on each single-click, a dictionary of methods made for
+    each press, and times from time.time().
+    """
+    def __init__(self, double_click_time):
+        self.double_click_time = double_click_time / 1000.0
+        self.last_click = [None, 0, 0, 0, 0, 0]
+    def count(self, event_type, position, now):
+        handlers_by_type = {
+            BUTTON_PRESS: self._handle_1button_press,
+            DOUBLE_BUTTON_PRESS: self._handle_2button_press,
+            TRIPLE_BUTTON_PRESS: self._handle_3button_press,
+            }
+        handled, click = handlers_by_type[event_type](position, now)
+        if click:
+            return click
+        return CONSUMED if handled else IGNORED
+    def _handle_1button_press(self, position, now):
+        handled = False
+        click = None
+        if self.last_click[0] and position.equal(self.last_click[0]):
+            if now - self.last_click[4] < self.double_click_time:
+                self.last_click[5] = now
+                click = 5
+            elif now - self.last_click[3] < self.double_click_time:
+                self.last_click[4] = now
+                click = 4
+            elif now - self.last_click[2] < self.double_click_time:
+                handled = True
+            elif now - self.last_click[1] < self.double_click_time:
+                handled = True
+        if not handled and not click:
+            self.last_click = [position.copy(), now, 0, 0, 0, 0]
+            click = 1
+        return handled, click
+    def _handle_2button_press(self, position, now):
+        handled = False
+        click = None
+        if self.last_click[0] and position.equal(self.last_click[0]):
+            if (now - self.last_click[4]) < self.double_click_time:
+                handled = True
+            else:
+                self.last_click[2] = now
+                click = 2
+        return handled, click
+    def _handle_3button_press(self, position, now):
+        handled = False
+        click = None
+        if self.last_click[0] and position.equal(self.last_click[0]):
+            if (now - self.last_click[5]) < self.double_click_time:
+                handled = True
+            else:
+                self.last_click[3] = now
+                click = 3
+        return handled, click
+
+class _Position(object):
+    """A minimal gtk.TextIter stand-in for the self test."""
+    def __init__(self, offset):
+        self.offset = offset
+    def equal(self, other):
+        return self.offset == other.offset
+    def copy(self):
+        return _Position(self.offset)
+
+def test():
+    """
+    Execute clickstate.py at the command line to run this self test.
+    
+    It checks that ClickCounter counts random sequences of presses as the
+    earlier counting did, that it foresees the clicks of single presses,
+    and times the counting of a press by each.
+    """
+    import random
+    import time
+    random.seed(44)
+    events = []
+    now = 1000000
+    for count in range(20000):
+        # Runs of GTK's press events, as for clicks of one to six presses.
+        offset = random.choice((10, 10, 10, 20))
+        presses = random.randint(1, 6)
+        types = [BUTTON_PRESS, DOUBLE_BUTTON_PRESS, TRIPLE_BUTTON_PRESS] * 2
+        for event_type in types[:presses]:
+            now += random.choice((50, 100, 150, 300))
+            events.append((event_type, offset, now))
+        now += random.choice((100, 500, 2000))
+    # (A limit of whole ms would leave the seconds of the earlier counting to
+    # round either way when a gap equals it.)
+    click_counter = ClickCounter(400.5)
+    list_click_counter = _ListClickCounter(400.5)
+    for event_type, offset, now in events:
+        next_click = click_counter.get_next_click(offset, now)
+        click = click_counter.count(event_type, offset, now)
+        if event_type == BUTTON_PRESS and click > 0:
+            assert click == next_click, (offset, now, next_click)
+        list_click = list_click_counter.count(event_type, _Position(offset),
+                                              now / 1000.0)
+        assert click == list_click, (event_type, offset, now)
+    print('ClickCounter counts %d presses as before.' % len(events))
+    
+    positions = [_Position(offset) for event_type, offset, now in events]
+    start = time.time()
+    for (event_type, offset, now), position in zip(events, positions):
+        list_click_counter.count(event_type, position, time.time())
+    list_time = (time.time() - start) / len(events)
+    start = time.time()
+    for event_type, offset, now in events:
+        click_counter.count(event_type, offset, now)
+    counter_time = (time.time() - start) / len(events)
+    print('Time to count a press:')
+    print('    before (list, dictionary, time.time): %6.2f us' %
+          (list_time * 1000000))
+    print('    ClickCounter:                         %6.2f us' %
+          (counter_time * 1000000))
+
+if __name__ == '__main__':
+    test()
@@ -29,13 +29,25 @@ Config -- the whole store of configuration data for Click_Config
 
 import copy
 import os
+import re
 import shutil
 import sys
 
+from . import linearre
 from .dictfile import read_dict_from_file, write_dict_to_file
 from .logger import Logger
 LOGGER = Logger(level=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')[2])
 
+ENGINES = {
+    're': re.compile,
+    'linear': linearre.compile,
+    }
+"""
+The regex engines a SelectionOp can be matched with, by name.  Each compiles
+a pattern and flags into an object with the pattern and flags attributes and
+the search and finditer methods of a compiled re pattern.
+"""
+
 class SelectionOp(object):
     
     """
@@ -47,11 +59,27 @@ class SelectionOp(object):
         name='Gedit word',
         pattern=r"[a-zA-Z]+|[0-9]+|[^a-zA-Z0-9]+",
         flags=0
-        preserved=True)
+        preserved=True,
+        category='Words',
+        engine='re',
+        structure='')
+    
+    An op without a category can still be grouped in the menu by giving its
+    name a namespace prefix, e.g. 'Python/name' is grouped under 'Python'.
+    
+    An op with the 'linear' engine is matched in time linear in the length
+    of the text, however its pattern is written, but it cannot use
+    backreferences or lookaround assertions.
+    
+    An op with a structure (one of structure.STRUCTURES) is selected by
+    moving through the lines of the buffer instead of matching its pattern,
+    which gives the same selection without copying the document's text.  The
+    built-in Line, Line+, Paragraph and Paragraph+ ops have structures.
     
     """
     
-    def __init__(self, name_or_dict=None, pattern='', flags=0, preserved=0):
+    def __init__(self, name_or_dict=None, pattern='', flags=0, preserved=0,
+                 category='', engine='re', structure=''):
         """
         Define a new SelectionOp from a name, a regex pattern, and regex flags
         or from a dictionary with keys 'name', 'pattern', and 'flags'.
@@ -70,6 +98,15 @@ class SelectionOp(object):
         self.preserved = False
         """Read-only flag for ConfigUI to check before modifying.)."""
         
+        self.category = ''
+        """Menu group of the SelectionOp ('' for the namespace prefix)."""
+        
+        self.engine = 're'
+        """Name of the regex engine in ENGINES that the pattern is for."""
+        
+        self.structure = ''
+        """Structure to select instead of matching the pattern, or ''."""
+        
         if isinstance(name_or_dict, dict):
             dictionary = name_or_dict
             self.from_dict(dictionary)
@@ -79,6 +116,9 @@ class SelectionOp(object):
             self.pattern = pattern
             self.flags = flags
             self.preserved = preserved
+            self.category = category
+            self.engine = engine
+            self.structure = structure
     
     def copy_as(self, name):
         """Return a copy of the SelectionOp with a new name."""
@@ -95,7 +135,10 @@ class SelectionOp(object):
             self.name,
             self.pattern,
             self.flags,
-            self.preserved
+            self.preserved,
+            self.category,
+            self.engine,
+            self.structure
             )
     
     def __copy__(self):
@@ -125,7 +168,10 @@ class SelectionOp(object):
             self.name == op.name and
             self.pattern == op.pattern and
             self.flags == op.flags and
-            self.preserved == op.preserved
+            self.preserved == op.preserved and
+            self.category == op.category and
+            self.engine == op.engine and
+            self.structure == op.structure
             )
         return is_equal
     
@@ -142,6 +188,9 @@ class SelectionOp(object):
             'pattern': self.pattern,
             'flags': self.flags,
             'preserved': self.preserved,
+            'category': self.category,
+            'engine': self.engine,
+            'structure': self.structure,
             }
     
     def from_dict(self, dictionary):
@@ -151,6 +200,33 @@ class SelectionOp(object):
         self.pattern = dictionary['pattern']
         self.flags = dictionary['flags']
         self.preserved = dictionary['preserved']
+        # The category would not be in a config file from an older version.
+        if 'category' in dictionary:
+            self.category = dictionary['category']
+        if 'engine' in dictionary:
+            self.engine = dictionary['engine']
+        if 'structure' in dictionary:
+            self.structure = dictionary['structure']
+    
+    def compile(self):
+        """
+        Return the compiled regex of the SelectionOp, from its engine.
+        Raise re.error if the pattern is invalid for the engine.
+        """
+        LOGGER.log()
+        return ENGINES[self.engine](self.pattern, self.flags)
+    
+    def get_category(self):
+        """
+        Return the menu group of the SelectionOp: its category, or else the
+        namespace prefix of its name, or else '' for the top level.
+        """
+        LOGGER.log()
+        if self.category:
+            return self.category
+        if '/' in self.name.strip('/'):
+            return self.name.split('/', 1)[0].strip()
+        return ''
 
 class ConfigSet(object):
     
@@ -189,7 +265,7 @@ class ConfigSet(object):
             self.name = name
             self.op_names = op_names
             self.preserved = preserved
-        
+    
     def copy_as(self, name):
         """Return a copy of the ConfigSet with a new name."""
         LOGGER.log()
@@ -316,9 +392,56 @@ class Config(object):
         
         self.window_height_short = 0
         """Height of configuration window without langauge frame."""
-    
+        
         self.window_height_tall = 0
         """Height of configuration window with langauge frame."""
+        
+        self.scan_time_slice = 20
+        """
+        Most milliseconds a document scan for a multiline regex may take in
+        one main loop iteration, for documents long enough to be scanned in
+        steps.  A regex that is matched in the match worker is not scanned
+        in steps, since the worker keeps gedit responding by itself.
+        """
+        
+        self.is_match_in_worker = True
+        """
+        Whether to match regexes in a worker process where they can be
+        stopped: those of clicks that may backtrack for a long time, and
+        those of the click types that may follow a click.
+        """
+        
+        self.match_time_budget = 2000
+        """Milliseconds a SelectionOp may match before its worker is killed."""
+        
+        self.cache_budget = 64 * 1024 * 1024
+        """
+        Bytes the plugin's caches (text snapshots, compiled regexes,
+        boundaries, match indexes and structure indexes) may take before the
+        caches of the least recently clicked documents are evicted.
+        """
+        
+        self.is_hover_preview = False
+        """Whether to underline the selection a click would make."""
+        
+        self.hover_preview_time_budget = 4
+        """
+        Most milliseconds an update of the hover preview may take before
+        the work it took too long for is no longer tried.
+        """
+        
+        self.expand_ladder = []
+        """
+        Names of the SelectionOps that Expand and Shrink Selection step
+        through, or none to step through the current ConfigSet's.
+        """
+        
+        self.offered_structure_ops = []
+        """
+        Names of the default SelectionOps with structures that have been
+        added to the configuration, so that update_structures does not add
+        them again once they are removed.
+        """
     
     def copy(self, memo=None):
         """Return a (deep) copy of the Config."""
@@ -336,6 +459,14 @@ class Config(object):
         new.window_width = self.window_width
         new.window_height_short = self.window_height_short
         new.window_height_tall = self.window_height_tall
+        new.scan_time_slice = self.scan_time_slice
+        new.is_match_in_worker = self.is_match_in_worker
+        new.match_time_budget = self.match_time_budget
+        new.cache_budget = self.cache_budget
+        new.is_hover_preview = self.is_hover_preview
+        new.hover_preview_time_budget = self.hover_preview_time_budget
+        new.expand_ladder = list(self.expand_ladder)
+        new.offered_structure_ops = list(self.offered_structure_ops)
         return new
     
     def __copy__(self):
@@ -375,7 +506,16 @@ class Config(object):
             self.current_configset_name == config.current_configset_name and
             self.current_op_name == config.current_op_name and
             self.languages == config.languages and
-            self.is_set_by_language == config.is_set_by_language
+            self.is_set_by_language == config.is_set_by_language and
+            self.scan_time_slice == config.scan_time_slice and
+            self.is_match_in_worker == config.is_match_in_worker and
+            self.match_time_budget == config.match_time_budget and
+            self.cache_budget == config.cache_budget and
+            self.is_hover_preview == config.is_hover_preview and
+            self.hover_preview_time_budget ==
+                config.hover_preview_time_budget and
+            self.expand_ladder == config.expand_ladder and
+            self.offered_structure_ops == config.offered_structure_ops
             )
         return is_equal
     
@@ -397,6 +537,14 @@ class Config(object):
             'window_width': self.window_width,
             'window_height_short': self.window_height_short,
             'window_height_tall': self.window_height_tall,
+            'scan_time_slice': self.scan_time_slice,
+            'is_match_in_worker': self.is_match_in_worker,
+            'match_time_budget': self.match_time_budget,
+            'cache_budget': self.cache_budget,
+            'is_hover_preview': self.is_hover_preview,
+            'hover_preview_time_budget': self.hover_preview_time_budget,
+            'expand_ladder': self.expand_ladder,
+            'offered_structure_ops': self.offered_structure_ops,
             }
     
     def from_dict(self, dictionary):
@@ -420,6 +568,26 @@ class Config(object):
             self.window_height_short = dictionary['window_height_short']
         if 'window_height_tall' in dictionary:
             self.window_height_tall = dictionary['window_height_tall']
+        if 'scan_time_slice' in dictionary:
+            self.scan_time_slice = dictionary['scan_time_slice']
+        if 'is_match_in_worker' in dictionary:
+            self.is_match_in_worker = dictionary['is_match_in_worker']
+        if 'match_time_budget' in dictionary:
+            self.match_time_budget = dictionary['match_time_budget']
+        if 'cache_budget' in dictionary:
+            self.cache_budget = dictionary['cache_budget']
+        if 'is_hover_preview' in dictionary:
+            self.is_hover_preview = dictionary['is_hover_preview']
+        if 'hover_preview_time_budget' in dictionary:
+            self.hover_preview_time_budget = \
+                dictionary['hover_preview_time_budget']
+        if 'expand_ladder' in dictionary:
+            self.expand_ladder = dictionary['expand_ladder']
+        if 'offered_structure_ops' in dictionary:
+            self.offered_structure_ops = dictionary['offered_structure_ops']
+        else:
+            # A config file from before structures was offered none of them.
+            self.offered_structure_ops = []
     
     def partial_from_dict(self, dictionary):
         """Read from a dictionary representing this object."""
@@ -453,6 +621,28 @@ class Config(object):
             if configset_name not in configset_names:
                 self.languages[language] = default_configset_name
     
+    def update_structures(self, default_ops):
+        """
+        Give the structure of each of the default ops to the op of the same
+        name, pattern and flags, which a config file from before structures
+        would have without one, and add any default op with a structure that
+        is not named in the config file and has not been added before.
+        """
+        LOGGER.log()
+        op_names = self.get_op_names()
+        for default_op in default_ops:
+            if not default_op.structure:
+                continue
+            if default_op.name not in self.offered_structure_ops:
+                self.offered_structure_ops.append(default_op.name)
+                if default_op.name not in op_names:
+                    self.add_op(default_op.copy())
+            for op in self.ops:
+                if (op.name == default_op.name and
+                        op.pattern == default_op.pattern and
+                        op.flags == default_op.flags):
+                    op.structure = default_op.structure
+    
     # ConfigSet access
     
     def add_configset(self, configset):
@@ -591,6 +781,25 @@ class Config(object):
         op_names = op_names[0:1] + sorted(op_names[1:])
         return op_names
     
+    def get_op_names_by_category(self):
+        """
+        Return a list of the uncategorized SelectionOp names (without 'None')
+        and a dictionary of sorted SelectionOp name lists by category.
+        """
+        LOGGER.log()
+        top_names = []
+        names_by_category = {}
+        for op in self.ops[1:]:
+            category = op.get_category()
+            if category:
+                names_by_category.setdefault(category, []).append(op.name)
+            else:
+                top_names.append(op.name)
+        top_names.sort()
+        for op_names in names_by_category.values():
+            op_names.sort()
+        return top_names, names_by_category
+    
     # SelectionOp attribute access
     
     def get_pattern(self,
@@ -708,5 +917,5 @@ class Config(object):
         LOGGER.log()
         config_dict = read_dict_from_file(filename)
         self.partial_from_dict(config_dict)
-    
+
 
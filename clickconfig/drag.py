@@ -0,0 +1,243 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module extends a click's selection as the pointer is dragged.
+
+Classes:
+DragSelector      -- selects from the click's selection to the span under
+                     the pointer
+BoundarySpans     -- the spans between the boundaries of a MULTILINE regex
+LineBoundarySpans -- the spans between the boundaries of a regex in each line
+StructureSpans    -- the spans of a structural SelectionOp
+
+Everything a drag needs is captured when the click's selection is made, as
+character offsets, so that each motion event only has to find the span at
+the pointer's offset (with a binary search of the boundaries) and make one
+select_range call, or nothing at all while the pointer stays within the
+span it was last in.
+
+"""
+
+import bisect
+import re
+
+from .boundaries import find_boundaries
+from .structure import find_structure_span
+
+class DragSelector(object):
+    
+    """
+    Extends the selection of a click to the span under the pointer.
+    
+    Usage:
+        drag_selector = DragSelector(doc, start, end, spans)
+        ...
+        drag_selector.drag_to(offset) # for each motion event
+    
+    """
+    
+    def __init__(self, doc, anchor_start, anchor_end, spans):
+        """
+        Prepare to extend the selection of a click, from anchor_start to
+        anchor_end, with spans (a BoundarySpans, LineBoundarySpans or
+        StructureSpans).
+        """
+        self.doc = doc
+        """The document the selection is in."""
+        self.anchor_start = anchor_start
+        """Start offset of the click's selection."""
+        self.anchor_end = anchor_end
+        """End offset of the click's selection."""
+        self.spans = spans
+        """Finds the span at an offset."""
+        self._span = (anchor_start, anchor_end)
+        """The span the pointer was last in."""
+        self._selected = (anchor_start, anchor_end)
+        """The start and end offsets of the selection made."""
+    
+    def drag_to(self, offset):
+        """
+        Select from the click's selection to the span at offset.
+        Return True if the selection was changed.
+        """
+        span_start, span_end = self._span
+        if span_start <= offset < span_end:
+            return False
+        span = self.spans.find(offset)
+        if not span:
+            return False
+        self._span = span
+        selected = (min(self.anchor_start, span[0]),
+                    max(self.anchor_end, span[1]))
+        if selected == self._selected:
+            return False
+        self._selected = selected
+        doc = self.doc
+        doc.select_range(doc.get_iter_at_offset(selected[0]),
+                         doc.get_iter_at_offset(selected[1]))
+        return True
+
+class BoundarySpans(object):
+    
+    """
+    The spans between the boundaries of a MULTILINE regex, or of a regex in
+    one line.
+    """
+    
+    def __init__(self, boundaries):
+        """Keep the boundaries of the regex in the document or line."""
+        self.boundaries = boundaries
+        """The boundaries, which are document offsets."""
+    
+    def find(self, offset):
+        """
+        Return the start and end of the match or gap at offset, or None if
+        offset is outside the boundaries.
+        """
+        boundaries = self.boundaries
+        if not boundaries[0] <= offset <= boundaries[-1]:
+            return None
+        return _find_span(boundaries, offset)
+
+class LineBoundarySpans(object):
+    
+    """
+    The spans between the boundaries of a regex that is matched within
+    lines.  The boundaries of a line are found when the pointer enters it.
+    """
+    
+    def __init__(self, doc, word_re, snapshots, lines):
+        """
+        Prepare to find the boundaries of word_re in lines of doc, taking
+        their text from snapshots (the plugin's TextSnapshots) if the
+        document's snapshot is kept, or else from the document, and their
+        offsets from lines (its DocumentLines).
+        """
+        self.doc = doc
+        """The document the lines are in."""
+        self.word_re = word_re
+        """The compiled regex."""
+        self.snapshots = snapshots
+        """The TextSnapshots the lines' text is taken from."""
+        self.lines = lines
+        """The DocumentLines the lines' offsets are taken from."""
+        self._line = None
+        """The line whose boundaries were found last."""
+        self._line_offset = 0
+        """The offset of the start of that line."""
+        self._boundaries = None
+        """The boundaries in that line (None if it is empty)."""
+    
+    def find(self, offset):
+        """
+        Return the start and end of the match or gap at offset, or None if
+        its line is empty.
+        """
+        line = self.lines.get_line(offset)
+        if line != self._line:
+            line_start, line_end = self.lines.get_line_bounds(line)
+            text = self.snapshots.get_kept_text(self.doc)
+            if text is None:
+                # Taking a snapshot for one line would decode the whole
+                # document.
+                doc = self.doc
+                line_text = doc.get_slice(doc.get_iter_at_offset(line_start),
+                                          doc.get_iter_at_offset(line_end))
+                line_text = line_text.decode('utf-8')
+            else:
+                line_text = text[line_start:line_end]
+            self._line = line
+            self._line_offset = line_start
+            self._boundaries = (find_boundaries(line_text, self.word_re)
+                                if line_text else None)
+        if not self._boundaries:
+            return None
+        line_offset = self._line_offset
+        start, end = _find_span(self._boundaries, offset - line_offset)
+        return line_offset + start, line_offset + end
+
+class StructureSpans(object):
+    
+    """The spans of a structural SelectionOp."""
+    
+    def __init__(self, doc, op, index, snapshots, lines, use_regex=True):
+        """
+        Prepare to find the spans of op's structure, with the document's
+        index for it (or None), and the plugin's TextSnapshots and the
+        document's DocumentLines for where the op's regex is used.  Without
+        use_regex, there are no spans where the structure cannot be used.
+        """
+        self.doc = doc
+        """The document the spans are in."""
+        self.op = op
+        """The SelectionOp."""
+        self.index = index
+        """The DocumentBrackets or DocumentIndents used, if any."""
+        self.snapshots = snapshots
+        """The TextSnapshots the regex is matched in."""
+        self.lines = lines
+        """The DocumentLines of the document."""
+        self.use_regex = use_regex
+        """Whether the op's regex is used where the structure fails."""
+        self._regex_spans = None
+        """The spans of the op's regex, for where the structure fails."""
+    
+    def find(self, offset):
+        """
+        Return the start and end of the structure at offset, or None if
+        there is nothing to select there.
+        """
+        doc = self.doc
+        span = find_structure_span(doc.get_iter_at_offset(offset),
+                                   self.op.structure, self.index)
+        if span is None:
+            if not self.use_regex:
+                return None
+            if not self._regex_spans:
+                self._regex_spans = make_regex_spans(
+                    doc, self.op.compile(), self.snapshots, self.lines)
+            return self._regex_spans.find(offset)
+        start, end = span[0].get_offset(), span[1].get_offset()
+        if start == end:
+            return None
+        return start, end
+
+def make_regex_spans(doc, word_re, snapshots, lines, boundaries=None):
+    """
+    Return a BoundarySpans or LineBoundarySpans for word_re in the document,
+    finding the boundaries of a MULTILINE regex in the document's snapshot
+    unless they are given.
+    """
+    if word_re.flags & re.M:
+        if boundaries is None:
+            boundaries = find_boundaries(snapshots.get_text(doc), word_re)
+        return BoundarySpans(boundaries)
+    return LineBoundarySpans(doc, word_re, snapshots, lines)
+
+def _find_span(boundaries, offset):
+    """
+    Return the boundaries before and after offset, as the first that is
+    greater than offset and the one before it.
+    """
+    index = bisect.bisect_right(boundaries, offset)
+    if index == len(boundaries):
+        # At the end, the last span ends at the first of any repeats of the
+        # last boundary.
+        index = bisect.bisect_left(boundaries, boundaries[-1])
+    return boundaries[index - 1], boundaries[index]
@@ -0,0 +1,166 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module highlights the matches of a SelectionOp in a view.
+
+Classes:
+MatchHighlighter -- highlights the matches in the visible part of a view
+
+Only the matches in the lines that are visible are tagged, found in a
+MatchIndex with binary searches, so the tagging takes the same time for a
+document of a million matches as for one of a hundred.  The tags are moved
+at most once per frame as the view scrolls or is resized.  When the
+document is edited, the highlights are removed, and they are found again
+once the edits pause, the index being built a frame's time at a time until
+it is done.
+
+"""
+
+import gobject
+
+MATCH_TAG_NAME = 'click-config-match'
+"""Name of the tag that highlights matches in a document."""
+
+MATCH_BACKGROUND = '#fce94f'
+"""Background colour of highlighted matches."""
+
+REFRESH_DELAY = 500
+"""Milliseconds after the last edit before the highlights are found again."""
+
+class MatchHighlighter(object):
+    
+    """
+    Highlights the matches in the visible part of a view.
+    
+    Usage:
+        highlighter = MatchHighlighter(view, get_index, frame_time)
+        ...
+        highlighter.refresh() # when the matches to highlight change
+        ...
+        highlighter.disconnect()
+    
+    """
+    
+    def __init__(self, view, get_index, frame_time):
+        """
+        Prepare to highlight the matches in view, which get_index(doc)
+        returns as a MatchIndex (or None), at most every frame_time
+        milliseconds, and highlight those visible now.  While the index it
+        returns is not built, it is asked again in the next frame.
+        """
+        self.view = view
+        """The view whose visible matches are highlighted."""
+        self.doc = view.get_buffer()
+        """The document of the view."""
+        self.get_index = get_index
+        """Returns the MatchIndex of the document."""
+        self.frame_time = frame_time
+        """Milliseconds between updates of the highlights."""
+        self._highlighted = None
+        """The MatchIndex and the range of offsets highlighted."""
+        self._frame_id = None
+        """Source id of the timeout for the next update."""
+        self._refresh_id = None
+        """Source id of the timeout for the update after edits."""
+        adjustment = view.get_vadjustment()
+        self._handlers = [
+            (adjustment,
+             adjustment.connect('value-changed', self._on_view_moved)),
+            (view, view.connect('size-allocate', self._on_view_moved)),
+            (self.doc, self.doc.connect('changed', self._on_changed)),
+            ]
+        """The objects watched and their handler ids."""
+        self.refresh()
+    
+    def refresh(self):
+        """Update the highlights in the next frame."""
+        if not self._frame_id:
+            self._frame_id = gobject.timeout_add(self.frame_time,
+                                                 self._on_frame)
+    
+    def disconnect(self):
+        """Remove the highlights and stop watching the view."""
+        for source_id in (self._frame_id, self._refresh_id):
+            if source_id:
+                gobject.source_remove(source_id)
+        self._frame_id = None
+        self._refresh_id = None
+        for widget, handler_id in self._handlers:
+            if widget.handler_is_connected(handler_id):
+                widget.disconnect(handler_id)
+        self._handlers = []
+        self._remove()
+    
+    def _on_view_moved(self, *args):
+        """Update the highlights after the view scrolls or is resized."""
+        if not self._refresh_id:
+            self.refresh()
+    
+    def _on_changed(self, doc):
+        """Remove the highlights, to be found again when the edits pause."""
+        self._remove()
+        if self._frame_id:
+            gobject.source_remove(self._frame_id)
+            self._frame_id = None
+        if self._refresh_id:
+            gobject.source_remove(self._refresh_id)
+        self._refresh_id = gobject.timeout_add(REFRESH_DELAY,
+                                               self._on_refresh_timeout)
+    
+    def _on_refresh_timeout(self):
+        """Find the highlights again after edits."""
+        self._refresh_id = None
+        self._on_frame()
+        return False
+    
+    def _on_frame(self):
+        """Highlight the matches in the lines that are visible."""
+        self._frame_id = None
+        view = self.view
+        doc = self.doc
+        rect = view.get_visible_rect()
+        start_iter = view.get_line_at_y(rect.y)[0]
+        end_iter = view.get_line_at_y(rect.y + rect.height)[0]
+        end_iter.forward_to_line_end()
+        index = self.get_index(doc)
+        if index is not None and not index.is_built():
+            self.refresh()
+            return False
+        highlighted = (index, start_iter.get_offset(), end_iter.get_offset())
+        if highlighted == self._highlighted:
+            return False
+        self._remove()
+        if index is None:
+            return False
+        tag = doc.get_tag_table().lookup(MATCH_TAG_NAME)
+        if tag is None:
+            tag = doc.create_tag(MATCH_TAG_NAME, background=MATCH_BACKGROUND)
+        for start, end in index.find_in_range(highlighted[1],
+                                              highlighted[2]):
+            doc.apply_tag(tag, doc.get_iter_at_offset(start),
+                          doc.get_iter_at_offset(end))
+        self._highlighted = highlighted
+        return False
+    
+    def _remove(self):
+        """Remove the highlights, if there are any."""
+        if self._highlighted:
+            self.doc.remove_tag_by_name(MATCH_TAG_NAME,
+                                        *self.doc.get_bounds())
+            self._highlighted = None
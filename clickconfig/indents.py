@@ -0,0 +1,309 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module finds the indentation block that holds a line, for the 'indent'
+structure of SelectionOps.
+
+Classes:
+IndentIndex     -- the indentation width of each line of a text
+DocumentIndents -- keeps an IndentIndex of a gedit document through edits
+
+A line followed by more indented lines heads a block of them, as a Python
+'def' or a YAML mapping key does, and clicking it selects it with its block.
+Clicking any other line selects the lines around it that are indented at
+least as far.  Blank lines are skipped over when looking for the ends of a
+block, and a blank line is taken as part of the block of the next line with
+text.  Tabs are taken to stop every 8 columns, as Python takes them.
+
+The widths are kept in an array with one int per line (-1 for a blank line),
+and an edit replaces only the widths of the lines it changes.
+
+IndentIndex does not depend on gedit or GTK, so this module can be run at
+the command line for its self test:
+    python indents.py
+
+"""
+
+import array
+import re
+
+_LINE_END_RE = re.compile(u'\r\n|\n|\r|\u2029')
+"""Matches the line ends GTK ends lines at."""
+
+TAB_WIDTH = 8
+"""The columns between tab stops."""
+
+class IndentIndex(object):
+    
+    """
+    The indentation width of each line of a text.
+    
+    Usage:
+        index = IndentIndex(text)
+        index.replace_lines(first, last, text)
+        block = index.find_block(line)
+        if block:
+            first, last = block
+    
+    """
+    
+    def __init__(self, text):
+        """Find the width of each line of the text."""
+        self._widths = _get_widths(text)
+        """Indentation width of each line (-1 for a blank line)."""
+    
+    def __len__(self):
+        """Return the number of lines."""
+        return len(self._widths)
+    
+    def get_size(self):
+        """Return the bytes taken by the widths."""
+        return len(self._widths) * self._widths.itemsize
+    
+    def replace_lines(self, first, last, text):
+        """
+        Replace the widths of the lines from first to last (inclusive) with
+        those of the lines of text.
+        """
+        self._widths[first:last + 1] = _get_widths(text)
+    
+    def find_block(self, line):
+        """
+        Return the first and last lines of the block that holds the line, or
+        None if there are only blank lines.
+        """
+        widths = self._widths
+        anchor = _find_text_line(widths, line, 1)
+        if anchor is None:
+            anchor = _find_text_line(widths, line, -1)
+            if anchor is None:
+                return None
+        width = widths[anchor]
+        below = _find_text_line(widths, anchor + 1, 1)
+        if below is not None and widths[below] > width:
+            # The line heads the block of the more indented lines below it.
+            return anchor, _find_block_end(widths, anchor, width + 1, 1)
+        return (_find_block_end(widths, anchor, width, -1),
+                _find_block_end(widths, anchor, width, 1))
+
+def _get_widths(text):
+    """Return an array of the widths of the lines of the text."""
+    return array.array('i', (_get_width(line)
+                             for line in _LINE_END_RE.split(text)))
+
+def _get_width(line):
+    """Return the indentation width of the line, or -1 if it is blank."""
+    if not line.strip():
+        return -1
+    width = 0
+    for char in line:
+        if char == ' ':
+            width += 1
+        elif char == '\t':
+            width += TAB_WIDTH - width % TAB_WIDTH
+        else:
+            break
+    return width
+
+def _find_text_line(widths, line, step):
+    """
+    Return the first line that is not blank from line, going forward (step
+    1) or back (step -1), or None if there is none.
+    """
+    count = len(widths)
+    while 0 <= line < count:
+        if widths[line] >= 0:
+            return line
+        line += step
+    return None
+
+def _find_block_end(widths, line, width, step):
+    """
+    Return the last line with text, going forward or back from line, before
+    a line with text that is indented less than width.
+    """
+    count = len(widths)
+    end = line
+    line += step
+    while 0 <= line < count:
+        line_width = widths[line]
+        if line_width >= width:
+            end = line
+        elif line_width >= 0:
+            break
+        line += step
+    return end
+
+class DocumentIndents(object):
+    
+    """
+    Keeps an IndentIndex of a document (a gtk.TextBuffer), building it when
+    first needed and replacing the widths of the lines each edit changes.
+    
+    Usage:
+        indents = DocumentIndents(doc, snapshots)
+        block = indents.find_block(line)
+        ...
+        indents.disconnect()
+    
+    """
+    
+    def __init__(self, doc, snapshots):
+        """
+        Watch the document for changes, and take its text from snapshots (the
+        plugin's TextSnapshots) when the index is built.
+        """
+        self.doc = doc
+        """The document whose lines are indexed."""
+        self.snapshots = snapshots
+        """The TextSnapshots the document's text is taken from."""
+        self._index = None
+        """The IndentIndex of the document (None until needed)."""
+        self._handler_ids = [
+            doc.connect('insert-text', self._on_insert_text),
+            doc.connect('delete-range', self._on_delete_range),
+            doc.connect('changed', self._on_changed),
+            ]
+        """Handlers of the document's signals."""
+    
+    def find_block(self, line):
+        """
+        Return the first and last lines of the block that holds the line, or
+        None if there are only blank lines.
+        """
+        if self._index is None:
+            self._index = IndentIndex(self.snapshots.get_text(self.doc))
+        return self._index.find_block(line)
+    
+    def get_size(self):
+        """Return the bytes taken by the index (0 if it is not built)."""
+        return self._index.get_size() if self._index else 0
+    
+    def is_built(self):
+        """Return whether the index is built, so using it needs no scan."""
+        return self._index is not None
+    
+    def disconnect(self):
+        """Stop watching the document."""
+        for handler_id in self._handler_ids:
+            if self.doc.handler_is_connected(handler_id):
+                self.doc.disconnect(handler_id)
+        self._handler_ids = []
+        self._index = None
+    
+    def _on_insert_text(self, doc, location, text, length):
+        """Replace the width of the line text is about to be inserted in."""
+        if self._index:
+            line_start_iter, line_end_iter = _get_line_bounds(location,
+                                                              location)
+            new_text = (line_start_iter.get_slice(location) + text +
+                        location.get_slice(line_end_iter))
+            self._index.replace_lines(location.get_line(), location.get_line(),
+                                      new_text.decode('utf-8'))
+    
+    def _on_delete_range(self, doc, start_iter, end_iter):
+        """Replace the widths of the lines text is about to be deleted from."""
+        if self._index:
+            line_start_iter, line_end_iter = _get_line_bounds(start_iter,
+                                                              end_iter)
+            new_text = (line_start_iter.get_slice(start_iter) +
+                        end_iter.get_slice(line_end_iter))
+            self._index.replace_lines(start_iter.get_line(),
+                                      end_iter.get_line(),
+                                      new_text.decode('utf-8'))
+    
+    def _on_changed(self, doc):
+        """
+        Drop the index if an edit has joined or split line ends in a way the
+        widths did not follow (such as a \\n inserted after a \\r).
+        """
+        if self._index and len(self._index) != doc.get_line_count():
+            self._index = None
+
+def _get_line_bounds(start_iter, end_iter):
+    """
+    Return iters at the start of the line of start_iter and at the end of
+    the line of end_iter (before its line end).
+    """
+    line_start_iter = start_iter.copy()
+    line_start_iter.set_line_offset(0)
+    line_end_iter = end_iter.copy()
+    if not line_end_iter.ends_line():
+        line_end_iter.forward_to_line_end()
+    return line_start_iter, line_end_iter
+
+def test():
+    """
+    Execute indents.py at the command line to run this self test.
+    
+    It checks the blocks found in some Python text, and that replacing the
+    widths of edited lines gives the same widths as indexing the edited text.
+    """
+    import random
+    text = u'\n'.join([
+        u'import os',                   # 0
+        u'',                            # 1
+        u'def f(x):',                   # 2
+        u'    if x:',                   # 3
+        u'\treturn 1',                  # 4
+        u'',                            # 5
+        u'    return 2',                # 6
+        u'',                            # 7
+        u'def g():',                    # 8
+        u'    pass',                    # 9
+        u'',                            # 10
+        ])
+    index = IndentIndex(text)
+    expected = {0: (0, 9), 1: (2, 6), 2: (2, 6), 3: (3, 4), 4: (4, 4),
+                5: (3, 6), 6: (3, 6), 7: (8, 9), 8: (8, 9), 9: (9, 9),
+                10: (9, 9)}
+    for line, block in sorted(expected.items()):
+        assert index.find_block(line) == block, (line, index.find_block(line))
+    assert IndentIndex(u'  \n\n').find_block(1) is None
+    print('find_block finds the expected blocks.')
+    
+    random.seed(41)
+    for count in range(2000):
+        text = u''.join(random.choice(u'a \t\n\r') for i in range(30))
+        index = IndentIndex(text)
+        start = random.randint(0, len(text))
+        end = random.randint(start, len(text))
+        inserted = u''.join(random.choice(u'a \t\n') for i in range(3))
+        # Replace the lines holding start and end, as DocumentIndents does.
+        first = len(_LINE_END_RE.findall(text[:start]))
+        last = len(_LINE_END_RE.findall(text[:end]))
+        line_start = 0
+        for match in _LINE_END_RE.finditer(text[:start]):
+            line_start = match.end()
+        line_end = _LINE_END_RE.search(text, end)
+        line_end = line_end.start() if line_end else len(text)
+        if text[line_end - 1:line_end + 1] == u'\r\n' or \
+                u'\r' in (text[start - 1:start] + text[end:end + 1]):
+            # Joining or splitting a \r\n is left to DocumentIndents' check
+            # of the line count.
+            continue
+        new_text = text[:start] + inserted + text[end:]
+        index.replace_lines(first, last, text[line_start:start] + inserted +
+                            text[end:line_end])
+        assert index._widths == IndentIndex(new_text)._widths, \
+            (text, start, end, inserted)
+    print('replace_lines gives the widths of the edited text.')
+
+if __name__ == '__main__':
+    test()
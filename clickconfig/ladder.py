@@ -0,0 +1,143 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module steps a selection out and in through nested selections.
+
+Classes:
+SelectionLadder -- the nested spans that several SelectionOps would select
+                   around one offset
+
+The spans of a ladder of SelectionOps at one offset (such as a word, a
+name, a line and a paragraph) are found once, when the first step is taken,
+and are kept ordered from the innermost out.  A span that does not contain
+the one inside it is left out, so that each step out grows the selection
+and each step in shrinks it.  The steps then only compare offsets.
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its self test:
+    python ladder.py
+
+"""
+
+SPAN_SIZE = 72
+"""Estimated bytes of a span (a tuple of two ints)."""
+
+class SelectionLadder(object):
+    
+    """
+    The nested spans that several SelectionOps would select around an
+    offset.
+    
+    Usage:
+        ladder = SelectionLadder(anchor, spans)
+        start, end = ladder.expand(start, end)
+        start, end = ladder.shrink(start, end)
+    
+    """
+    
+    def __init__(self, anchor, spans):
+        """
+        Keep those of spans (start and end offsets, or None where an op
+        selects nothing) that nest around the anchor offset.
+        """
+        self.anchor = anchor
+        """The offset the spans are around."""
+        self.spans = []
+        """The nested spans, from the innermost out."""
+        inner_start, inner_end = anchor, anchor
+        for start, end in sorted(set(span for span in spans if span),
+                                 key=lambda span: span[1] - span[0]):
+            if (start <= inner_start and inner_end <= end and
+                    (start, end) != (inner_start, inner_end)):
+                self.spans.append((start, end))
+                inner_start, inner_end = start, end
+    
+    def __len__(self):
+        """Return the number of spans."""
+        return len(self.spans)
+    
+    def get_size(self):
+        """Return an estimate of the bytes taken by the spans."""
+        return len(self.spans) * SPAN_SIZE
+    
+    def has_step(self, start, end):
+        """
+        Return whether the selection from start to end is one of the
+        ladder's steps (a span, or the anchor itself).
+        """
+        return ((start, end) in self.spans or
+                start == end == self.anchor)
+    
+    def expand(self, start, end):
+        """
+        Return the innermost span that contains and is larger than the
+        selection from start to end, or None if there is none.
+        """
+        for span in self.spans:
+            if (span[0] <= start and end <= span[1] and
+                    span != (start, end)):
+                return span
+        return None
+    
+    def shrink(self, start, end):
+        """
+        Return the outermost span that is within and smaller than the
+        selection from start to end, or the anchor (as an empty span) if
+        there is none.
+        """
+        for span in reversed(self.spans):
+            if (start <= span[0] and span[1] <= end and
+                    span != (start, end)):
+                return span
+        return self.anchor, self.anchor
+
+def test():
+    """
+    Execute ladder.py at the command line to run this self test.
+    
+    It checks that stepping out and back in goes through the nested spans.
+    """
+    # A word, a name, an op that selects nothing, a line, the line and its
+    # line end, a span that overlaps them without containing them, a
+    # paragraph and the word again.
+    spans = [(4, 7), (4, 11), None, (0, 20), (0, 21), (2, 30), (0, 40),
+             (4, 7)]
+    ladder = SelectionLadder(5, spans)
+    assert ladder.spans == [(4, 7), (4, 11), (0, 20), (0, 21), (0, 40)], \
+        ladder.spans
+    steps = [(5, 5)]
+    while True:
+        span = ladder.expand(*steps[-1])
+        if span is None:
+            break
+        assert ladder.has_step(*span)
+        steps.append(span)
+    assert steps == [(5, 5)] + ladder.spans, steps
+    for span in reversed(steps[:-1]):
+        assert ladder.shrink(*steps.pop()) == span
+    # A selection that is not a step steps to the nearest spans.
+    assert ladder.expand(3, 8) == (0, 20)
+    assert ladder.shrink(3, 12) == (4, 11)
+    assert ladder.shrink(5, 6) == (5, 5)
+    assert not ladder.has_step(3, 8)
+    assert SelectionLadder(5, [None]).expand(5, 5) is None
+    print('SelectionLadder steps through the nested spans.')
+
+if __name__ == '__main__':
+    test()
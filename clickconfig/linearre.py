@@ -0,0 +1,588 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module provides a regular expression engine whose matching time is
+linear in the length of the text, for patterns that the re module could make
+backtrack for a very long time.
+
+Functions:
+compile -- compile a pattern (with re flags) into a LinearPattern
+
+Classes:
+LinearPattern -- a compiled pattern, with search and finditer like re's
+LinearMatch   -- the span of a match
+
+Patterns are parsed with sre_parse, so they have re's syntax, and matches
+are the ones re would find (leftmost, with re's preference among
+alternatives and between greedy and lazy repeats).  Backreferences,
+lookahead and lookbehind assertions, and conditional groups cannot be
+matched in linear time, so compiling a pattern that has them raises re.error.
+So does a repeat of something that can match the empty string, as in
+(?:a|b?)+, since re gives special treatment to such empty iterations.  The
+LOCALE flag is not supported either.  Groups are not captured; a match only
+has its overall span.
+
+The engine simulates a Thompson NFA (as a "Pike VM"), keeping its threads in
+priority order, and caches each step from one ordered set of threads to the
+next, so that it runs as a lazily built DFA once the cache is warm.
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its differential test against re:
+    python linearre.py
+
+"""
+
+import re
+import sre_constants
+import sre_parse
+
+MAX_PROGRAM_SIZE = 20000
+"""Most instructions a compiled pattern may have (repeats are expanded)."""
+
+MAX_CACHED_STEPS = 20000
+"""Most cached steps per pattern before the cache is cleared."""
+
+# Instruction codes
+_CHAR, _SPLIT, _JUMP, _ASSERT, _MATCH = range(5)
+
+_DIGITS = frozenset('0123456789')
+_SPACES = frozenset(' \t\n\r\f\v')
+_WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz'
+                        'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
+def _char(code):
+    """Return the character of a code, as a str if it is ASCII."""
+    return chr(code) if code < 128 else unichr(code)
+
+def _lower(code):
+    """Return the code of the lower case of a character code."""
+    return ord(_char(code).lower())
+
+def _is_nullable(items):
+    """Return True if a sequence of parsed items can match the empty string."""
+    for op, av in items:
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if av[0] > 0 and not _is_nullable(av[2]):
+                return False
+        elif op == sre_constants.SUBPATTERN:
+            if not _is_nullable(av[-1]):
+                return False
+        elif op == sre_constants.BRANCH:
+            if not any(_is_nullable(sub) for sub in av[1]):
+                return False
+        elif op != sre_constants.AT:
+            return False
+    return True
+
+def compile(pattern, flags=0):
+    """
+    Compile the pattern into a LinearPattern.  Raise re.error if the pattern
+    is invalid or uses something that cannot be matched in linear time.
+    """
+    return LinearPattern(pattern, flags)
+
+class LinearMatch(object):
+    
+    """The span of a match found by a LinearPattern."""
+    
+    __slots__ = ('string', '_start', '_end')
+    
+    def __init__(self, string, start, end):
+        self.string = string
+        self._start = start
+        self._end = end
+    
+    def start(self):
+        """Return the position of the start of the match."""
+        return self._start
+    
+    def end(self):
+        """Return the position of the end of the match."""
+        return self._end
+    
+    def span(self):
+        """Return the start and end positions of the match."""
+        return self._start, self._end
+    
+    def group(self):
+        """Return the text of the match."""
+        return self.string[self._start:self._end]
+    
+    def __repr__(self):
+        return '<LinearMatch span=%r>' % (self.span(),)
+
+class LinearPattern(object):
+    
+    """
+    A pattern compiled for linear-time matching.
+    
+    It has the pattern and flags attributes and the search and finditer
+    methods of a compiled re pattern, so it can be used in place of one.
+    
+    Usage:
+        word_re = compile('(?:\\\\S+ ?)+\\n', re.M)
+        for match in word_re.finditer(text):
+            print match.span()
+    
+    """
+    
+    def __init__(self, pattern, flags=0):
+        """Parse the pattern and compile it into an NFA program."""
+        self.pattern = pattern
+        """The pattern string."""
+        parsed = sre_parse.parse(pattern, flags)
+        self.flags = parsed.pattern.flags
+        """The flags, including any set within the pattern."""
+        if self.flags & re.L:
+            raise re.error('LOCALE flag not supported by the linear engine')
+        self._program = []
+        """The instructions of the NFA program."""
+        self._has_assertions = False
+        """Whether the program checks any positions (like ^ or \\b)."""
+        self._emit_sequence(list(parsed))
+        self._emit(_MATCH)
+        self._steps = {}
+        """Cached steps, keyed by thread set, character and context."""
+        self._start_closure = {}
+        """Cached threads of a search starting, keyed by context."""
+    
+    def __reduce__(self):
+        """Pickle as the pattern and flags, to be compiled again."""
+        return (compile, (self.pattern, self.flags))
+    
+    def __repr__(self):
+        return 'linearre.compile(%r, %r)' % (self.pattern, self.flags)
+    
+    # Compiling:
+    
+    def _emit(self, *instruction):
+        """Append an instruction to the program and return its index."""
+        if len(self._program) >= MAX_PROGRAM_SIZE:
+            raise re.error('pattern too large for the linear engine')
+        self._program.append(list(instruction))
+        return len(self._program) - 1
+    
+    def _emit_sequence(self, items):
+        """Compile a sequence of parsed items."""
+        for op, av in items:
+            self._emit_item(op, av)
+    
+    def _emit_item(self, op, av):
+        """Compile one parsed item."""
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+                  sre_constants.ANY, sre_constants.IN,
+                  sre_constants.CATEGORY):
+            self._emit(_CHAR, self._make_char_test(op, av))
+        elif op == sre_constants.AT:
+            self._has_assertions = True
+            self._emit(_ASSERT, av)
+        elif op == sre_constants.SUBPATTERN:
+            self._emit_sequence(list(av[-1]))
+        elif op == sre_constants.BRANCH:
+            self._emit_branch([list(sub) for sub in av[1]])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            min_, max_, sub = av
+            if max_ > 1 and _is_nullable(list(sub)):
+                # re's handling of empty iterations is not reproduced.
+                raise re.error('a repeat of something that can be empty is '
+                               'not supported by the linear engine')
+            self._emit_repeat(list(sub), min_, max_,
+                              op == sre_constants.MAX_REPEAT)
+        else:
+            raise re.error('%s not supported by the linear engine' % op)
+    
+    def _emit_branch(self, alternatives):
+        """Compile alternatives, preferring the earlier ones."""
+        jumps = []
+        for alternative in alternatives[:-1]:
+            split = self._emit(_SPLIT, None, None)
+            self._program[split][1] = len(self._program)
+            self._emit_sequence(alternative)
+            jumps.append(self._emit(_JUMP, None))
+            self._program[split][2] = len(self._program)
+        self._emit_sequence(alternatives[-1])
+        for jump in jumps:
+            self._program[jump][1] = len(self._program)
+    
+    def _emit_repeat(self, sub, min_, max_, greedy):
+        """
+        Compile a repeat as min_ copies of sub followed by optional copies,
+        nested so that each one is only tried after the one before it.
+        """
+        for count in range(min_):
+            self._emit_sequence(sub)
+        if max_ == sre_constants.MAXREPEAT:
+            split = self._emit(_SPLIT, None, None)
+            self._emit_sequence(sub)
+            self._emit(_JUMP, split)
+            self._set_split(split, split + 1, len(self._program), greedy)
+        else:
+            splits = []
+            for count in range(max_ - min_):
+                split = self._emit(_SPLIT, None, None)
+                splits.append(split)
+                self._emit_sequence(sub)
+            for split in splits:
+                self._set_split(split, split + 1, len(self._program), greedy)
+    
+    def _set_split(self, split, into, past, greedy):
+        """Point a split at the repeat body and past it, in greedy order."""
+        if greedy:
+            self._program[split][1:] = [into, past]
+        else:
+            self._program[split][1:] = [past, into]
+    
+    def _make_char_test(self, op, av):
+        """
+        Return a function testing whether a character matches the item.
+        With the I flag, re compares the lower case of the character with
+        the item's literals and range ends made lower case, so this does too.
+        """
+        if self.flags & re.I:
+            test = self._make_case_test(op, av, _lower)
+            return lambda char: test(char.lower())
+        return self._make_case_test(op, av, lambda code: code)
+    
+    def _make_case_test(self, op, av, fold):
+        """
+        Return a function testing a character (already folded to lower case
+        if ignoring case) against an item whose codes are folded by fold.
+        """
+        if op == sre_constants.LITERAL:
+            literal = _char(fold(av))
+            return lambda char: char == literal
+        elif op == sre_constants.NOT_LITERAL:
+            literal = _char(fold(av))
+            return lambda char: char != literal
+        elif op == sre_constants.ANY:
+            if self.flags & re.S:
+                return lambda char: True
+            return lambda char: char != '\n'
+        elif op == sre_constants.CATEGORY:
+            return self._make_category_test(av)
+        else: # sre_constants.IN
+            tests = []
+            negate = False
+            for set_op, set_av in av:
+                if set_op == sre_constants.NEGATE:
+                    negate = True
+                elif set_op == sre_constants.RANGE:
+                    tests.append(lambda char, low=fold(set_av[0]),
+                                              high=fold(set_av[1]):
+                                     low <= ord(char) <= high)
+                elif set_op in (sre_constants.LITERAL,
+                                sre_constants.CATEGORY):
+                    tests.append(self._make_case_test(set_op, set_av, fold))
+                else:
+                    raise re.error('%s not supported by the linear engine' %
+                                   set_op)
+            if negate:
+                return lambda char: not any(test(char) for test in tests)
+            return lambda char: any(test(char) for test in tests)
+    
+    def _make_category_test(self, category):
+        """Return a function testing a character for a category like \\w."""
+        if self.flags & re.U:
+            tests = {
+                'digit': lambda char: unicode(char).isdigit(),
+                'space': lambda char: unicode(char).isspace(),
+                'word': lambda char: (unicode(char).isalnum() or
+                                      char == '_'),
+                'linebreak': lambda char: char == '\n',
+                }
+        else:
+            tests = {
+                'digit': lambda char: char in _DIGITS,
+                'space': lambda char: char in _SPACES,
+                'word': lambda char: char in _WORD_CHARS,
+                'linebreak': lambda char: char == '\n',
+                }
+        name = category.replace('category_', '')
+        if name.startswith('not_'):
+            test = tests[name[4:]]
+            return lambda char: not test(char)
+        return tests[name]
+    
+    # Matching:
+    
+    def search(self, string, pos=0, endpos=None):
+        """
+        Return a LinearMatch of the leftmost match at or after pos, or None.
+        (The text beyond endpos is ignored, as by re.)
+        """
+        if endpos is not None and endpos < len(string):
+            string = string[:endpos]
+        span = self._search_span(string, max(pos, 0))
+        if span is None:
+            return None
+        return LinearMatch(string, span[0], span[1])
+    
+    def finditer(self, string, pos=0, endpos=None):
+        """Return an iterator of the non-overlapping matches, as re does."""
+        if endpos is not None and endpos < len(string):
+            string = string[:endpos]
+        end = len(string)
+        while pos <= end:
+            span = self._search_span(string, pos)
+            if span is None:
+                break
+            yield LinearMatch(string, span[0], span[1])
+            start, pos = span
+            if pos == start:
+                # After an empty match, searching resumes one character later.
+                pos += 1
+    
+    def _search_span(self, string, pos):
+        """Return the span of the leftmost match at or after pos, or None."""
+        end = len(string)
+        steps = self._steps
+        if len(steps) > MAX_CACHED_STEPS:
+            steps.clear()
+        context = self._get_context(string, pos, end)
+        threads, origins, matched = self._get_start(context)
+        starts = [pos] * len(threads)
+        match_span = (pos, pos) if matched is not None else None
+        searching = match_span is None
+        while (threads or searching) and pos < end:
+            char = string[pos]
+            pos += 1
+            context = self._get_context(string, pos, end)
+            key = (threads, char, context, searching)
+            try:
+                threads, origins, matched = steps[key]
+            except KeyError:
+                threads, origins, matched = steps[key] = \
+                    self._step(key[0], char, context, searching)
+            if matched is not None:
+                match_start = starts[matched] if matched >= 0 else pos
+                match_span = (match_start, pos)
+                searching = False
+            starts = [starts[origin] if origin >= 0 else pos
+                      for origin in origins]
+        return match_span
+    
+    def _get_context(self, string, pos, end):
+        """
+        Return what the position assertions need to know about the position:
+        whether it is at the start or end, what the characters on each side
+        are like, and whether only a final newline follows it.
+        """
+        if not self._has_assertions:
+            return None
+        before = string[pos - 1] if pos > 0 else None
+        after = string[pos] if pos < end else None
+        return (before, after, pos == end - 1 and after == '\n')
+    
+    def _get_start(self, context):
+        """
+        Return the threads, their origins and any match, of a search
+        starting at a position with the context.
+        """
+        try:
+            return self._start_closure[context]
+        except KeyError:
+            result = self._start_closure[context] = \
+                self._close([(0, -1)], context)
+            return result
+    
+    def _step(self, threads, char, context, searching):
+        """
+        Advance the threads over the character.  If still searching, a new
+        thread starts after the character, with the lowest priority.
+        Return the new threads, their origins (indices into the old threads,
+        or -1 for the new start) and the origin of any match.
+        """
+        program = self._program
+        advanced = [(pc + 1, index) for index, pc in enumerate(threads)
+                    if program[pc][1](char)]
+        if searching:
+            advanced.append((0, -1))
+        return self._close(advanced, context)
+    
+    def _close(self, entries, context):
+        """
+        Follow the splits, jumps and assertions from the entry threads, in
+        priority order, to the threads waiting on characters.  Threads of
+        lower priority than one that reaches the match are dropped.
+        Return them as (threads, origins, matched origin or None).
+        """
+        program = self._program
+        threads = []
+        origins = []
+        visited = set()
+        for entry_pc, origin in entries:
+            stack = [entry_pc]
+            while stack:
+                pc = stack.pop()
+                if pc in visited:
+                    continue
+                visited.add(pc)
+                instruction = program[pc]
+                code = instruction[0]
+                if code == _CHAR:
+                    threads.append(pc)
+                    origins.append(origin)
+                elif code == _SPLIT:
+                    stack.append(instruction[2])
+                    stack.append(instruction[1])
+                elif code == _JUMP:
+                    stack.append(instruction[1])
+                elif code == _ASSERT:
+                    if self._check(instruction[1], context):
+                        stack.append(pc + 1)
+                else: # _MATCH
+                    return tuple(threads), tuple(origins), origin
+        return tuple(threads), tuple(origins), None
+    
+    def _check(self, at_code, context):
+        """Return True if a position assertion holds in the context."""
+        before, after, before_final_newline = context
+        multiline = self.flags & re.M
+        if at_code == sre_constants.AT_BEGINNING:
+            return before is None or (multiline and before == '\n')
+        elif at_code == sre_constants.AT_BEGINNING_STRING:
+            return before is None
+        elif at_code == sre_constants.AT_END:
+            return (after is None or before_final_newline or
+                    (multiline and after == '\n'))
+        elif at_code == sre_constants.AT_END_STRING:
+            return after is None
+        elif at_code in (sre_constants.AT_BOUNDARY,
+                         sre_constants.AT_NON_BOUNDARY):
+            is_word = self._make_category_test('category_word')
+            is_boundary = (
+                (before is not None and is_word(before)) !=
+                (after is not None and is_word(after)))
+            return is_boundary == (at_code == sre_constants.AT_BOUNDARY)
+        raise re.error('%s not supported by the linear engine' % at_code)
+
+def _make_random_pattern(depth=0):
+    """Return a random pattern for the self test."""
+    import random
+    atoms = ['a', 'b', '.', '[ab]', '[^a]', '\\s', '\\w', '\\b', '^', '$',
+             '\\n', '(?:a|b)', '(?:a|)', '(?:ab|a)']
+    choice = random.random()
+    if depth > 3 or choice < 0.3:
+        return random.choice(atoms)
+    elif choice < 0.5:
+        return (_make_random_pattern(depth + 1) +
+                _make_random_pattern(depth + 1))
+    elif choice < 0.65:
+        return '(?:%s|%s)' % (_make_random_pattern(depth + 1),
+                              _make_random_pattern(depth + 1))
+    quantifier = random.choice(['*', '+', '?', '*?', '+?', '??',
+                                '{1,2}', '{0,2}?', '{2}'])
+    return '(?:%s)%s' % (_make_random_pattern(depth + 1), quantifier)
+
+def test():
+    """
+    Execute linearre.py at the command line to run this self test.
+    
+    It checks that LinearPattern finds the same matches as re for a range of
+    patterns and texts, and that it matches a pattern that makes re backtrack
+    exponentially in a time that grows linearly with the text.
+    """
+    import random
+    import time
+    patterns = [
+        ('[a-zA-Z]+|[0-9]+|[^a-zA-Z0-9]+', 0),
+        ('[-A-Za-z0-9,./?%&#:_]+', 0),
+        ('.*', 0),
+        ('^.*\\n', re.M),
+        ('[_a-zA-Z][_a-zA-Z0-9]*', 0),
+        ('(?: ^ (?:  [ \\t]*  \\S+  [ \\t]*  )  +  \\n  )+', re.M + re.X),
+        ('(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+(?:[ \\t]*\\n)?', re.M),
+        ('[_a-z][_.a-z0-9]*', re.I),
+        ('a|ab|abc', 0),
+        ('(?:a|ab)(?:c|bcd)', 0),
+        ('a*?b', 0),
+        ('a{2,3}', 0),
+        ('a{2,3}?', 0),
+        ('(?:ab){1,2}?c', 0),
+        ('x*', 0),
+        ('\\bword\\b|\\Bor', 0),
+        ('^$', re.M),
+        ('$', 0),
+        ('\\A\\w+|\\w+\\Z', 0),
+        ('[^\\s,]+', 0),
+        ('.+', re.S),
+        ('(?i)[A-C]+', 0),
+        ]
+    texts = [
+        '',
+        'a',
+        'abc abcd ab_c 12ab',
+        'word sword words or\nfor or\n',
+        'The quick brown fox.\n\n  jumps over\n\tthe lazy dog\n\n\n',
+        'aaab aab ab b xx x',
+        '\n\nx\n',
+        'a,b c\td\n',
+        'caBBa A\nCab',
+        ]
+    for pattern, flags in patterns:
+        re_pattern = re.compile(pattern, flags)
+        linear_pattern = compile(pattern, flags)
+        for text in texts:
+            expected = [m.span() for m in re_pattern.finditer(text)]
+            actual = [m.span() for m in linear_pattern.finditer(text)]
+            assert actual == expected, (pattern, text, actual, expected)
+    print('\nLinearPattern matches re for %d patterns and %d texts.' %
+          (len(patterns), len(texts)))
+    
+    random.seed(0)
+    count = 0
+    while count < 500:
+        pattern = _make_random_pattern()
+        flags = random.choice([0, re.I, re.M, re.S])
+        try:
+            linear_pattern = compile(pattern, flags)
+        except re.error:
+            continue
+        re_pattern = re.compile(pattern, flags)
+        for repeat in range(5):
+            text = ''.join(random.choice('ab A\n')
+                           for i in range(random.randint(0, 12)))
+            expected = [m.span() for m in re_pattern.finditer(text)]
+            actual = [m.span() for m in linear_pattern.finditer(text)]
+            assert actual == expected, (pattern, text, actual, expected)
+        count += 1
+    print('LinearPattern matches re for %d random patterns.' % count)
+    
+    for pattern in ('(a)\\1', '(?=a)', '(?<!a)b', '(a)?(?(1)b|c)',
+                    '(a*)*b', '(a|b|)+'):
+        try:
+            compile(pattern)
+        except re.error:
+            pass
+        else:
+            raise AssertionError('%r should not compile' % pattern)
+    print('Patterns that need backtracking are refused.')
+    
+    paragraph = '(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+(?:[ \\t]*\\n)?'
+    linear_pattern = compile(paragraph, re.M)
+    for length in (1000, 10000, 100000):
+        text = 'a ' * (length // 2)
+        start = time.time()
+        list(linear_pattern.finditer(text))
+        print('Paragraph+ on %6d characters without a newline: %8.2f ms' %
+              (length, (time.time() - start) * 1000))
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,415 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module converts between character offsets and lines without
+gtk.TextIters.
+
+Classes:
+LineIndex     -- the start and end offsets of each line of a text
+DocumentLines -- keeps a LineIndex of a gedit document through edits
+
+Lines end where GTK ends them: at \\n, \\r\\n, \\r or a Unicode paragraph
+separator.  Finding the line of an offset is a binary search of the line
+starts.  An edit does not scan the text again, or rewrite the offsets of all
+of the lines after it: the index keeps one pending shift of the lines after
+a line, which lookups add, and an edit only moves that line to its own
+(rewriting the offsets of the lines between) and adds to the shift.  So the
+edits of typing cost about the same in a long text as in a short one.
+
+If NumPy is installed, the line ends are found by comparing the encoded
+text as an array of code units, the offsets are kept in int64 arrays, and
+lines are found with searchsorted.  Otherwise the offsets are kept in
+array.array('l') arrays and lines are found with bisect.
+
+LineIndex does not depend on gedit or GTK, so this module can be run at
+the command line for its self test and timing:
+    python lines.py
+
+"""
+
+import array
+import bisect
+import re
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_LINE_END_RE = re.compile(u'\r\n|\n|\r|\u2029')
+"""Matches the line ends GTK ends lines at."""
+
+if sys.maxunicode > 0xffff:
+    _ENCODING, _CODE_UNIT = 'utf-32-le', '<u4'
+else:
+    _ENCODING, _CODE_UNIT = 'utf-16-le', '<u2'
+"""The encoding whose code units are the characters of a unicode string."""
+
+class LineIndex(object):
+    
+    """
+    The start and end offsets of each line of a text.
+    
+    Usage:
+        index = LineIndex(text)
+        line = index.get_line(offset)
+        start, end = index.get_line_bounds(line)
+        index.replace(start, end, text) # as the text is edited
+    
+    The end of a line is the offset of its line end (or of the end of the
+    text), so text[start:end] is the line without its line end.
+    
+    """
+    
+    def __init__(self, text, use_numpy=True):
+        """Find the lines of the text (a unicode string)."""
+        self.use_numpy = bool(use_numpy and numpy)
+        """Whether the offsets are kept in NumPy arrays."""
+        if self.use_numpy:
+            ends, starts = _find_line_ends_with_numpy(text)
+        else:
+            ends, starts = _find_line_ends(text)
+        self._starts = starts
+        """The offset of the start of each line."""
+        self._ends = ends
+        """The offset of the end of each line, before its line end."""
+        self._shift_line = 0
+        """
+        The line after which the starts (and from which the ends) are short
+        of their offsets by _shift.
+        """
+        self._shift = 0
+        """The shift pending for the offsets after _shift_line."""
+    
+    def __len__(self):
+        """Return the number of lines."""
+        return len(self._starts)
+    
+    def get_size(self):
+        """Return the bytes taken by the offsets."""
+        if self.use_numpy:
+            return self._starts.nbytes + self._ends.nbytes
+        return (len(self._starts) + len(self._ends)) * self._starts.itemsize
+    
+    def get_line(self, offset):
+        """Return the line that holds offset."""
+        starts = self._starts
+        after = self._shift_line + 1
+        if after < len(starts) and offset >= starts[after] + self._shift:
+            # The line is one of those shifted.
+            offset -= self._shift
+            if self.use_numpy:
+                return after + int(starts[after:].searchsorted(offset,
+                                                               'right')) - 1
+            return bisect.bisect_right(starts, offset, after) - 1
+        if self.use_numpy:
+            return int(starts[:after].searchsorted(offset, 'right')) - 1
+        return bisect.bisect_right(starts, offset, 0, after) - 1
+    
+    def get_line_bounds(self, line):
+        """Return the offsets of the start and end of the line."""
+        start = int(self._starts[line])
+        end = int(self._ends[line])
+        if line >= self._shift_line:
+            end += self._shift
+            if line > self._shift_line:
+                start += self._shift
+        return start, end
+    
+    def get_offsets(self):
+        """
+        Return the arrays of the start and the end offsets of the lines, as
+        they are until the next edit.
+        """
+        self._move_shift(len(self._starts) - 1)
+        # Only the end of the last line is left to shift.
+        self._ends[-1] += self._shift
+        self._shift = 0
+        return self._starts, self._ends
+    
+    def replace(self, start, end, text):
+        """
+        Follow the replacement of the characters from offset start to offset
+        end with text, neither of which may hold or touch a \\r.
+        """
+        first = self.get_line(start)
+        last = self.get_line(end)
+        self._move_shift(first)
+        starts = self._starts
+        ends = self._ends
+        line_count = len(starts)
+        if first == last and not _LINE_END_RE.search(text):
+            # An edit within a line only shifts the lines after it.
+            pass
+        elif self.use_numpy:
+            new_ends, new_starts = _find_line_ends_with_numpy(text)
+            if len(new_ends) - 1 == last - first:
+                starts[first + 1:last + 1] = new_starts[1:] + start
+                ends[first:last] = new_ends[:-1] + start
+            else:
+                self._starts = numpy.concatenate((starts[:first + 1],
+                                                  new_starts[1:] + start,
+                                                  starts[last + 1:]))
+                self._ends = numpy.concatenate((ends[:first],
+                                                new_ends[:-1] + start,
+                                                ends[last:]))
+        else:
+            new_ends, new_starts = _find_line_ends(text)
+            starts[first + 1:last + 1] = array.array('l', [
+                offset + start for offset in new_starts[1:]])
+            ends[first:last] = array.array('l', [
+                offset + start for offset in new_ends[:-1]])
+        # The lines after those of the text are shifted by the edit.
+        self._shift_line = last + len(self._starts) - line_count
+        self._shift += len(text) - (end - start)
+    
+    def _move_shift(self, line):
+        """
+        Move the pending shift to the lines after line, by applying it to
+        (or taking it from) the offsets of the lines between.
+        """
+        old_line = self._shift_line
+        shift = self._shift
+        if line == old_line or not shift:
+            self._shift_line = line
+            return
+        if line > old_line:
+            low, high = old_line, line
+        else:
+            low, high, shift = line, old_line, -shift
+        starts = self._starts
+        ends = self._ends
+        if self.use_numpy:
+            starts[low + 1:high + 1] += shift
+            ends[low:high] += shift
+        else:
+            for index in xrange(low + 1, high + 1):
+                starts[index] += shift
+            for index in xrange(low, high):
+                ends[index] += shift
+        self._shift_line = line
+
+def _find_line_ends(text):
+    """Return arrays of the end and the start offsets of the text's lines."""
+    ends = array.array('l')
+    starts = array.array('l', [0])
+    for match in _LINE_END_RE.finditer(text):
+        ends.append(match.start())
+        starts.append(match.end())
+    ends.append(len(text))
+    return ends, starts
+
+def _find_line_ends_with_numpy(text):
+    """
+    Return int64 arrays of the end and the start offsets of the text's
+    lines, found with NumPy.
+    """
+    units = numpy.frombuffer(text.encode(_ENCODING), _CODE_UNIT)
+    newline = units == 10
+    carriage_return = units == 13
+    separator = units == 0x2029
+    after_carriage_return = numpy.zeros_like(newline)
+    after_carriage_return[1:] = carriage_return[:-1]
+    before_newline = numpy.zeros_like(newline)
+    before_newline[:-1] = newline[1:]
+    # A \r\n ends its line at the \r and starts the next after the \n.
+    ends = numpy.flatnonzero((newline & ~after_carriage_return) |
+                             carriage_return | separator)
+    starts = numpy.flatnonzero(newline | separator |
+                               (carriage_return & ~before_newline)) + 1
+    return (numpy.append(ends, len(text)).astype(numpy.int64),
+            numpy.insert(starts, 0, 0).astype(numpy.int64))
+
+class DocumentLines(object):
+    
+    """
+    Keeps a LineIndex of a document (a gtk.TextBuffer), building it when
+    first needed and shifting it through edits.
+    
+    Usage:
+        lines = DocumentLines(doc, snapshots)
+        line = lines.get_line(offset)
+        start, end = lines.get_line_bounds(line)
+        ...
+        lines.disconnect()
+    
+    """
+    
+    def __init__(self, doc, snapshots):
+        """
+        Watch the document for changes, and take its text from snapshots (the
+        plugin's TextSnapshots) when the index is built.
+        """
+        self.doc = doc
+        """The document whose lines are indexed."""
+        self.snapshots = snapshots
+        """The TextSnapshots the document's text is taken from."""
+        self._index = None
+        """The LineIndex of the document (None until needed)."""
+        self._handler_ids = [
+            doc.connect('insert-text', self._on_insert_text),
+            doc.connect('delete-range', self._on_delete_range),
+            doc.connect('changed', self._on_changed),
+            ]
+        """Handlers of the document's signals."""
+    
+    def get_line(self, offset):
+        """Return the line that holds offset."""
+        return self._get_index().get_line(offset)
+    
+    def get_line_bounds(self, line):
+        """Return the offsets of the start and end of the line."""
+        return self._get_index().get_line_bounds(line)
+    
+    def get_offsets(self):
+        """
+        Return the arrays of the start and the end offsets of the lines, as
+        they are until the next edit.
+        """
+        return self._get_index().get_offsets()
+    
+    def get_size(self):
+        """Return the bytes taken by the index (0 if it is not built)."""
+        return self._index.get_size() if self._index else 0
+    
+    def is_built(self):
+        """Return whether the index is built, so using it needs no scan."""
+        return self._index is not None
+    
+    def disconnect(self):
+        """Stop watching the document."""
+        for handler_id in self._handler_ids:
+            if self.doc.handler_is_connected(handler_id):
+                self.doc.disconnect(handler_id)
+        self._handler_ids = []
+        self._index = None
+    
+    def _get_index(self):
+        """Return the LineIndex, building it if needed."""
+        if self._index is None:
+            self._index = LineIndex(self.snapshots.get_text(self.doc))
+        return self._index
+    
+    def _on_insert_text(self, doc, location, text, length):
+        """Shift the index, before text is inserted."""
+        if self._index:
+            self._replace(location, location, text)
+    
+    def _on_delete_range(self, doc, start_iter, end_iter):
+        """Shift the index, before text is deleted."""
+        if self._index:
+            self._replace(start_iter, end_iter, '')
+    
+    def _replace(self, start_iter, end_iter, text):
+        """
+        Shift the index for the replacement of the text between the iters,
+        or drop it if the edit could join or split a \\r\\n.
+        """
+        before_iter = start_iter.copy()
+        before_iter.backward_char()
+        after_iter = end_iter.copy()
+        after_iter.forward_char()
+        if '\r' in before_iter.get_slice(after_iter) or '\r' in text:
+            self._index = None
+            return
+        self._index.replace(start_iter.get_offset(), end_iter.get_offset(),
+                            text.decode('utf-8'))
+    
+    def _on_changed(self, doc):
+        """Drop the index if it has lost track of the lines."""
+        if self._index and len(self._index) != doc.get_line_count():
+            self._index = None
+
+def test():
+    """
+    Execute lines.py at the command line to run this self test.
+    
+    It checks the lines found, with and without NumPy, against the lines
+    the text splits into, through random edits, and times building an index,
+    finding lines and following edits in a long text.
+    """
+    import random
+    import time
+    random.seed(47)
+    kinds = [False] + [True] * bool(numpy)
+    for count in range(2000):
+        text = u''.join(random.choice(u'ab\n\r é') for i in range(30))
+        for use_numpy in kinds:
+            index = LineIndex(text, use_numpy)
+            for edit in range(8):
+                _check_lines(index, text)
+                if random.random() < 0.2:
+                    starts, ends = index.get_offsets()
+                    assert [index.get_line_bounds(line)
+                            for line in range(len(index))] == \
+                        zip(starts.tolist(), ends.tolist())
+                start = random.randint(0, len(text))
+                end = random.randint(start, min(start + 5, len(text)))
+                inserted = u''.join(random.choice(u'ab\n é')
+                                    for i in range(random.randint(0, 3)))
+                if u'\r' in text[max(start - 1, 0):end + 1]:
+                    # DocumentLines rebuilds the index for these.
+                    break
+                index.replace(start, end, inserted)
+                text = text[:start] + inserted + text[end:]
+    print('LineIndex finds the lines of the text through edits%s.' %
+          (' (with and without NumPy)' if numpy else ' (without NumPy)'))
+    
+    text = (u'    word word word word word word word word\n' * 25000)
+    for use_numpy in kinds:
+        start = time.time()
+        index = LineIndex(text, use_numpy)
+        build_time = time.time() - start
+        offsets = [random.randint(0, len(text)) for i in range(10000)]
+        start = time.time()
+        for offset in offsets:
+            index.get_line_bounds(index.get_line(offset))
+        find_time = (time.time() - start) / len(offsets)
+        start = time.time()
+        for offset in range(500000, 500100):
+            index.replace(offset, offset, u'x')
+        type_time = (time.time() - start) / 100
+        start = time.time()
+        index.replace(500100, 500100, u'\n')
+        replace_time = time.time() - start
+        print('%s, text of %d characters:' %
+              ('NumPy' if use_numpy else 'array and bisect', len(text)))
+        print('    building the index:   %7.2f ms' % (build_time * 1000))
+        print('    finding a line:       %7.4f ms' % (find_time * 1000))
+        print('    typing a character:   %7.4f ms' % (type_time * 1000))
+        print('    adding a line:        %7.2f ms' % (replace_time * 1000))
+
+def _check_lines(index, text):
+    """Check that the index has the lines of the text."""
+    starts, ends = [0], []
+    for match in _LINE_END_RE.finditer(text):
+        ends.append(match.start())
+        starts.append(match.end())
+    ends.append(len(text))
+    assert len(index) == len(starts), (text, len(index))
+    for line in range(len(starts)):
+        assert index.get_line_bounds(line) == (starts[line], ends[line]), \
+            (text, line, index.get_line_bounds(line))
+    for offset in range(len(text) + 1):
+        line = bisect.bisect_right(starts, offset) - 1
+        assert index.get_line(offset) == line, (text, offset)
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,268 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module keeps every match of a regex in a text, for moving between the
+matches and highlighting them.
+
+Classes:
+MatchIndex -- the start and end offsets of all of a regex's matches
+
+A click only needs the match or gap around one position, so its boundaries
+do not tell matches from gaps.  A MatchIndex keeps the matches alone, in
+two sorted arrays, so the match after or before a position, and the matches
+within a range such as the visible part of a view, are found with binary
+searches however many matches there are.
+
+As for click selections, a MULTILINE regex is matched in the whole text and
+any other regex in each line, whose offsets are taken from the arrays of a
+lines.LineIndex.  Empty matches are left out, since there is nothing in them
+to select or highlight.  The matches can be found a time slice at a time, so
+that highlighting them does not hold up the window.
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its self test and timing:
+    python matches.py
+
+"""
+
+import array
+import bisect
+import itertools
+import time
+
+_SCAN_STEP = 1024
+"""Lines (or matches in the whole text) looked through in each step."""
+
+class MatchIndex(object):
+    
+    """
+    The start and end offsets of all of a regex's matches in a text.
+    
+    Usage:
+        index = MatchIndex(text, word_re, line_offsets)
+        start, end = index.find_next(offset)
+        start, end = index.find_previous(offset)
+        for start, end in index.find_in_range(range_start, range_end):
+            ...
+    
+    To find the matches a time slice at a time:
+        index = MatchIndex(text, word_re, line_offsets, time_limit)
+        while not index.scan(time_limit):
+            ...
+    
+    """
+    
+    def __init__(self, text, word_re, line_offsets=None, time_limit=None):
+        """
+        Find the matches of word_re in text (a unicode string), in each line
+        of line_offsets (arrays of the start and the end offsets of the
+        text's lines) if they are given, or else in the whole text.  With a
+        time_limit (in seconds), find those found in about that time,
+        leaving the rest to scan.
+        """
+        self._starts = array.array('l')
+        """The start offset of each match."""
+        self._ends = array.array('l')
+        """The end offset of each match."""
+        self._scanning = self._scan(text, word_re, line_offsets)
+        """The steps of the scan that finds the matches (None once done)."""
+        self.scan(time_limit)
+    
+    def __len__(self):
+        """Return the number of matches (found so far)."""
+        return len(self._starts)
+    
+    def scan(self, time_limit=None):
+        """
+        Go on finding the matches for one step, and then until time_limit
+        seconds have passed (or to the end, without one).  Return whether
+        all of the matches have been found.
+        """
+        if self._scanning:
+            if time_limit is not None:
+                stop_time = time.time() + time_limit
+            for step in self._scanning:
+                if time_limit is not None and time.time() >= stop_time:
+                    return False
+            self._scanning = None
+        return True
+    
+    def is_built(self):
+        """Return whether all of the matches have been found."""
+        return self._scanning is None
+    
+    def get_size(self):
+        """Return the bytes taken by the offsets."""
+        return (len(self._starts) + len(self._ends)) * self._starts.itemsize
+    
+    def find_next(self, offset):
+        """
+        Return the start and end of the first match that starts at or after
+        offset, or of the first match if there is none, or None if there are
+        no matches.
+        """
+        if self._scanning:
+            self.scan()
+        if not self._starts:
+            return None
+        index = bisect.bisect_left(self._starts, offset)
+        if index == len(self._starts):
+            index = 0
+        return self._starts[index], self._ends[index]
+    
+    def find_previous(self, offset):
+        """
+        Return the start and end of the last match that starts before
+        offset, or of the last match if there is none, or None if there are
+        no matches.
+        """
+        if self._scanning:
+            self.scan()
+        if not self._starts:
+            return None
+        index = bisect.bisect_left(self._starts, offset) - 1
+        return self._starts[index], self._ends[index]
+    
+    def find_in_range(self, range_start, range_end):
+        """
+        Return the starts and ends of the matches that overlap the range
+        from range_start to range_end.
+        """
+        if self._scanning:
+            self.scan()
+        # The matches do not overlap, so their ends are sorted as well.
+        first = bisect.bisect_right(self._ends, range_start)
+        last = bisect.bisect_left(self._starts, range_end)
+        return zip(self._starts[first:last], self._ends[first:last])
+    
+    def _scan(self, text, word_re, line_offsets):
+        """Find the matches, yielding between steps."""
+        starts = self._starts
+        ends = self._ends
+        if line_offsets is None:
+            matches = word_re.finditer(text)
+            found = True
+            while found:
+                found = False
+                for match in itertools.islice(matches, _SCAN_STEP):
+                    found = True
+                    start, end = match.span()
+                    if start != end:
+                        starts.append(start)
+                        ends.append(end)
+                yield
+            return
+        line_starts, line_ends = line_offsets
+        finditer = word_re.finditer
+        for first in xrange(0, len(line_starts), _SCAN_STEP):
+            if first:
+                yield
+            last = first + _SCAN_STEP
+            for line_start, line_end in zip(line_starts[first:last].tolist(),
+                                            line_ends[first:last].tolist()):
+                for match in finditer(text[line_start:line_end]):
+                    start, end = match.span()
+                    if start != end:
+                        starts.append(line_start + start)
+                        ends.append(line_start + end)
+
+def test():
+    """
+    Execute matches.py at the command line to run this self test.
+    
+    It checks the matches found and the moves between them against a plain
+    list of the matches, checks an index built a step at a time, and times
+    building an index of a million matches, moving to the next match and
+    finding the matches of a screenful.
+    """
+    import random
+    import re
+    import time
+    random.seed(49)
+    word_re = re.compile(u'[a-z]+')
+    line_re = re.compile(u'^b.*$', re.M)
+    for count in range(300):
+        text = u''.join(random.choice(u'ab \n') for i in range(40))
+        line_offsets = array.array('l'), array.array('l')
+        line_start = 0
+        for line in text.split(u'\n'):
+            line_offsets[0].append(line_start)
+            line_offsets[1].append(line_start + len(line))
+            line_start += len(line) + 1
+        for regex, offsets in ((word_re, line_offsets), (line_re, None)):
+            index = MatchIndex(text, regex, offsets)
+            spans = [match.span() for match in regex.finditer(text)
+                     if match.start() != match.end()]
+            assert len(index) == len(spans), (text, regex.pattern)
+            for offset in range(len(text) + 1):
+                after = [span for span in spans if span[0] >= offset]
+                before = [span for span in spans if span[0] < offset]
+                assert index.find_next(offset) == (
+                    (after or spans or [None])[0]), (text, offset)
+                assert index.find_previous(offset) == (
+                    (before or spans or [None])[-1]), (text, offset)
+                for end in range(offset, len(text) + 1):
+                    assert index.find_in_range(offset, end) == [
+                        span for span in spans
+                        if span[1] > offset and span[0] < end], \
+                        (text, offset, end)
+    print('MatchIndex finds the matches and moves between them.')
+    
+    text = u'word ' * 1000000
+    start = time.time()
+    index = MatchIndex(text, word_re)
+    build_time = time.time() - start
+    lines_text = u'word word word\n' * 100000
+    line_offsets = (array.array('l', xrange(0, len(lines_text), 15)),
+                    array.array('l', xrange(14, len(lines_text), 15)))
+    for offsets in (None, line_offsets):
+        stepped = MatchIndex(lines_text, word_re, offsets, 0)
+        steps = 1
+        longest_step = 0
+        while not stepped.is_built():
+            step_start = time.time()
+            stepped.scan(0)
+            longest_step = max(longest_step, time.time() - step_start)
+            steps += 1
+        assert steps > 1
+        assert stepped.find_in_range(0, len(lines_text)) == \
+            MatchIndex(lines_text, word_re).find_in_range(0, len(lines_text))
+    print('An index built a step at a time finds the same matches.')
+    offsets = [random.randint(0, len(text)) for i in range(10000)]
+    start = time.time()
+    for offset in offsets:
+        index.find_next(offset)
+    next_time = (time.time() - start) / len(offsets)
+    start = time.time()
+    for offset in offsets:
+        index.find_in_range(offset, offset + 4000)
+    range_time = (time.time() - start) / len(offsets)
+    print('%d matches, taking %.1f MB:' %
+          (len(index), index.get_size() / (1024.0 * 1024)))
+    print('    building the index:              %8.2f ms' %
+          (build_time * 1000))
+    print('    finding the next match:          %8.4f ms' %
+          (next_time * 1000))
+    print('    finding the matches of a screen: %8.4f ms' %
+          (range_time * 1000))
+    print('    the longest step of a build:     %8.4f ms' %
+          (longest_step * 1000))
+
+if __name__ == '__main__':
+    test()
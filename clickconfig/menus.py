@@ -0,0 +1,170 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module adds the category submenus of the Click Config menu, which are
+filled with their SelectionOps' menu items only when first opened.
+
+Classes:
+CategoryMenus -- submenus of a gtk.UIManager menu, filled on first opening
+
+A large SelectionOp library would otherwise be realised as menu items in
+every window up front.  Each category's submenu starts empty, so its action
+is told not to be hidden for being empty (GtkUIManager hides empty menus by
+default, and a hidden submenu could never be opened to be filled).  Until it
+is filled, GtkUIManager shows an insensitive "Empty" item in it.
+
+This module does not depend on gedit, so it can be run at the command line
+(with PyGTK) for its self test:
+    python menus.py
+
+"""
+
+import gtk
+
+class CategoryMenus(object):
+    
+    """
+    Submenus of a gtk.UIManager menu, one for each category, each filled
+    with its items when it is first opened.
+    
+    Usage:
+        menus = CategoryMenus(manager, action_group, ui_template, get_entry)
+        menus_ui = menus.add(names_by_category)
+        # Include menus_ui in the menu's own UI definition.
+        ...
+        menus.remove()
+    
+    """
+    
+    def __init__(self, manager, action_group, ui_template, get_entry):
+        """
+        Prepare to add submenus to the menu of manager (a gtk.UIManager)
+        that ui_template describes: a UI definition with a %s where the
+        submenus go.  Their actions, and those of their items, are added to
+        action_group, and get_entry(name) returns the ActionGroup entry of
+        the item of that name.
+        """
+        self.manager = manager
+        """The gtk.UIManager the menu belongs to."""
+        self.action_group = action_group
+        """The gtk.ActionGroup the actions are added to."""
+        self.ui_template = ui_template
+        """The UI definition of the menu, with a %s for the submenus."""
+        self.get_entry = get_entry
+        """Returns the ActionGroup entry of the item of a name."""
+        self._names = {}
+        """Item names of each submenu not yet filled, by action name."""
+        self._ui_ids = []
+        """The UI identities of filled submenus, saved for removal."""
+    
+    def add(self, names_by_category):
+        """
+        Add an action for the submenu of each category, whose items are
+        the names in names_by_category, and return the UI definition of the
+        submenus to include in the menu's.
+        """
+        menus_ui = ''
+        for index, category in enumerate(sorted(names_by_category)):
+            name = 'ClickConfigCategory%d' % index
+            self._names[name] = names_by_category[category]
+            action = gtk.Action(name, category, None, None)
+            # The submenu is empty until it is opened.
+            action.set_property('hide-if-empty', False)
+            action.connect('activate', self.on_activate)
+            self.action_group.add_action(action)
+            menus_ui += '\n' + ' ' * 22 + '<menu action="%s"/>' % name
+        return menus_ui
+    
+    def remove(self):
+        """Remove the items of the filled submenus."""
+        for ui_id in self._ui_ids:
+            self.manager.remove_ui(ui_id)
+        self._ui_ids = []
+        self._names = {}
+    
+    def on_activate(self, action):
+        """Fill a submenu with its items when it is opened."""
+        name = action.get_name()
+        item_names = self._names.pop(name, None)
+        if item_names is None:
+            # Already filled.
+            return
+        self.action_group.add_actions(
+            [self.get_entry(item_name) for item_name in item_names])
+        menuitems = ''.join('<menuitem action="%s"/>' % item_name
+                            for item_name in item_names)
+        menu_ui = '<menu action="%s">%s</menu>' % (name, menuitems)
+        self._ui_ids.append(
+            self.manager.add_ui_from_string(self.ui_template % menu_ui))
+        self.manager.ensure_update()
+
+def test():
+    """
+    Execute menus.py at the command line to run this self test.
+    
+    It checks that the submenus are shown while they are empty, and that
+    opening one fills it with its items.
+    """
+    manager = gtk.UIManager()
+    action_group = gtk.ActionGroup('TestActions')
+    action_group.add_actions([('Top', None, 'Top')])
+    manager.insert_action_group(action_group, -1)
+    ui_template = """
+        <ui>
+          <menubar name="MenuBar">
+            <menu action="Top">%s</menu>
+          </menubar>
+        </ui>
+        """
+    activated = []
+    def get_entry(name):
+        return (name, None, name, '', '',
+                lambda action: activated.append(action.get_name()))
+    menus = CategoryMenus(manager, action_group, ui_template, get_entry)
+    menus_ui = menus.add({'Words': ['Word', 'Name'], 'Lines': ['Line']})
+    ui_id = manager.add_ui_from_string(ui_template % menus_ui)
+    manager.ensure_update()
+    # Sorted by category, 'Lines' is ClickConfigCategory0.
+    lines_path = '/MenuBar/Top/ClickConfigCategory0'
+    words_path = '/MenuBar/Top/ClickConfigCategory1'
+    for path in (lines_path, words_path):
+        assert manager.get_widget(path).get_property('visible'), \
+            'An empty category submenu is hidden: %s' % path
+    assert manager.get_widget(words_path + '/Word') is None
+    
+    manager.get_widget(words_path).activate()
+    manager.ensure_update()
+    for name in ('Word', 'Name'):
+        menuitem = manager.get_widget(words_path + '/' + name)
+        assert menuitem is not None, 'Item %s was not added' % name
+        assert menuitem.get_property('visible')
+    assert manager.get_widget(lines_path + '/Line') is None
+    manager.get_widget(words_path + '/Name').activate()
+    assert activated == ['Name'], activated
+    
+    # Opening a filled submenu again adds nothing more.
+    manager.get_widget(words_path).activate()
+    assert len(menus._ui_ids) == 1
+    menus.remove()
+    manager.remove_ui(ui_id)
+    manager.ensure_update()
+    print('Category submenus are shown empty and filled when opened.')
+
+if __name__ == '__main__':
+    test()
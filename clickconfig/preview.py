@@ -0,0 +1,190 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module underlines the selection a click would make under the pointer.
+
+Classes:
+HoverPreview -- underlines the span a click at the pointer would select
+
+Motion events only note the pointer's position.  At most once per frame,
+the span under the pointer is found and the underline is moved to it, which
+touches the document's tags only when the span has changed.  The span is
+found by a function of the window helper that uses only what is already
+at hand (retained boundaries, built indexes and the document's text
+snapshot), so a frame never scans the whole document.
+
+Each frame is timed against a budget.  A frame over the budget is counted,
+and the work that took too long is not tried again until the document
+changes, so where the preview cannot keep up, it stops rather than making
+the pointer lag.
+
+"""
+
+import time
+
+import gobject
+import pango
+
+PREVIEW_TAG_NAME = 'click-config-preview'
+"""Name of the tag that underlines the preview in a document."""
+
+MAX_OVER_BUDGET_KEYS = 64
+"""Number of over-budget keys kept before they are all forgotten."""
+
+class HoverPreview(object):
+    
+    """
+    Underlines the span a click at the pointer would select.
+    
+    Usage:
+        hover_preview = HoverPreview(get_finder, frame_time, time_budget)
+        view.connect('motion_notify_event', hover_preview.on_motion)
+        view.connect('leave_notify_event', hover_preview.on_leave)
+        ...
+        hover_preview.clear() # when a click selects, or to stop
+        stats = hover_preview.get_stats()
+    
+    """
+    
+    def __init__(self, get_finder, frame_time, time_budget):
+        """
+        Prepare to update the underline at most every frame_time
+        milliseconds, each time within time_budget milliseconds.
+        
+        get_finder(view, window_type, x, y, event_time) is called for the
+        pointer's last position, and returns None if nothing is to be
+        previewed there, or else a key that identifies the work of finding
+        the span (such as the document, its change count and the op) and a
+        function that finds the span, returning its start and end offsets
+        or None.
+        """
+        self.get_finder = get_finder
+        """Returns the key and the span finding function for a position."""
+        self.frame_time = frame_time
+        """Milliseconds between updates of the underline."""
+        self.time_budget = time_budget
+        """Milliseconds an update may take."""
+        self._pointer = None
+        """View, window type, position and time of the pointer's motion."""
+        self._frame_id = None
+        """Source id of the timeout for the next update."""
+        self._shown = None
+        """The document, start and end offsets of the underlined span."""
+        self._changed_handler_id = None
+        """Handler of the 'changed' signal of the underlined document."""
+        self._over_budget_keys = set()
+        """Keys of the work that has taken longer than the budget."""
+        self._frame_count = 0
+        """The number of updates timed."""
+        self._total_time = 0.0
+        """Milliseconds taken by all the updates."""
+        self._max_time = 0.0
+        """Milliseconds taken by the longest update."""
+        self._overrun_count = 0
+        """The number of updates that took longer than the budget."""
+    
+    def on_motion(self, view, event):
+        """
+        Note the pointer's position, for the underline to be updated in the
+        next frame.
+        """
+        # (This is not logged, since it runs for every motion of the pointer.)
+        self._pointer = (view, view.get_window_type(event.window),
+                         event.x, event.y, event.time)
+        if not self._frame_id:
+            self._frame_id = gobject.timeout_add(self.frame_time,
+                                                 self._on_frame)
+        return False
+    
+    def on_leave(self, view, event):
+        """Remove the underline when the pointer leaves the view."""
+        self.clear()
+        return False
+    
+    def clear(self):
+        """Cancel any pending update and remove the underline."""
+        if self._frame_id:
+            gobject.source_remove(self._frame_id)
+            self._frame_id = None
+        self._pointer = None
+        self._remove()
+    
+    def get_stats(self):
+        """Return a report of the updates' times, as text."""
+        if not self._frame_count:
+            return 'Hover preview: no updates.'
+        return ('Hover preview: %d updates, %.2f ms on average, %.2f ms at '
+                'most, %d over the %d ms budget.' %
+                (self._frame_count, self._total_time / self._frame_count,
+                 self._max_time, self._overrun_count, self.time_budget))
+    
+    def _on_frame(self):
+        """Underline the span at the pointer's last position."""
+        self._frame_id = None
+        view, window_type, pointer_x, pointer_y, event_time = self._pointer
+        start_time = time.time()
+        finder = self.get_finder(view, window_type, pointer_x, pointer_y,
+                                 event_time)
+        span = None
+        if finder and finder[0] not in self._over_budget_keys:
+            span = finder[1]()
+        self._show(view.get_buffer(), span)
+        elapsed = (time.time() - start_time) * 1000
+        self._frame_count += 1
+        self._total_time += elapsed
+        self._max_time = max(self._max_time, elapsed)
+        if elapsed > self.time_budget:
+            self._overrun_count += 1
+            if finder:
+                if len(self._over_budget_keys) >= MAX_OVER_BUDGET_KEYS:
+                    self._over_budget_keys.clear()
+                self._over_budget_keys.add(finder[0])
+        return False
+    
+    def _show(self, doc, span):
+        """Underline the span of the document, or nothing if span is None."""
+        shown = span and (doc, span[0], span[1])
+        if shown == self._shown:
+            return
+        self._remove()
+        if not shown:
+            return
+        tag = doc.get_tag_table().lookup(PREVIEW_TAG_NAME)
+        if tag is None:
+            tag = doc.create_tag(PREVIEW_TAG_NAME,
+                                 underline=pango.UNDERLINE_SINGLE)
+        doc.apply_tag(tag, doc.get_iter_at_offset(span[0]),
+                      doc.get_iter_at_offset(span[1]))
+        self._changed_handler_id = doc.connect('changed', self._on_changed)
+        self._shown = shown
+    
+    def _remove(self):
+        """Remove the underline, if there is one."""
+        if not self._shown:
+            return
+        doc = self._shown[0]
+        if doc.handler_is_connected(self._changed_handler_id):
+            doc.disconnect(self._changed_handler_id)
+        doc.remove_tag_by_name(PREVIEW_TAG_NAME, *doc.get_bounds())
+        self._changed_handler_id = None
+        self._shown = None
+    
+    def _on_changed(self, doc):
+        """Remove the underline when the document is edited."""
+        self._remove()
@@ -0,0 +1,259 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module looks for regular expression structures that can make matching
+take exponential (or high polynomial) time by backtracking.
+
+Functions:
+find_hazards    -- the risky repeats in a pattern, found by parsing it
+make_test_texts -- texts meant to make a risky pattern backtrack
+
+Two structures are looked for in the parsed pattern:
+ - a variable repeat inside another repeat, where the inner repeat can take
+   the characters that the next iteration of the outer repeat starts with,
+   as in (a+)+ or (?:\\S+ ?)+, and
+ - two adjacent variable repeats of single characters that can take the
+   same characters, as in \\s*\\s*.
+Either way, a run of those characters can be divided between the repeats in
+many ways, and a failing match tries all of them.
+
+Only characters up to 127 are considered, so the analysis is approximate.
+Measuring the time of the pattern against make_test_texts texts (with a
+worker.MatchTimer) checks what the analysis suggests.
+
+This module does not depend on gedit or GTK, so it can be run at the command
+line for its self test:
+    python regexcheck.py
+
+"""
+
+import re
+import sre_constants
+import sre_parse
+
+_ALPHABET = range(128)
+"""The character codes considered in the analysis."""
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_ZERO_WIDTH = (sre_constants.AT, sre_constants.ASSERT,
+               sre_constants.ASSERT_NOT)
+_SINGLE_CHARS = (sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+                 sre_constants.ANY, sre_constants.IN, sre_constants.CATEGORY)
+
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: lambda c: chr(c).isdigit(),
+    sre_constants.CATEGORY_SPACE: lambda c: chr(c) in ' \t\n\r\f\v',
+    sre_constants.CATEGORY_WORD: lambda c: chr(c).isalnum() or c == 95,
+    sre_constants.CATEGORY_LINEBREAK: lambda c: c == 10,
+    }
+"""Character tests of the categories, for their NOT_ versions too."""
+for _name, _test in _CATEGORIES.items():
+    _CATEGORIES[getattr(sre_constants,
+                        _name.upper().replace('CATEGORY_', 'CATEGORY_NOT_'))
+                ] = lambda c, _test=_test: not _test(c)
+del _name, _test
+
+def find_hazards(pattern, flags):
+    """
+    Return a list of (description, pump) pairs, one for each risky repeat
+    found in the pattern.  pump is a character that the repeat and what can
+    follow it both take, so that a long run of it may set off backtracking.
+    Raise re.error if the pattern is invalid.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    flags = parsed.pattern.flags
+    hazards = []
+    _find_sequence_hazards(list(parsed), flags, None, True, hazards)
+    return hazards
+
+def make_test_texts(hazards, lengths=(16, 24, 32, 256, 4096)):
+    """
+    Return texts meant to make a pattern with the hazards backtrack: runs of
+    each pump character (and of some common characters), of each length,
+    ending in a character that may make the match fail.
+    """
+    pumps = ['a', ' '] + [pump for description, pump in hazards]
+    texts = []
+    for length in lengths:
+        for pump in sorted(set(pumps)):
+            for ending in ('', '\n', '!', '\x00'):
+                texts.append(pump * length + ending)
+    return texts
+
+def _find_sequence_hazards(items, flags, loop_chars, reaches_loop, hazards):
+    """
+    Add the hazards of a sequence of parsed items to hazards.
+    loop_chars is the set of characters the innermost enclosing repeat can
+    start an iteration with (None if there is none), and reaches_loop is
+    whether the end of the sequence can be followed by such an iteration.
+    """
+    for index, (op, av) in enumerate(items):
+        rest = items[index + 1:]
+        rest_chars, rest_nullable = _first_chars(rest, flags)
+        if op in _REPEATS:
+            min_, max_, sub = av
+            chars = _first_chars(list(sub), flags)[0]
+            if min_ != max_:
+                next_item = next((item for item in rest
+                                  if item[0] not in _ZERO_WIDTH), None)
+                if (next_item and next_item[0] in _REPEATS and
+                        _is_single_char(sub) and
+                        _is_single_char(next_item[1][2])):
+                    next_min, next_max, next_sub = next_item[1]
+                    next_chars = _first_chars(list(next_sub), flags)[0]
+                    if next_min != next_max and chars & next_chars:
+                        hazards.append((
+                            'Adjacent repeats can take the same characters',
+                            _pick_char(chars & next_chars)))
+                if (loop_chars is not None and rest_nullable and
+                        reaches_loop and chars & loop_chars):
+                    hazards.append((
+                        'A repeat inside a repeat can take the characters '
+                        'of the next outer iteration',
+                        _pick_char(chars & loop_chars)))
+            if max_ > 1:
+                _find_sequence_hazards(list(sub), flags, chars, True, hazards)
+            else:
+                _find_sequence_hazards(list(sub), flags,
+                    loop_chars, reaches_loop and rest_nullable, hazards)
+        elif op == sre_constants.SUBPATTERN:
+            _find_sequence_hazards(list(av[-1]), flags,
+                loop_chars, reaches_loop and rest_nullable, hazards)
+        elif op == sre_constants.BRANCH:
+            for alternative in av[1]:
+                _find_sequence_hazards(list(alternative), flags,
+                    loop_chars, reaches_loop and rest_nullable, hazards)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _find_sequence_hazards(list(av[1]), flags, None, False, hazards)
+
+def _is_single_char(sub):
+    """Return True if a parsed repeat body is one single-character item."""
+    return len(sub) == 1 and sub[0][0] in _SINGLE_CHARS
+
+def _first_chars(items, flags):
+    """
+    Return the set of characters a sequence of parsed items can start with,
+    and whether it can match the empty string.
+    """
+    chars = set()
+    for op, av in items:
+        if op in _ZERO_WIDTH:
+            continue
+        elif op in _REPEATS:
+            min_, max_, sub = av
+            sub_chars, sub_nullable = _first_chars(list(sub), flags)
+            chars |= sub_chars
+            nullable = min_ == 0 or sub_nullable
+        elif op == sre_constants.SUBPATTERN:
+            sub_chars, nullable = _first_chars(list(av[-1]), flags)
+            chars |= sub_chars
+        elif op == sre_constants.BRANCH:
+            nullable = False
+            for alternative in av[1]:
+                sub_chars, sub_nullable = _first_chars(list(alternative),
+                                                       flags)
+                chars |= sub_chars
+                nullable = nullable or sub_nullable
+        elif op in _SINGLE_CHARS:
+            chars |= set(c for c in _ALPHABET
+                         if _matches_char(op, av, c, flags))
+            nullable = False
+        else:
+            # Group references and the like could be anything.
+            chars |= set(_ALPHABET)
+            nullable = True
+        if not nullable:
+            return chars, False
+    return chars, True
+
+def _matches_char(op, av, code, flags):
+    """Return True if a single-character item matches the character code."""
+    if flags & re.I and chr(code).isalpha():
+        codes = set([ord(chr(code).lower()), ord(chr(code).upper())])
+    else:
+        codes = set([code])
+    if op == sre_constants.LITERAL:
+        return av in codes
+    elif op == sre_constants.NOT_LITERAL:
+        return av not in codes
+    elif op == sre_constants.ANY:
+        return bool(flags & re.S) or code != 10
+    elif op == sre_constants.CATEGORY:
+        return any(_CATEGORIES.get(av, lambda c: True)(c) for c in codes)
+    else: # sre_constants.IN
+        negate = False
+        matched = False
+        for set_op, set_av in av:
+            if set_op == sre_constants.NEGATE:
+                negate = True
+            elif set_op == sre_constants.RANGE:
+                low, high = set_av
+                matched = matched or any(low <= c <= high for c in codes)
+            elif set_op in (sre_constants.LITERAL, sre_constants.CATEGORY):
+                matched = matched or _matches_char(set_op, set_av, code, flags)
+        return matched != negate
+
+def _pick_char(chars):
+    """Return a character from the set, preferring a letter or a space."""
+    for code in (ord('a'), ord(' '), ord('0')):
+        if code in chars:
+            return chr(code)
+    return chr(min(chars))
+
+def test():
+    """
+    Execute regexcheck.py at the command line to run this self test.
+    
+    It checks which of some known patterns are found to be risky, and times
+    the safe ones against their test texts.
+    """
+    import time
+    risky = [
+        ('(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+(?:[ \\t]*\\n)?', re.M),
+        ('(a+)+b', 0),
+        ('(?:\\w+\\s?)*$', 0),
+        ('\\s*\\s*x', 0),
+        ('(?:A|b+)*c', re.I),
+        ]
+    safe = [
+        ('[a-zA-Z]+|[0-9]+|[^a-zA-Z0-9]+', 0),
+        ('[-A-Za-z0-9,./?%&#:_]+', 0),
+        ('.*', 0),
+        ('^.*\\n', re.M),
+        ('[_a-zA-Z][_a-zA-Z0-9]*', 0),
+        ('(?:\\d+,)*\\d+', 0),
+        ('(?:ab{2})+', 0),
+        ]
+    for pattern, flags in risky:
+        hazards = find_hazards(pattern, flags)
+        assert hazards, pattern
+        print('%-48s %s (%r)' % (pattern, hazards[0][0], hazards[0][1]))
+    for pattern, flags in safe:
+        assert not find_hazards(pattern, flags), pattern
+        word_re = re.compile(pattern, flags)
+        start = time.time()
+        for text in make_test_texts([]):
+            for match in word_re.finditer(text):
+                pass
+        print('%-48s safe, %.2f ms for test texts' %
+              (pattern, (time.time() - start) * 1000))
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,75 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module keeps the text of documents that selections are made in.
+
+Classes:
+TextSnapshots -- one unicode snapshot of the text of each document
+
+Without it, every click, drag and menu selection copied the text of the
+document (or of the clicked line) out of its gtk.TextBuffer again, and each
+view of a split view did so separately.  The snapshots are kept in the
+plugin's CacheManager, so a snapshot is shared by the selections of every
+view and window until the document changes, and counts against the cache
+budget.
+
+A snapshot is decoded from the buffer's UTF-8, so the positions of regex
+matches in it are the character offsets that gtk.TextBuffer uses.  Taking
+one decodes the whole document, so what needs only a line (such as a click
+with a regex that is not MULTILINE) takes the line from a snapshot only when
+one is kept, and otherwise copies the line alone.
+
+"""
+
+import sys
+
+CHAR_SIZE = 4 if sys.maxunicode > 0xffff else 2
+"""Bytes taken by each character of a unicode string."""
+
+class TextSnapshots(object):
+    
+    """
+    One unicode snapshot of the text of each document (gtk.TextBuffer).
+    
+    Usage:
+        snapshots = TextSnapshots(caches)
+        text = snapshots.get_text(doc)
+        text = snapshots.get_kept_text(doc) # or None, taking no snapshot
+    
+    """
+    
+    def __init__(self, caches):
+        """Prepare to keep snapshots in caches (a CacheManager)."""
+        self.caches = caches
+        """The CacheManager the snapshots are kept in."""
+    
+    def get_text(self, doc):
+        """Return the text of the document, as unicode."""
+        text = self.caches.get(doc, 'text')
+        if text is None:
+            text = doc.get_slice(*doc.get_bounds()).decode('utf-8')
+            self.caches.put(doc, 'text', None, text, len(text) * CHAR_SIZE)
+        return text
+    
+    def get_kept_text(self, doc):
+        """
+        Return the text of the document if its snapshot is kept, or None,
+        without taking one.
+        """
+        return self.caches.peek(doc, 'text')
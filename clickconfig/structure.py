@@ -0,0 +1,311 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module finds the selections of structural SelectionOps by moving
+gtk.TextIters through the lines of the buffer, instead of matching a regex
+in a copy of the text.
+
+Functions:
+find_structure_span -- the start and end iters of a structural selection
+
+Each line and paragraph structure gives the same selection as the regex of
+the built-in op it stands for:
+    'line'       -- Line,       '.*'
+    'line+'      -- Line+,      '^.*\\n' (MULTILINE)
+    'paragraph'  -- Paragraph,  '(?:^(?:[ \\t]*\\S+[ \\t]*)+\\n)+' (MULTILINE)
+    'paragraph+' -- Paragraph+, the same followed by '(?:[ \\t]*\\n)?'
+including the selection of a gap between matches, and of the match before
+the end when the click is on an empty last line.  Only the clicked line and
+the lines out to the ends of the selection (and one beyond) are looked at,
+so the time taken depends on the size of the selection, not the document.
+
+Those regexes see a lone \\r or a Unicode paragraph separator as part of a
+line, though GTK ends a line there.  If such a line end is met, None is
+returned, and the op's regex has to be used instead.
+
+The 'brackets' structure selects the contents of the innermost pair of
+brackets or quotes around the click (or the pair itself, if it is empty), as
+found by a brackets.DocumentBrackets (or by its op's regex while that is
+being built).  The 'indent' structure selects the indentation block that
+holds the clicked line, as found by an indents.DocumentIndents.  Their ops'
+regexes only approximate them.
+
+This module does not import gedit or GTK, so it can be run at the command
+line for its self test, which uses stand-ins for the buffer and its iters:
+    python structure.py
+
+"""
+
+STRUCTURES = ('line', 'line+', 'paragraph', 'paragraph+', 'brackets',
+              'indent')
+"""The structures a SelectionOp can have."""
+
+_NEWLINE_ENDS = ('\n', '\r\n', '')
+"""Line ends the regexes treat as GTK does (at the end of a line)."""
+
+def find_structure_span(click_iter, structure, index=None):
+    """
+    Return the start and end iters of the structure's selection at
+    click_iter, or None if the op's regex has to be used instead.
+    (The iters are equal if there is nothing to select.)
+    index is the buffer's DocumentBrackets for 'brackets', or its
+    DocumentIndents for 'indent'.
+    """
+    if structure == 'brackets':
+        return _find_bracket_span(click_iter, index)
+    lines = _Lines(click_iter.get_buffer())
+    line = click_iter.get_line()
+    try:
+        if structure == 'line':
+            return lines.get_start(line), lines.get_content_end(line)
+        elif structure == 'indent':
+            block = index.find_block(line)
+            if not block:
+                return click_iter, click_iter
+            return lines.get_start(block[0]), lines.get_start(block[1] + 1)
+        elif structure == 'line+':
+            if (click_iter.is_end() and line > 0 and
+                    not lines.get_content(line)):
+                # At the end, the empty last line has no match or gap of its
+                # own, so the line before it is selected.
+                line -= 1
+            lines.get_kind(line)
+            if line > 0:
+                lines.get_kind(line - 1)
+            return lines.get_start(line), lines.get_start(line + 1)
+        else:
+            return _find_paragraph_span(lines, line, click_iter.is_end(),
+                                        structure == 'paragraph+')
+    except _NeedsRegex:
+        return None
+
+def _find_bracket_span(click_iter, brackets):
+    """
+    Return the start and end iters of the contents of the innermost pair of
+    brackets or quotes around click_iter, or of the pair if it is empty, or
+    None if the index of the pairs is not built.
+    """
+    if not brackets.is_built():
+        return None
+    buffer_ = click_iter.get_buffer()
+    pair = brackets.find_pair(click_iter.get_offset())
+    if not pair:
+        return click_iter, click_iter
+    open_start, open_end, close_start, close_end = pair
+    if open_end == close_start:
+        start, end = open_start, close_end
+    else:
+        start, end = open_end, close_start
+    return buffer_.get_iter_at_offset(start), buffer_.get_iter_at_offset(end)
+
+def _find_paragraph_span(lines, line, is_end, plus):
+    """
+    Return the start and end iters of the paragraph (a run of lines with
+    words, and for Paragraph+ one blank line after it) or of the gap
+    between paragraphs that holds the line.
+    """
+    if lines.get_kind(line) == 'full':
+        return _get_run_span(lines, line, plus)
+    if plus and line > 0 and lines.get_kind(line) == 'blank' and \
+            lines.get_kind(line - 1) == 'full':
+        # The blank line belongs to the paragraph above it.
+        return _get_run_span(lines, line - 1, plus)
+    previous_full = line - 1
+    while previous_full >= 0 and lines.get_kind(previous_full) != 'full':
+        previous_full -= 1
+    if previous_full < 0:
+        previous_span = None
+        start_iter = lines.get_start(0)
+    else:
+        previous_span = _get_run_span(lines, previous_full, plus)
+        start_iter = previous_span[1]
+    gap_end = line + 1
+    while gap_end < lines.count and lines.get_kind(gap_end) != 'full':
+        gap_end += 1
+    end_iter = lines.get_start(gap_end)
+    if start_iter.equal(end_iter) and is_end and previous_span:
+        # At the end, an empty gap after a paragraph selects the paragraph.
+        return previous_span
+    return start_iter, end_iter
+
+def _get_run_span(lines, line, plus):
+    """Return the start and end iters of the paragraph holding the line."""
+    first = line
+    while first > 0 and lines.get_kind(first - 1) == 'full':
+        first -= 1
+    if first > 0:
+        # Check that the paragraph starts where the regex can start.
+        lines.get_kind(first - 1)
+    return lines.get_start(first), lines.get_start(
+        _get_run_end(lines, line, plus))
+
+def _get_run_end(lines, line, plus):
+    """Return the line after the paragraph holding the line."""
+    last = line
+    while last + 1 < lines.count and lines.get_kind(last + 1) == 'full':
+        last += 1
+    if plus and last + 1 < lines.count and \
+            lines.get_kind(last + 1) == 'blank':
+        return last + 2
+    return last + 1
+
+class _NeedsRegex(Exception):
+    """Raised on meeting a line end the regexes do not treat as GTK does."""
+
+class _Lines(object):
+    
+    """
+    Gives the iters and kinds of the buffer's lines, looking at each line
+    only once.
+    """
+    
+    def __init__(self, buffer_):
+        self.buffer = buffer_
+        self.count = buffer_.get_line_count()
+        """The number of lines in the buffer."""
+        self._kinds = {}
+        """The kind of each line looked at so far."""
+    
+    def get_start(self, line):
+        """Return an iter at the start of the line (or at the end)."""
+        if line >= self.count:
+            return self.buffer.get_end_iter()
+        return self.buffer.get_iter_at_line(line)
+    
+    def get_content_end(self, line):
+        """Return an iter at the end of the line, before its line end."""
+        line_iter = self.get_start(line)
+        if not line_iter.ends_line():
+            line_iter.forward_to_line_end()
+        return line_iter
+    
+    def get_content(self, line):
+        """Return the text of the line, without its line end."""
+        return self.get_start(line).get_slice(self.get_content_end(line))
+    
+    def get_kind(self, line):
+        """
+        Return 'full' if the line has words and ends in \\n (the regex's
+        line of a paragraph), 'blank' if it has only spaces and tabs and ends
+        in \\n, or else 'other'.  Raise _NeedsRegex for a line end that the
+        regexes do not treat as the end of a line.
+        """
+        if line in self._kinds:
+            return self._kinds[line]
+        content_end = self.get_content_end(line)
+        line_end = content_end.get_slice(self.get_start(line + 1))
+        if line_end not in _NEWLINE_ENDS:
+            raise _NeedsRegex()
+        content = self.get_start(line).get_slice(content_end)
+        if line_end != '\n' or '\f' in content or '\v' in content:
+            kind = 'other'
+        elif content.strip(' \t'):
+            kind = 'full'
+        else:
+            kind = 'blank'
+        self._kinds[line] = kind
+        return kind
+
+
+class _Buffer(object):
+    """A minimal gtk.TextBuffer stand-in for the self test (\n lines)."""
+    def __init__(self, text):
+        self.text = text
+        self.starts = [0]
+        for index, char in enumerate(text):
+            if char == u'\n':
+                self.starts.append(index + 1)
+    def get_line_count(self):
+        return len(self.starts)
+    def get_iter_at_line(self, line):
+        return _Iter(self, self.starts[line])
+    def get_iter_at_offset(self, offset):
+        return _Iter(self, offset)
+    def get_end_iter(self):
+        return _Iter(self, len(self.text))
+
+class _Iter(object):
+    """A minimal gtk.TextIter stand-in for the self test."""
+    def __init__(self, buffer_, offset):
+        self.buffer = buffer_
+        self.offset = offset
+    def get_buffer(self):
+        return self.buffer
+    def get_offset(self):
+        return self.offset
+    def get_line(self):
+        return len([start for start in self.buffer.starts[1:]
+                    if start <= self.offset])
+    def ends_line(self):
+        return self.buffer.text[self.offset:self.offset + 1] in (u'\n', u'')
+    def forward_to_line_end(self):
+        while not self.ends_line():
+            self.offset += 1
+    def get_slice(self, end):
+        return self.buffer.text[self.offset:end.offset]
+    def equal(self, other):
+        return self.offset == other.offset
+    def is_end(self):
+        return self.offset == len(self.buffer.text)
+
+def test():
+    """
+    Execute structure.py at the command line to run this self test.
+    
+    It checks the spans selected by the 'brackets' and 'indent' structures
+    at clicks in some Python text.
+    """
+    from brackets import BracketIndex
+    from indents import IndentIndex
+    text = u'\n'.join([
+        u'def f(x):',                   # 0
+        u'    if x:',                   # 1
+        u'        g(x, [1, 2], "")',    # 2
+        u'',                            # 3
+        u'    return 2',                # 4
+        u'',                            # 5
+        ])
+    buffer_ = _Buffer(text)
+    def find(structure, index, offset):
+        span = find_structure_span(buffer_.get_iter_at_offset(offset),
+                                   structure, index)
+        return text[span[0].get_offset():span[1].get_offset()]
+    brackets = BracketIndex(text)
+    line_2 = buffer_.starts[2]
+    # The contents of the innermost pair, or the pair itself if it is empty.
+    assert find('brackets', brackets, line_2 + 15) == u'1, 2'
+    assert find('brackets', brackets, line_2 + 11) == u'x, [1, 2], ""'
+    assert find('brackets', brackets, line_2 + 22) == u'""'
+    assert find('brackets', brackets, line_2 + 4) == u''
+    assert find('brackets', brackets, 6) == u'x'
+    print('The brackets structure selects within the enclosing pair.')
+    indents = IndentIndex(text)
+    # A line and the lines indented under it, or for a blank line, the
+    # lines around it at their indentation.
+    assert find('indent', indents, buffer_.starts[2] + 9) == \
+        u'        g(x, [1, 2], "")\n'
+    assert find('indent', indents, buffer_.starts[1]) == \
+        u'    if x:\n        g(x, [1, 2], "")\n'
+    assert find('indent', indents, buffer_.starts[3]) == \
+        u'    if x:\n        g(x, [1, 2], "")\n\n    return 2\n'
+    assert find('indent', indents, 0) == text
+    print('The indent structure selects the block of the clicked line.')
+
+if __name__ == '__main__':
+    test()
@@ -56,18 +56,48 @@ Solution:   Make selection happen on button releases instead of button presses,
 Additionally, in a drag-and-drop, gtk.TreeView only shows a drag icon
 representing the clicked row, even if the selection is of multiple rows.  This
 subclass replaces the default single-row drag icon with a multiple-row icon.
+The icon shows at most MAX_DRAG_ICON_ROWS rows, plus a count of the rest, and
+it is reused for further drags until the selection changes.
+
+For a list model kept sorted by its first column, the TreeView also keeps an
+index of the first-column values, updated from the model's signals, so that
+rows can be found and selected by value with a binary search.  Rows are added
+and removed through the model itself (or, for a filtered view, through the
+model it filters).
 
 Classes:
 TreeViewDV -- This can be used in place of a gtk.TreeView.
 
 """
 
+import bisect
 import logging
 import os
 import sys
 
 import gtk
 
+MAX_DRAG_ICON_ROWS = 8
+"""The most selected rows drawn in a multiple-row drag icon."""
+
+LOG_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+    }
+
+LOGGER = logging.getLogger('treeviewdv')
+"""One logger shared by all TreeViewDV objects."""
+if not LOGGER.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _log_format = "%(levelname)s - %(message)s"
+    #_log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    _handler.setFormatter(logging.Formatter(_log_format))
+    LOGGER.addHandler(_handler)
+    LOGGER.setLevel(logging.WARNING)
+
 class TreeViewDV(gtk.TreeView):
     
     """
@@ -86,19 +116,8 @@ class TreeViewDV(gtk.TreeView):
         """
         gtk.TreeView.__init__(self, model)
         
-        instance_id = repr(self)
-        self.logger = logging.getLogger('Logger of ' + instance_id)
-        handler = logging.StreamHandler(sys.stdout)
-        log_format = "%(levelname)s - %(message)s"
-        #log_format = "%(asctime)s - %(levelname)s - %(message)s"
-        formatter = logging.Formatter(log_format)
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.WARNING)
-        self.log('TreeViewDV logging started. '.ljust(72, '-'))
-        self.log(self.logger.name)
         self.log()
-
+        
         self.selectable = True
         """If False, GTK will not select rows in response to clicks."""
         
@@ -120,8 +139,26 @@ class TreeViewDV(gtk.TreeView):
         self.press_y = 0
         """Pointer y location (in tree coordinates) at button press."""
         
+        self.press_path = None
+        """The row of the button press that may start a drag."""
+        
+        self.values = []
+        """First-column values of the model's rows, in row order."""
+        
+        self._watched_model = None
+        """The model whose signals update values."""
+        
+        self._model_handler_ids = []
+        """Handler ids for the signals of the model that update values."""
+        
+        self._watch_model(model)
+        
+        self._drag_icon = None
+        """The pixbuf of the last drag icon, until deselection."""
+        
         treeselection = self.get_selection()
         treeselection.set_select_function(lambda info: self.selectable)
+        treeselection.connect('changed', self.on_selection_changed)
         
         self.connect('button-press-event', self.on_button_press)
         
@@ -150,6 +187,7 @@ class TreeViewDV(gtk.TreeView):
             is_selected = treeselection.path_is_selected(path)
             self._disable_gtk_selecting()
             if is_selected:
+                self.press_path = path
                 self._set_press_coords(event)
                 self._prepare_for_dragging()
             else:
@@ -176,14 +214,28 @@ class TreeViewDV(gtk.TreeView):
         self.log()
         self._set_drag_icon(drag_context)
     
+    def on_selection_changed(self, treeselection):
+        """Forget the drag icon of the previous selection."""
+        self._drag_icon = None
+    
     def _set_drag_icon(self, drag_context):
         self.log()
         treeselection = self.get_selection()
         if not treeselection.count_selected_rows():
             return
+        if not self._drag_icon:
+            self._drag_icon = self._create_drag_icon_pixbuf()
+        # The press may be on another row of the same selection, or the view
+        # may have scrolled, so the hotspot is found for each drag.
+        drag_context.set_icon_pixbuf(pixbuf=self._drag_icon,
+                                     hot_x=self.press_x,
+                                     hot_y=self._get_drag_icon_hot_y())
+    
+    def _create_drag_icon_pixbuf(self):
+        """Return a multiple-row drag icon pixbuf."""
+        self.log()
         pixmap = self._create_rows_drag_icon()
         width, height = pixmap.get_size()
-        hot_x, hot_y = self.press_x, self.press_y
         pixbuf = gtk.gdk.Pixbuf(
             colorspace=gtk.gdk.COLORSPACE_RGB,
             has_alpha=False,
@@ -204,7 +256,7 @@ class TreeViewDV(gtk.TreeView):
             r=chr(1),
             g=chr(1),
             b=chr(1))
-        drag_context.set_icon_pixbuf(pixbuf=pixbuf, hot_x=hot_x, hot_y=hot_y)
+        return pixbuf
     
     def on_motion_notify(self, widget, event):
         """Allow normal GTK selecting again after this drag."""
@@ -291,15 +343,13 @@ class TreeViewDV(gtk.TreeView):
     
     def log(self, message=None, level='debug'):
         """Log the message or log the calling function."""
+        level = LOG_LEVELS[level]
+        if not LOGGER.isEnabledFor(level):
+            return
         if message:
-            logger = {'debug': self.logger.debug,
-                      'info': self.logger.info,
-                      'warning': self.logger.warning,
-                      'error': self.logger.error,
-                      'critical': self.logger.critical}[level]
-            logger(message)
+            LOGGER.log(level, message)
         else:
-            self.logger.debug(self._whoami())
+            LOGGER.log(level, self._whoami())
     
     def _whoami(self):
         """Identify the calling function for logging."""
@@ -310,18 +360,26 @@ class TreeViewDV(gtk.TreeView):
         return '%s Line %s %s.%s' % (filename, line, class_name, function_name)
     
     def _create_rows_drag_icon(self):
-        """Create a multiple-row drag icon."""
+        """
+        Create a multiple-row drag icon of up to MAX_DRAG_ICON_ROWS of the
+        selected rows, stacked, with a line counting any other selected rows.
+        """
         self.log()
-        treeselection = self.get_selection()
-        paths = [row[0] for row in treeselection.get_selected_rows()[1]]
-        row_pixmaps = [self.create_row_drag_icon(path)
-                       for path in paths]
+        paths = self._get_selected_rows()
+        shown_paths = paths[:MAX_DRAG_ICON_ROWS]
+        hidden_count = len(paths) - len(shown_paths)
+        row_pixmaps = [self.create_row_drag_icon((path,))
+                       for path in shown_paths]
         first_pixmap = row_pixmaps[0]
         row_width, row_height = first_pixmap.get_size()
+        if hidden_count:
+            badge_layout = self.create_pango_layout(
+                '+ %d more' % hidden_count)
+            badge_height = badge_layout.get_pixel_size()[1] + 2
+        else:
+            badge_height = 0
         width = row_width
-        height = (self._get_row_y(paths[-1]) -
-                  self._get_row_y(paths[0]) +
-                  row_height)
+        height = row_height * len(row_pixmaps) + badge_height
         pixmap = gtk.gdk.Pixmap(first_pixmap, width, height)
         pixmap_gc = gtk.gdk.GC(first_pixmap)
         # Clear the new Pixmap before drawing on it:
@@ -336,20 +394,55 @@ class TreeViewDV(gtk.TreeView):
             height=height)
         for index, row_pixmap in enumerate(row_pixmaps):
             # Copy the row icon onto the full image
-            ydest = self._get_row_y(paths[index]) - self._get_row_y(paths[0])
-            pixmap_gc.set_function(gtk.gdk.COPY)
             pixmap.draw_drawable(
                 gc=pixmap_gc,
                 src=row_pixmap,
                 xsrc=0,
                 ysrc=0,
                 xdest=0,
-                ydest=ydest,
+                ydest=index * row_height,
                 width=row_width,
                 height=row_height)
-        self.press_y -= self._get_row_y(paths[0])
+        if hidden_count:
+            # Count the rows that are not drawn
+            badge_y = height - badge_height
+            pixmap_gc.set_rgb_fg_color(self.style.base[gtk.STATE_NORMAL])
+            pixmap.draw_rectangle(
+                gc=pixmap_gc,
+                filled=True,
+                x=0,
+                y=badge_y,
+                width=width,
+                height=badge_height)
+            pixmap_gc.set_rgb_fg_color(self.style.text[gtk.STATE_NORMAL])
+            pixmap.draw_layout(pixmap_gc, 2, badge_y + 1, badge_layout)
         return pixmap
     
+    def _get_drag_icon_hot_y(self):
+        """
+        Return the height of the press location within the multiple-row
+        drag icon of the current selection.
+        """
+        self.log()
+        shown_paths = self._get_selected_rows()[:MAX_DRAG_ICON_ROWS]
+        column = self.get_column(0)
+        # (create_row_drag_icon draws the row's background area and a border
+        # of one pixel around it.)
+        row_area = self.get_background_area(shown_paths[0], column)
+        row_height = row_area.height + 2
+        # Where the press happened, relative to the top of its row
+        press_path = self.press_path
+        if press_path and press_path[0] in shown_paths:
+            press_index = shown_paths.index(press_path[0])
+            return (press_index * row_height +
+                    self.press_y - self._get_row_y(press_path))
+        return row_height // 2
+    
+    def _get_selected_rows(self):
+        """Return the row numbers of the selected rows, in order."""
+        treeselection = self.get_selection()
+        return [row[0] for row in treeselection.get_selected_rows()[1]]
+    
     def _get_row_y(self, path):
         """Return y tree coordinate of the top of cell at path."""
         column = self.get_column(0)
@@ -357,30 +450,116 @@ class TreeViewDV(gtk.TreeView):
         x, y = self.convert_widget_to_tree_coords(cell_area.x, cell_area.y)
         return y
     
+    # Model index methods
+    
+    def _watch_model(self, model):
+        """Index the model's values and keep the index in sync with it."""
+        for handler_id in self._model_handler_ids:
+            self._watched_model.disconnect(handler_id)
+        self._model_handler_ids = []
+        self._watched_model = model
+        if model is None:
+            self.values = []
+            return
+        self.values = [row[0] for row in model]
+        self._model_handler_ids = [
+            model.connect('row-inserted', self.on_model_row_inserted),
+            model.connect('row-changed', self.on_model_row_changed),
+            model.connect('row-deleted', self.on_model_row_deleted),
+            model.connect('rows-reordered', self.on_model_rows_reordered),
+            ]
+    
+    def on_model_row_inserted(self, model, path, iter_):
+        """Add the inserted row's value to the index."""
+        self.values.insert(path[0], model.get_value(iter_, 0))
+    
+    def on_model_row_changed(self, model, path, iter_):
+        """Update the changed row's value in the index."""
+        self.values[path[0]] = model.get_value(iter_, 0)
+    
+    def on_model_row_deleted(self, model, path):
+        """Remove the deleted row's value from the index."""
+        del self.values[path[0]]
+    
+    def on_model_rows_reordered(self, model, path, iter_, new_order):
+        """Re-index the reordered model."""
+        self.values = [row[0] for row in model]
+    
     # Public methods
     
-    def remove_from_treeview(treeview, row):
-        """Remove the row from the TreeView."""
-        treemodel = treeview.get_model()
-        treemodel_list = self._get_list_from_liststore(liststore)
-        path = liststore_list.index(value)
-        iter_ = liststore.get_iter(path)
-        liststore.remove(iter_)
-        if len(liststore) == 0:
-            treeview.set_property('can-focus', False)
-    
-    def add_to_treeview(treeview, row):
-        """Add the row to the TreeView."""
-        liststore = treeview.get_model()
-        liststore_list = self._get_list_from_liststore(liststore)
-        liststore_list.append(value)
-        liststore_list.sort()
-        path = liststore_list.index(value)
-        if path == len(liststore):
-            liststore.append([value])
-        else:
-            iter_ = liststore.get_iter(path)
-            liststore.insert_before(iter_, row=[value])
-        treeview.set_property('can-focus', True)
+    def set_model(self, model=None):
+        """Set the model and index its values."""
+        gtk.TreeView.set_model(self, model)
+        self._watch_model(model)
+    
+    def get_path_of_value(self, value):
+        """
+        Return the path of the row with this first-column value, or None.
+        The model must be sorted by its first column.
+        """
+        index = bisect.bisect_left(self.values, value)
+        if index < len(self.values) and self.values[index] == value:
+            return (index,)
+        return None
     
+    def select_values(self, values):
+        """Select the rows with these first-column values."""
+        self.log()
+        treeselection = self.get_selection()
+        for value in values:
+            path = self.get_path_of_value(value)
+            if path is not None:
+                treeselection.select_path(path)
+
+def test():
+    """
+    Execute treeviewdv.py at the command line to run this self test.
+    
+    It checks that ConfigUI._build_lang_table, which makes TreeViewDV objects
+    for each ConfigSet each time it builds the language table, does not
+    register any more loggers with the logging module.
+    """
+    import imp
+    print('\nTesting that TreeViewDV objects do not leak loggers')
+    # Load the plugin's modules as a package without its __init__.py, which
+    # needs gedit, so that the configuration window can be made here.
+    plugin_path = os.path.dirname(os.path.realpath(__file__))
+    package = imp.new_module('clickconfig')
+    package.__path__ = [plugin_path]
+    sys.modules.setdefault('clickconfig', package)
+    from clickconfig.data import SelectionOp, ConfigSet, Config
+    from clickconfig.ui import ConfigUI
+    class Plugin(object):
+        """The parts of ClickConfigPlugin that ConfigUI uses."""
+        config_ui = None
+        def get_gedit_window(self):
+            return None
+    plugin = Plugin()
+    plugin.plugin_path = plugin_path
+    plugin.conf = Config(plugin)
+    plugin.conf.ops = [SelectionOp('None', preserved=True)]
+    plugin.conf.current_op_name = 'None'
+    configset_count = 40
+    for index in range(configset_count):
+        plugin.conf.add_configset(ConfigSet('Set %d' % index, ['None'] * 5))
+    plugin.conf.current_configset_name = 'Set 0'
+    plugin.conf.languages = dict(
+        ('Language %03d' % index, 'Set %d' % (index % configset_count))
+        for index in range(500))
+    plugin.conf.is_set_by_language = True
+    config_ui = ConfigUI(plugin)
+    logger_count = len(logging.Logger.manager.loggerDict)
+    handler_count = len(LOGGER.handlers)
+    rebuild_count = 20
+    for rebuild in range(rebuild_count):
+        config_ui._build_lang_table()
+    config_ui.window.destroy()
+    assert len(logging.Logger.manager.loggerDict) == logger_count, \
+        'Loggers leaked: %d -> %d' % (
+            logger_count, len(logging.Logger.manager.loggerDict))
+    assert len(LOGGER.handlers) == handler_count, 'Handlers leaked'
+    print('OK: %d loggers after %d more table builds' %
+          (logger_count, rebuild_count))
 
+if __name__ == '__main__':
+    test()
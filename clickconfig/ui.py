@@ -25,8 +25,10 @@ object through which it accesses the plugin's configuration and logging.
 
 Classes:
 ConfigUI -- The Click_Config plugin creates one object of this class when the
-            configuration window is opened.  The object removes its own
-            reference from the plugin when the configuration window is closed.
+            configuration window is first opened.  Closing the window only
+            hides it, and the plugin calls refresh to bring it up to date with
+            the configuration when it is opened again.  The object removes its
+            own reference from the plugin when the window is destroyed.
 
 In addition to the imported modules, this module requires:
 Click_Config.xml -- configuration GUI layout converted from Click_Config.glade
@@ -36,16 +38,27 @@ Click_Config.xml -- configuration GUI layout converted from Click_Config.glade
 
 """
 
+import bisect
 import os
 import re
 import sys
 
+import gobject
 import gtk
 
 from treeviewdv import TreeViewDV
+from .data import ENGINES
+from .regexcheck import find_hazards, make_test_texts
+from .worker import MatchTimer
 from .logger import Logger
 LOGGER = Logger(level=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')[2])
 
+SLOW_MATCH_TIME = 0.1
+"""Seconds of matching a test text from which an op is warned of as slow."""
+
+RE_TYPE = type(re.compile(''))
+"""The type of regexes compiled by the re module."""
+
 class ConfigUI(object):
     
     """
@@ -86,6 +99,31 @@ class ConfigUI(object):
         self.preserved_ops = [item.name for item in
             self._mod_conf.ops if item.preserved]
         
+        self._op_names = []
+        """Sorted SelectionOp names, in the same order as _op_liststore."""
+        self._op_liststore = gtk.ListStore(str)
+        """SelectionOp names model shared by all the op comboboxes."""
+        self._is_syncing_ops = False
+        """Whether combobox changes come from updating _op_liststore."""
+        
+        self._lang_names = []
+        """Sorted language names, in the same order as _lang_liststore."""
+        self._lang_liststore = gtk.ListStore(str, str)
+        """Language and assigned ConfigSet name of every language."""
+        self._lang_iters = {}
+        """The _lang_liststore row (TreeIter) of each language."""
+        self._lang_treeviews = {}
+        """The language TreeView of each ConfigSet in the language table."""
+        self._lang_table_configset_names = None
+        """ConfigSet names the language table was last built for."""
+        
+        self._match_timer = None
+        """Times the regex of the SelectionOp last added, if it is running."""
+        self._match_timer_ids = []
+        """Source ids of the watch and timeout that step _match_timer."""
+        self._define_warning = None
+        """The SelectionOp name and text of the Define section's warning."""
+        
         # 3. Update the window's widgets to reflect the configuration.
         width = self._mod_conf.window_width
         height = (self._mod_conf.window_height_tall if
@@ -93,6 +131,8 @@ class ConfigUI(object):
                        self._mod_conf.window_height_short)
         if width and height:
             self.window.set_default_size(width, height)
+        self._sync_op_liststore()
+        self._set_op_comboboxes_model()
         self._update_config_combobox()
         self._update_config_display()
         self._update_lang_checkbutton()
@@ -133,6 +173,8 @@ class ConfigUI(object):
                 self.on_define_changed,
             'on_define_x_checkbutton_toggled':
                 self.on_define_changed,
+            'on_define_l_checkbutton_toggled':
+                self.on_define_changed,
             'on_define_add_button_clicked':
                 self.on_define_add_button_clicked,
             'on_define_remove_button_clicked':
@@ -152,8 +194,56 @@ class ConfigUI(object):
         self.on_config_window_configure_handler_id = self.window.connect(
             'configure-event',
             self.on_config_window_configure_event)
+        self.window.connect('delete-event', self.on_config_window_delete_event)
         
         LOGGER.log('Configuration window opened.')
+    
+    def refresh(self):
+        """
+        Bring the (hidden) window up to date with the plugin's configuration.
+        Only the sections whose settings differ from it are updated.
+        """
+        LOGGER.log()
+        gedit_window = self._plugin.get_gedit_window()
+        if gedit_window is not self.window.get_transient_for():
+            self.window.set_transient_for(gedit_window)
+        old_conf = self._mod_conf
+        if old_conf == self._plugin.conf:
+            self._update_apply_button()
+            return
+        self._mod_conf = self._plugin.conf.copy()
+        self.preserved_sets = [item.name for item in
+            self._mod_conf.configsets if item.preserved]
+        self.preserved_ops = [item.name for item in
+            self._mod_conf.ops if item.preserved]
+        # Find what differs from what the window currently shows.
+        ops_changed = old_conf.ops != self._mod_conf.ops
+        configsets_changed = (
+            old_conf.configsets != self._mod_conf.configsets or
+            old_conf.current_configset_name !=
+                self._mod_conf.current_configset_name)
+        op_changed = (ops_changed or
+            old_conf.current_op_name != self._mod_conf.current_op_name)
+        lang_check_changed = (old_conf.is_set_by_language !=
+                              self._mod_conf.is_set_by_language)
+        languages_changed = (old_conf.languages != self._mod_conf.languages or
+                             configsets_changed)
+        # Update only those sections.
+        if ops_changed:
+            self._sync_op_liststore()
+        if configsets_changed:
+            self._update_config_combobox()
+        if configsets_changed or ops_changed:
+            self._update_config_display()
+        if lang_check_changed:
+            self._update_lang_checkbutton()
+        if op_changed:
+            self._update_define_combobox()
+            self._update_define_display()
+        if lang_check_changed or languages_changed:
+            self._update_language_frame()
+        self._update_apply_button()
+        LOGGER.log('Configuration window refreshed.')
         
         
     ### 1 - General configure window
@@ -178,10 +268,18 @@ class ConfigUI(object):
             window.set_geometry_hints(height_inc=unlikely_height_inc)
         self.window.resize(width, height)
     
+    def on_config_window_delete_event(self, widget, event):
+        """Hide the window instead of letting it be destroyed."""
+        LOGGER.log()
+        self.window.hide()
+        LOGGER.log('Configuration window hidden.')
+        return True
+    
     def on_config_window_destroy(self, event):
         """Let the ClickConfigPlugin know that the ConfigUI is gone."""
         LOGGER.log()
         LOGGER.log('Configuration window closed.')
+        self._stop_match_timer()
         self._plugin.config_ui = None
         return False
     
@@ -198,7 +296,7 @@ class ConfigUI(object):
             self._mod_conf.window_height_short = height
         self._plugin.update_configuration(self._mod_conf.copy())
         self._plugin.update_ui(self._plugin.get_gedit_window())
-        self.window.destroy()
+        self.window.hide()
     
     def on_Apply_button_clicked(self, button):
         """Give the ClickConfigPlugin the modified configuration."""
@@ -209,7 +307,7 @@ class ConfigUI(object):
     def on_Cancel_button_clicked(self, button):
         """Close without giving ClickConfigPlugin the modified configuration."""
         LOGGER.log()
-        self.window.destroy()
+        self.window.hide()
     
     def on_Browse_button_clicked(self, button):
         """Browse to the configuration file."""
@@ -223,6 +321,7 @@ class ConfigUI(object):
             title='Import from a Click_Config configuration file')
         if filename:
             self._mod_conf.import_file(filename)
+        self._sync_op_liststore()
         self._update_config_combobox()
         self._update_config_display()
         self._update_define_combobox()
@@ -446,6 +545,8 @@ class ConfigUI(object):
         Update the configuration and interface to reflect the SelectionOp name.
         """
         LOGGER.log()
+        if self._is_syncing_ops:
+            return
         # Get objects
         config_combobox_entry = \
             self.builder.get_object("config_combobox_entry")
@@ -465,26 +566,85 @@ class ConfigUI(object):
     
     # 3.2 - Support functions
     
-    def _fill_combobox(self, combobox, items):
-        """Put a list of the SelectionOp names in the combobox."""
+    def _set_op_comboboxes_model(self):
+        """Give all the SelectionOp comboboxes the shared op name model."""
         LOGGER.log()
-        combobox_liststore = gtk.ListStore(str)
-        for item in items:
-            combobox_liststore.append([item])
-        combobox.set_model(combobox_liststore)
+        for click in range(1, 6):
+            combobox = self.builder.get_object('combobox%d' % click)
+            # As of GTK+ 2.20, the widget name does not automatically equal the
+            # widget id, so I have to set it here to let it work as before.
+            combobox.set_name('combobox%d' % click)
+            combobox.set_model(self._op_liststore)
+        define_comboboxentry = self.builder.get_object('define_comboboxentry')
+        define_comboboxentry.set_model(self._op_liststore)
+        define_comboboxentry.set_text_column(0)
+        # The entry's own cell renderer shows the names, so hide the one from
+        # the layout file to avoid showing each name twice.
+        self.builder.get_object('renderer7').set_property('visible', False)
+    
+    def _sync_op_liststore(self):
+        """
+        Add and remove rows of the shared op name model so that it matches the
+        SelectionOps of the configuration.
+        """
+        LOGGER.log()
+        op_names = self._mod_conf.get_op_names()
+        if op_names == self._op_names:
+            return
+        new_names = set(op_names)
+        old_names = set(self._op_names)
+        self._is_syncing_ops = True
+        try:
+            for op_name in old_names - new_names:
+                self._remove_op_name(op_name)
+            for op_name in op_names:
+                if op_name not in old_names:
+                    self._insert_op_name(op_name)
+        finally:
+            self._is_syncing_ops = False
+    
+    def _get_op_index(self, op_name):
+        """Return the row index of the SelectionOp name in the model."""
+        if self._op_names and self._op_names[0] == op_name:
+            return 0
+        index = bisect.bisect_left(self._op_names, op_name, 1)
+        if index < len(self._op_names) and self._op_names[index] == op_name:
+            return index
+        raise ValueError('%r is not a SelectionOp name' % op_name)
+    
+    def _is_op_name(self, op_name):
+        """Return True if the name is in the op name model."""
+        try:
+            self._get_op_index(op_name)
+        except ValueError:
+            return False
+        return True
+    
+    def _insert_op_name(self, op_name):
+        """Insert a row for the SelectionOp name in its sorted position."""
+        LOGGER.log()
+        if not self._op_names:
+            # The first name ('None') stays at the top.
+            index = 0
+        else:
+            index = bisect.bisect_left(self._op_names, op_name, 1)
+        self._op_names.insert(index, op_name)
+        self._op_liststore.insert(index, [op_name])
+    
+    def _remove_op_name(self, op_name):
+        """Remove the row of the SelectionOp name."""
+        LOGGER.log()
+        index = self._get_op_index(op_name)
+        del self._op_names[index]
+        self._op_liststore.remove(self._op_liststore.get_iter(index))
     
     def _update_config_display(self):
         """
         Reflect the five SelectionOps of the current ConfigSet in the widgets.
         """
         LOGGER.log()
-        op_names = self._mod_conf.get_op_names()
         for click in range(1, 6):
             combobox = self.builder.get_object('combobox%d' % click)
-            # As of GTK+ 2.20, the widget name does not automatically equal the
-            # widget id, so I have to set it here to let it work as before.
-            combobox.set_name('combobox%d' % click)
-            self._fill_combobox(combobox, op_names)
             op_name = self._mod_conf.get_op(click=click).name
             self._set_combobox_op(combobox, op_name)
         self._update_apply_button()
@@ -504,12 +664,11 @@ class ConfigUI(object):
         objects['s'] = self.builder.get_object('s_checkbutton' + click_number)
         objects['x'] = self.builder.get_object('x_checkbutton' + click_number)
         # Get circumstance
-        op_names = self._mod_conf.get_op_names()
         is_editable = not self._mod_conf.get_configset().preserved
         op = self._mod_conf.get_op(op_name=op_name)
         pattern = op.pattern
         flags = op.flags
-        index = op_names.index(op_name)
+        index = self._get_op_index(op_name)
         # Update interface
         objects['combobox'].set_active(index)
         objects['combobox'].set_sensitive(is_editable)
@@ -531,9 +690,10 @@ class ConfigUI(object):
     def on_define_comboboxentry_changed(self, combobox):
         """Update the configuration and interface for the SelectionOp name."""
         LOGGER.log()
+        if self._is_syncing_ops:
+            return
         op_name = combobox.get_active_text().strip()
-        op_names = self._mod_conf.get_op_names()
-        if op_name in op_names:
+        if self._is_op_name(op_name):
             self._mod_conf.current_op_name = op_name
             self._update_apply_button()
         self._update_define_display()
@@ -567,10 +727,8 @@ class ConfigUI(object):
         """Reflect the SelectionOps and current SelectionOp in the combobox."""
         LOGGER.log()
         define_comboboxentry = self.builder.get_object('define_comboboxentry')
-        op_names = self._mod_conf.get_op_names()
-        self._fill_comboboxentry(define_comboboxentry, op_names)
         op_name = self._mod_conf.current_op_name
-        index = op_names.index(op_name)
+        index = self._get_op_index(op_name)
         define_comboboxentry.set_active(index)
     
     def _update_define_display(self):
@@ -584,12 +742,12 @@ class ConfigUI(object):
         objects['m'] = self.builder.get_object('define_m_checkbutton')
         objects['s'] = self.builder.get_object('define_s_checkbutton')
         objects['x'] = self.builder.get_object('define_x_checkbutton')
+        objects['l'] = self.builder.get_object('define_l_checkbutton')
         objects['add'] = self.builder.get_object("define_add_button")
         objects['remove'] = self.builder.get_object("define_remove_button")
         # Get circumstance
         op_name = objects['combobox'].get_active_text().strip()
-        op_names = self._mod_conf.get_op_names()
-        is_existing_name = op_name in op_names
+        is_existing_name = self._is_op_name(op_name)
         is_preserved_op = op_name in self.preserved_ops
         is_editable = not is_preserved_op
         is_addable = not is_existing_name
@@ -602,13 +760,16 @@ class ConfigUI(object):
             objects['m'].set_active(op.flags & re.M)
             objects['s'].set_active(op.flags & re.S)
             objects['x'].set_active(op.flags & re.X)
+            objects['l'].set_active(op.engine == 'linear')
         objects['pattern'].set_sensitive(is_editable)
         objects['i'].set_sensitive(is_editable)
         objects['m'].set_sensitive(is_editable)
         objects['s'].set_sensitive(is_editable)
         objects['x'].set_sensitive(is_editable)
+        objects['l'].set_sensitive(is_editable)
         objects['add'].set_sensitive(is_addable)
         objects['remove'].set_sensitive(is_removable)
+        self._update_define_warning()
     
     def _update_define_add_button(self):
         """Correct the Add button's sensitivity for the pattern and flags."""
@@ -621,6 +782,7 @@ class ConfigUI(object):
         objects['m'] = self.builder.get_object('define_m_checkbutton')
         objects['s'] = self.builder.get_object('define_s_checkbutton')
         objects['x'] = self.builder.get_object('define_x_checkbutton')
+        objects['l'] = self.builder.get_object('define_l_checkbutton')
         objects['add'] = self.builder.get_object("define_add_button")
         # Get circumstance
         op_name = objects['combobox'].get_active_text().strip()
@@ -629,14 +791,16 @@ class ConfigUI(object):
                  objects['m'].get_active() * re.M +
                  objects['s'].get_active() * re.S +
                  objects['x'].get_active() * re.X)
+        engine = 'linear' if objects['l'].get_active() else 're'
         current_op = self._mod_conf.get_op()
-        op_names = self._mod_conf.get_op_names()
-        has_new_op_name = op_name not in op_names
+        has_new_op_name = not self._is_op_name(op_name)
         has_new_pattern = pattern != current_op.pattern
         has_new_flags = flags != current_op.flags
+        has_new_engine = engine != current_op.engine
         has_changes = (has_new_op_name or 
                        has_new_pattern or
-                       has_new_flags)
+                       has_new_flags or
+                       has_new_engine)
         is_preserved_op = op_name in self.preserved_ops
         # Update interface
         objects['add'].set_sensitive(has_changes and not is_preserved_op)
@@ -652,6 +816,7 @@ class ConfigUI(object):
         objects['m'] = self.builder.get_object('define_m_checkbutton')
         objects['s'] = self.builder.get_object('define_s_checkbutton')
         objects['x'] = self.builder.get_object('define_x_checkbutton')
+        objects['l'] = self.builder.get_object('define_l_checkbutton')
         # Get circumstance
         op_name = objects['combobox'].get_active_text().strip()
         is_preserved_op = op_name in self.preserved_ops
@@ -660,42 +825,169 @@ class ConfigUI(object):
                  objects['m'].get_active() * re.M +
                  objects['s'].get_active() * re.S +
                  objects['x'].get_active() * re.X)
-        is_valid_re = self._is_valid_re(pattern, flags)
-        # Record new definition
+        engine = 'linear' if objects['l'].get_active() else 're'
+        word_re = self._compile_re(pattern, flags, engine)
+        is_valid_re = word_re is not None
         if is_valid_re and not is_preserved_op:
-            new_op = self._mod_conf.get_op().copy_as(op_name)
-            new_op.pattern = pattern
-            new_op.flags = flags
-            self._mod_conf.add_op(new_op)
-            self._mod_conf.current_op_name = op_name
+            # The op is added once its regex has been timed.
+            self._check_match_time((op_name, pattern, flags, engine), word_re)
+    
+    def _record_define(self, op_name, pattern, flags, engine):
+        """Record the SelectionOp definition and show it."""
+        LOGGER.log()
+        # Record new definition
+        new_op = self._mod_conf.get_op().copy_as(op_name)
+        if (pattern, flags) != (new_op.pattern, new_op.flags):
+            # The structure only stands for the pattern it came with.
+            new_op.structure = ''
+        new_op.pattern = pattern
+        new_op.flags = flags
+        new_op.engine = engine
+        is_new_name = not self._is_op_name(op_name)
+        self._mod_conf.add_op(new_op)
+        self._mod_conf.current_op_name = op_name
         # Update interface
-            self._update_config_display()
-            self._update_define_combobox()
-            LOGGER.log('SelectionOp added: %s.' % op_name)
+        if is_new_name:
+            self._is_syncing_ops = True
+            try:
+                self._insert_op_name(op_name)
+            finally:
+                self._is_syncing_ops = False
+        self._update_config_display()
+        self._update_define_combobox()
+        self._update_define_warning()
+        LOGGER.log('SelectionOp added: %s.' % op_name)
     
-    def _is_valid_re(self, pattern, flags):
+    def _compile_re(self, pattern, flags, engine='re'):
         """
-        Check the validity of the regular expression and
-        inform the user if it fails.
+        Return the regular expression compiled for the engine, or None if it
+        is invalid, after informing the user.
         """
         LOGGER.log()
         try:
-            is_valid = bool(re.compile(pattern, flags))
+            return ENGINES[engine](pattern, flags)
         except re.error, re_error:
-            is_valid = False
-            title = "Click_Config: error in input"
             flag_text =  '\n    I (IGNORECASE)' * bool(flags & re.I)
             flag_text += '\n    M (MULTILINE)'  * bool(flags & re.M)
             flag_text += '\n    S (DOTALL)'     * bool(flags & re.S)
             flag_text += '\n    X (VERBOSE)'    * bool(flags & re.X)
+            flag_text += '\n    L (LINEAR)'     * (engine == 'linear')
             flag_text = flag_text or '\n    (None)'
+            title = "Click_Config: error in input"
             message = ("Invalid regular expression pattern."
                        "\n\nError:\n    %s"
                        "\n\nPattern:\n    %s"
                        "\n\nFlags:%s"
                        % (re_error.message, pattern, flag_text))
             self._show_message(title, message, gtk.MESSAGE_ERROR)
-        return is_valid
+            return None
+    
+    def _check_match_time(self, definition, word_re):
+        """
+        Look for repeats in the regex of the SelectionOp definition (its
+        name, pattern, flags and engine) that may backtrack, and time the
+        regex against texts meant to set them off before the op is added,
+        to warn in the Define section if it may be slow.  (The linear engine
+        cannot be slowed by backtracking, so its ops are added at once.)
+        """
+        LOGGER.log()
+        self._stop_match_timer()
+        self._define_warning = None
+        if isinstance(word_re, RE_TYPE):
+            hazards = find_hazards(word_re.pattern, word_re.flags)
+            time_budget = self._mod_conf.match_time_budget
+            self._match_timer = MatchTimer(word_re, make_test_texts(hazards),
+                                           time_budget / 1000.0)
+            self._match_timer_ids = [
+                gobject.io_add_watch(self._match_timer.fileno(),
+                                     gobject.IO_IN | gobject.IO_HUP,
+                                     self._on_match_timer_ready,
+                                     definition, hazards),
+                gobject.timeout_add(time_budget,
+                                    self._on_match_timer_timeout,
+                                    definition, hazards),
+                ]
+            self._define_warning = (definition[0], 'Timing the pattern...')
+            self._update_define_warning()
+        else:
+            self._record_define(*definition)
+    
+    def _on_match_timer_ready(self, source, condition, definition, hazards):
+        """Step the timing when the regex has matched a test text."""
+        LOGGER.log()
+        return self._step_match_timer(definition, hazards)
+    
+    def _on_match_timer_timeout(self, definition, hazards):
+        """End the timing when the regex has run out of time."""
+        LOGGER.log()
+        return self._step_match_timer(definition, hazards)
+    
+    def _step_match_timer(self, definition, hazards):
+        """
+        Step the timing of the SelectionOp definition's regex, and once it
+        is done, add the op, warning in the Define section if the regex may
+        be slow.  If it was measured to be slow, the op is only added if the
+        user confirms it.
+        """
+        LOGGER.log()
+        if not self._match_timer.step():
+            return True
+        worst_time, worst_length = self._match_timer.result
+        self._stop_match_timer()
+        op_name = definition[0]
+        if worst_time is None:
+            cost_text = ("a test text of %d characters took over %.1f s."
+                         % (worst_length,
+                            self._mod_conf.match_time_budget / 1000.0))
+        else:
+            cost_text = ("the slowest test text, of %d characters, took "
+                         "%.1f ms." % (worst_length, worst_time * 1000))
+        LOGGER.log('Measured cost: %s' % cost_text)
+        is_slow = worst_time is None or worst_time >= SLOW_MATCH_TIME
+        if hazards or is_slow:
+            hazard_text = ' '.join('%s (e.g. %r).' % hazard
+                                   for hazard in hazards) or '(None)'
+            warning = ("This pattern may take a long time to match, which "
+                       "would stop clicks from selecting.\n"
+                       "Risky repeats: %s\n"
+                       "Measured cost: %s"
+                       % (hazard_text, cost_text))
+            self._define_warning = (op_name, warning)
+        else:
+            self._define_warning = None
+        if is_slow:
+            title = "Click_Config: slow pattern"
+            message = warning + "\n\nAdd %s anyway?" % op_name
+            if not self._ask_question(title, message):
+                LOGGER.log('SelectionOp not added: %s.' % op_name)
+                self._define_warning = (op_name,
+                                        warning + "\nIt was not added.")
+                self._update_define_warning()
+                return False
+        self._record_define(*definition)
+        return False
+    
+    def _stop_match_timer(self):
+        """Stop any timing of a SelectionOp's regex."""
+        LOGGER.log()
+        for source_id in self._match_timer_ids:
+            gobject.source_remove(source_id)
+        self._match_timer_ids = []
+        if self._match_timer:
+            self._match_timer.stop()
+            self._match_timer = None
+    
+    def _update_define_warning(self):
+        """Show the warning about the current SelectionOp, if there is one."""
+        LOGGER.log()
+        warning_label = self.builder.get_object('define_warning_label')
+        combobox = self.builder.get_object('define_comboboxentry')
+        op_name = combobox.get_active_text().strip()
+        if self._define_warning and self._define_warning[0] == op_name:
+            warning_label.set_text(self._define_warning[1])
+            warning_label.show()
+        else:
+            warning_label.hide()
     
     def _show_message(self, title, message, gtk_message_type):
         """Display a simple dialog box with a message and an OK button."""
@@ -709,6 +1001,22 @@ class ConfigUI(object):
         dialog.run()
         dialog.destroy()
     
+    def _ask_question(self, title, message):
+        """
+        Display a dialog box with a question and Yes and No buttons, and
+        return True if Yes was chosen.
+        """
+        LOGGER.log()
+        dialog = gtk.MessageDialog(None, gtk.DIALOG_MODAL,
+                                   gtk.MESSAGE_WARNING,
+                                   gtk.BUTTONS_YES_NO, message)
+        dialog.set_title(title)
+        dialog.set_transient_for(self.window)
+        dialog.set_position(gtk.WIN_POS_CENTER_ON_PARENT)
+        response = dialog.run()
+        dialog.destroy()
+        return response == gtk.RESPONSE_YES
+    
     def _remove_define(self):
         """Select the preceding SelectionOp and remove the current one."""
         LOGGER.log()
@@ -717,9 +1025,8 @@ class ConfigUI(object):
         # Get circumstance
         op_name = combobox.get_active_text().strip()
         is_preserved_op = op_name in self.preserved_ops
-        op_names = self._mod_conf.get_op_names()
-        op_index = op_names.index(op_name)
-        preceding_op_name = op_names[op_index - 1]
+        op_index = self._get_op_index(op_name)
+        preceding_op_name = self._op_names[op_index - 1]
         # Remove definition
         if not is_preserved_op:
             # Remove the select operation from configurations
@@ -733,6 +1040,11 @@ class ConfigUI(object):
         # Update interface
             self._update_config_display()
             self._update_define_combobox()
+            self._is_syncing_ops = True
+            try:
+                self._remove_op_name(op_name)
+            finally:
+                self._is_syncing_ops = False
             LOGGER.log('SelectionOp removed: %s.' % op_name)
     
     ### 5 - Language section
@@ -776,71 +1088,29 @@ class ConfigUI(object):
             dest_configset_name = scrolledwindow.name[3:]
             if source_configset_name == dest_configset_name:
                 return
-            source_treeview_name = 'tv_' + source_configset_name
-            source_treeview = self._get_widget_by_name(
-                scrolledwindow.get_parent(), source_treeview_name)
+            source_treeview = self._lang_treeviews[source_configset_name]
             dest_treeview = scrolledwindow.get_child()
-            # Move and re-assign the languages
+            # Re-assign the languages.  Each one is a single row change, which
+            # moves it from the source view's filter to the destination's.
             for language in languages:
-                self._remove_from_treeview(source_treeview, language)
                 self._mod_conf.languages[language] = dest_configset_name
-                self._add_to_treeview(dest_treeview, language)
+                self._lang_liststore.set_value(self._lang_iters[language],
+                                               1, dest_configset_name)
+            self._update_lang_treeview_focus(source_treeview)
+            self._update_lang_treeview_focus(dest_treeview)
             self._select_languages(dest_treeview, languages)
             dest_treeview.grab_focus()
+            self._update_apply_button()
     
-    def _get_widget_by_name(self, container, name):
-        """Recursively search to return the named child widget."""
-        LOGGER.log()
-        children = container.get_children()
-        for child in children:
-            if child.name == name:
-                return child
-            if isinstance(child, gtk.Container):
-                found_child = self._get_widget_by_name(child, name)
-                if found_child:
-                    return found_child
-    
-    def _remove_from_treeview(self, treeview, value):
-        """Remove the language name from the TreeView."""
-        LOGGER.log()
-        liststore = treeview.get_model()
-        liststore_list = self._get_list_from_liststore(liststore)
-        path = liststore_list.index(value)
-        iter_ = liststore.get_iter(path)
-        liststore.remove(iter_)
-        if len(liststore) == 0:
-            treeview.set_property('can-focus', False)
-    
-    def _add_to_treeview(self, treeview, value):
-        """Add the language name to the TreeView."""
-        LOGGER.log()
-        liststore = treeview.get_model()
-        liststore_list = self._get_list_from_liststore(liststore)
-        liststore_list.append(value)
-        liststore_list.sort()
-        path = liststore_list.index(value)
-        if path == len(liststore):
-            liststore.append([value])
-        else:
-            iter_ = liststore.get_iter(path)
-            liststore.insert_before(iter_, row=[value])
-        treeview.set_property('can-focus', True)
+    def _update_lang_treeview_focus(self, treeview):
+        """Make the TreeView focusable only if it has any rows."""
+        LOGGER.log()
+        treeview.set_property('can-focus', bool(treeview.values))
     
     def _select_languages(self, treeview, languages):
         """Select rows in the treeview corresponding to languages."""
         LOGGER.log()
-        liststore = treeview.get_model()
-        liststore_list = self._get_list_from_liststore(liststore)
-        treeselection = treeview.get_selection()
-        for language in languages:
-            path = liststore_list.index(language)
-            treeselection.select_path(path)
-    
-    def _get_list_from_liststore(self, liststore):
-        """Return a list of the first-column treeview row values."""
-        LOGGER.log()
-        return [liststore.get_value(liststore.get_iter(i), 0)
-                 for i in range(len(liststore))]
+        treeview.select_values(languages)
     
     def _update_language_frame(self):
         """Show or hide the language frame as appropriate."""
@@ -849,12 +1119,39 @@ class ConfigUI(object):
         language_frame = self.builder.get_object("frame3")
         # Update interface
         if self._mod_conf.is_set_by_language:
-            self._build_lang_table()
+            self._sync_lang_liststore()
+            configset_names = [item.name for item in self._mod_conf.configsets]
+            if configset_names != self._lang_table_configset_names:
+                self._build_lang_table()
+                self._lang_table_configset_names = configset_names
             language_frame.show()
         else:
             language_frame.hide()
             self.window.present()
     
+    def _sync_lang_liststore(self):
+        """
+        Update the languages model to match the language assignments,
+        changing only the rows that differ.
+        """
+        LOGGER.log()
+        languages = self._mod_conf.languages
+        for language in [item for item in self._lang_names
+                         if item not in languages]:
+            index = bisect.bisect_left(self._lang_names, language)
+            del self._lang_names[index]
+            self._lang_liststore.remove(self._lang_iters.pop(language))
+        for language, configset_name in languages.iteritems():
+            if language in self._lang_iters:
+                iter_ = self._lang_iters[language]
+                if self._lang_liststore.get_value(iter_, 1) != configset_name:
+                    self._lang_liststore.set_value(iter_, 1, configset_name)
+            else:
+                index = bisect.bisect_left(self._lang_names, language)
+                self._lang_names.insert(index, language)
+                self._lang_iters[language] = self._lang_liststore.insert(
+                    index, [language, configset_name])
+    
     def _build_lang_table(self):
         """Replace the language table with one matching the configuration."""
         LOGGER.log()
@@ -867,6 +1164,7 @@ class ConfigUI(object):
             columns=len(self._mod_conf.configsets),
             homogeneous=False)
         new_table.set_col_spacings(5)
+        self._lang_treeviews = {}
         # Add to the Table a Label and ScrolledWindow for each ConfigSet
         for index, configset in enumerate(self._mod_conf.configsets):
             # Make a Label of the ConfigSet's name
@@ -905,6 +1203,7 @@ class ConfigUI(object):
         LOGGER.log()
         # Make a TreeView of the ConfigSet's assigned languages
         treeview = self._make_treeview(configset)
+        self._lang_treeviews[configset.name] = treeview
         # Configure the TreeView for being dragged from
         treeview.enable_model_drag_source(
             start_button_mask=gtk.gdk.BUTTON1_MASK,
@@ -930,10 +1229,10 @@ class ConfigUI(object):
     def _make_treeview(self, configset):
         """Return a TreeView of the ConfigSet's assigned languages."""
         LOGGER.log()
-        # Make a ListStore of the ConfigSet's assigned languages
-        liststore = self._make_liststore(configset)
-        # Make a TreeView of the ListStore
-        treeview = TreeViewDV(liststore)
+        # Make a filtered view of the languages model for the ConfigSet
+        treemodelfilter = self._make_lang_filter(configset)
+        # Make a TreeView of the filtered model
+        treeview = TreeViewDV(treemodelfilter)
         # Configure the TreeView
         tvcolumn = gtk.TreeViewColumn('Languages')
         treeview.append_column(tvcolumn)
@@ -941,25 +1240,28 @@ class ConfigUI(object):
         tvcolumn.pack_start(cell, True)
         tvcolumn.add_attribute(cell, 'text', 0)
         treeview.set_search_column(0)
-        tvcolumn.set_sort_column_id(0)
         treeview.set_reorderable(False)
         treeview.set_headers_visible(False)
         treeview.set_name('tv_%s' % configset.name)
         treeselection = treeview.get_selection()
         treeselection.set_mode(gtk.SELECTION_MULTIPLE)
         treeview.set_rubber_banding(True)
-        if len(liststore) == 0:
-            treeview.set_property('can-focus', False)
+        self._update_lang_treeview_focus(treeview)
         return treeview
     
-    def _make_liststore(self, configset):
-        """Return a ListStore of the ConfigSet's assigned languages."""
+    def _make_lang_filter(self, configset):
+        """
+        Return a filtered view of the (already sorted) languages model showing
+        the ConfigSet's assigned languages.
+        """
         LOGGER.log()
-        liststore = gtk.ListStore(str)
-        langauge_assignments = sorted(self._mod_conf.languages.items())
-        for language, configset_name in langauge_assignments:
-            if configset_name == configset.name:
-                liststore.append([language])
-        return liststore
+        treemodelfilter = self._lang_liststore.filter_new()
+        treemodelfilter.set_visible_func(self._is_lang_row_visible,
+                                         configset.name)
+        return treemodelfilter
+    
+    def _is_lang_row_visible(self, model, iter_, configset_name):
+        """Identify whether the language is assigned to the ConfigSet."""
+        return model.get_value(iter_, 1) == configset_name
     
 
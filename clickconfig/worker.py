@@ -0,0 +1,285 @@
+# -*- coding: utf8 -*-
+#  Click_Config plugin for gedit
+#
+#  Copyright (C) 2010-2011 Derek Veit
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module runs regex matching for Click_Config in a separate process.
+
+Python's re module holds the interpreter lock while it matches, so a regex
+that backtracks catastrophically would freeze gedit if it ran in gedit's own
+process.  In a worker process, it can instead be abandoned by killing the
+process.
+
+Classes:
+MatchWorker -- a worker process that finds match boundaries and indexes
+MatchTimer  -- times a regex against texts in steps, giving up after a budget
+
+The worker does not report back on its own; its owner watches fileno() for
+results (e.g. with gobject.io_add_watch) and reads them with receive().
+
+"""
+
+import multiprocessing
+import re
+import time
+
+from .boundaries import find_boundaries
+from .matches import MatchIndex
+from .logger import Logger
+LOGGER = Logger(level=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')[2])
+
+class MatchWorker(object):
+    
+    """
+    A worker process that finds the boundaries of regexes in texts, or
+    their MatchIndexes.
+    
+    Usage:
+    worker = MatchWorker()
+    worker.start()
+    request_id = worker.submit(word_re, source_text)
+    request_id = worker.submit_index(word_re, text, line_offsets)
+    ...
+    while worker.poll():
+        request_id, results = worker.receive()
+    ...
+    worker.stop()
+    
+    Requests are handled in the order submitted.  The results of a request
+    are the boundaries, as from find_boundaries, or the built MatchIndex, or
+    None if the regex could not be matched.
+    
+    """
+    
+    def __init__(self):
+        """Prepare the worker (without starting its process)."""
+        LOGGER.log()
+        
+        self._process = None
+        """The worker process."""
+        
+        self._connection = None
+        """This end of the pipe to the worker process."""
+        
+        self._last_request_id = 0
+        """The id of the most recently submitted request."""
+    
+    def start(self):
+        """Start the worker process."""
+        LOGGER.log()
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(child_connection,),
+            name='Click_Config match worker')
+        self._process.daemon = True
+        self._process.start()
+        child_connection.close()
+        LOGGER.log('Match worker started: pid %d' % self._process.pid)
+    
+    def stop(self):
+        """Ask the worker process to end, and kill it if it does not."""
+        LOGGER.log()
+        if not self._process:
+            return
+        try:
+            self._connection.send(None)
+        except (IOError, OSError):
+            pass
+        self._process.join(0.1)
+        self.kill()
+    
+    def kill(self):
+        """End the worker process now, abandoning any requests."""
+        LOGGER.log()
+        if self._process and self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+            LOGGER.log('Match worker killed.')
+        if self._connection:
+            self._connection.close()
+        self._process = None
+        self._connection = None
+    
+    def restart(self):
+        """Replace the worker process with a new one."""
+        LOGGER.log()
+        self.kill()
+        self.start()
+    
+    def is_running(self):
+        """Return True if the worker process is running."""
+        return bool(self._process and self._process.is_alive())
+    
+    def fileno(self):
+        """Return the file descriptor that becomes readable with results."""
+        return self._connection.fileno()
+    
+    def submit(self, word_re, source_text, request_id=None):
+        """
+        Request the boundaries of the compiled regex in the source text.
+        Return the request id.  A request_id can be given to submit a request
+        of an earlier process again under its id.
+        """
+        LOGGER.log()
+        return self._send(request_id, 'boundaries', (source_text, word_re))
+    
+    def submit_index(self, word_re, text, line_offsets, request_id=None):
+        """
+        Request the MatchIndex of the compiled regex in the text, matched in
+        each of the lines of line_offsets if they are given.  Return the
+        request id, as for submit.
+        """
+        LOGGER.log()
+        return self._send(request_id, 'matches', (text, word_re, line_offsets))
+    
+    def poll(self, timeout=0.0):
+        """
+        Return True if results are waiting to be received, waiting up to
+        timeout seconds for them.
+        """
+        return bool(self._connection and self._connection.poll(timeout))
+    
+    def receive(self):
+        """Return the id and results of the next completed request."""
+        LOGGER.log()
+        return self._connection.recv()
+    
+    def _send(self, request_id, kind, args):
+        """Send the worker a request of a kind, and return its id."""
+        if request_id is None:
+            self._last_request_id += 1
+            request_id = self._last_request_id
+        self._connection.send((request_id, kind, args))
+        return request_id
+
+class MatchTimer(object):
+    
+    """
+    Times a regex against texts in a worker process of its own, one text at a
+    time, so that its owner can keep responding while the texts are matched.
+    
+    Usage:
+    timer = MatchTimer(word_re, texts, time_budget)
+    while not timer.step():
+        # Wait for timer.fileno() to be readable, or for the budget to end.
+    worst_time, worst_length = timer.result
+    
+    """
+    
+    def __init__(self, word_re, texts, time_budget):
+        """
+        Start finding the boundaries of word_re in each of the texts, which
+        may take time_budget seconds altogether.
+        """
+        LOGGER.log()
+        self.word_re = word_re
+        """The compiled regex being timed."""
+        self.result = None
+        """
+        Once done, the longest time taken (in seconds) and the length of the
+        text that took it.  If the texts took longer than the budget, the
+        time is None and the length is that of the text being matched.
+        """
+        self._texts = list(texts)
+        """The texts not yet submitted, in reverse order."""
+        self._texts.reverse()
+        self._deadline = time.time() + time_budget
+        """The time by which all the texts must be matched."""
+        self._worst = (0.0, 0)
+        """The longest time so far, and the length of its text."""
+        self._text_length = 0
+        """The length of the text being matched."""
+        self._start_time = None
+        """The time the text being matched was submitted."""
+        self._worker = MatchWorker()
+        """The worker process the texts are matched in."""
+        self._worker.start()
+        self._submit_next()
+    
+    def fileno(self):
+        """Return the file descriptor that becomes readable with results."""
+        return self._worker.fileno()
+    
+    def get_time_left(self):
+        """Return the seconds left of the budget."""
+        return max(self._deadline - time.time(), 0.0)
+    
+    def step(self):
+        """
+        Take the time of the text being matched if it is done, and submit the
+        next one, or give up if the budget is spent.  Return True once the
+        timing is done.
+        """
+        LOGGER.log()
+        if self.result:
+            return True
+        now = time.time()
+        if self._worker.poll():
+            try:
+                self._worker.receive()
+            except (EOFError, IOError, OSError):
+                # The worker ended without the result.
+                self._finish((None, self._text_length))
+                return True
+            elapsed = now - self._start_time
+            if elapsed > self._worst[0]:
+                self._worst = (elapsed, self._text_length)
+            if self._texts:
+                self._submit_next()
+                return False
+            self._finish(self._worst)
+            return True
+        if now >= self._deadline:
+            self._finish((None, self._text_length))
+            return True
+        return False
+    
+    def stop(self):
+        """Kill the worker process, abandoning the timing if it is not done."""
+        LOGGER.log()
+        self._worker.kill()
+    
+    def _submit_next(self):
+        """Submit the next text to the worker."""
+        text = self._texts.pop()
+        self._text_length = len(text)
+        self._start_time = time.time()
+        self._worker.submit(self.word_re, text)
+    
+    def _finish(self, result):
+        """Keep the result and end the worker process."""
+        self.result = result
+        self._worker.kill()
+
+def _serve(connection):
+    """Handle requests, in the worker process, until asked to stop."""
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        request_id, kind, args = request
+        find = {'boundaries': find_boundaries, 'matches': MatchIndex}[kind]
+        try:
+            results = find(*args)
+        except re.error:
+            results = None
+        connection.send((request_id, results))
+    connection.close()